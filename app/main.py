@@ -1,41 +1,92 @@
-from itertools import zip_longest
+import os
 
 import functions_framework
-from environs import Env
-from hexbytes import HexBytes
 
-from eth_permissions.access_control import Component, Role, get_registry
-from eth_permissions.graph import build_graph
+from eth_permissions.profiling import get_profiler
 
-env = Env()
-env.read_env()
+# Prebuilt with `python -m eth_permissions.registry_artifact registry.pickle` at deploy time. When missing the
+# registry is built from KNOWN_ROLES, KNOWN_COMPONENTS and KNOWN_COMPONENT_NAMES. The components without a
+# known name are named from the chain (see component_names), cached in COMPONENT_NAMES_CACHE.
+REGISTRY_ARTIFACT = os.environ.get(
+    "REGISTRY_ARTIFACT", os.path.join(os.path.dirname(__file__), "registry.pickle")
+)
 
-KNOWN_ROLES = env.list("KNOWN_ROLES", ["GUARDIAN_ROLE", "LEVEL1_ROLE", "LEVEL2_ROLE", "LEVEL3_ROLE"])
-KNOWN_COMPONENTS = env.list("KNOWN_COMPONENTS", [])
-KNOWN_COMPONENT_NAMES = env.list("KNOWN_COMPONENT_NAMES", [])  # TODO: we should get the names from chain
+COMPONENT_NAMES_CACHE = os.environ.get("COMPONENT_NAMES_CACHE", "/tmp/component_names.json")
 
 CORS_HEADERS = {
     "Access-Control-Allow-Origin": "*",
 }
 
-if len(KNOWN_COMPONENTS) < len(KNOWN_COMPONENT_NAMES):
-    raise RuntimeError("Can't have a component name without address")
+_registry_loaded = False
+_component_names = None
 
-get_registry().add_roles([Role(name) for name in KNOWN_ROLES])
-get_registry().add_components(
-    [
-        Component(HexBytes(address), name)
-        for address, name in zip_longest(KNOWN_COMPONENTS, KNOWN_COMPONENT_NAMES)
-    ]
-)
+
+def ensure_registry():
+    global _registry_loaded
+    if not _registry_loaded:
+        from eth_permissions.registry_artifact import load_registry
+
+        with get_profiler().span("load_registry"):
+            load_registry(REGISTRY_ARTIFACT, os.environ.get("ROLE_NAMES_INDEX"))
+        _registry_loaded = True
+
+
+def component_names():
+    global _component_names
+    if _component_names is None:
+        from eth_permissions.component_names import ComponentNames
+
+        _component_names = ComponentNames(COMPONENT_NAMES_CACHE)
+    return _component_names
 
 
 @functions_framework.http
 def permissions_graph(request):
+    if request.path.rstrip("/").endswith("/metrics"):
+        return metrics(request)
+    if request.path.rstrip("/").endswith("/elements"):
+        return graph_elements(request)
+
     try:
         address = request.args["address"]
     except KeyError:
         return {"error": "address is required"}, 400
 
-    graph = build_graph(address)
+    from eth_permissions.graph import build_graph
+
+    ensure_registry()
+
+    profiler = get_profiler()
+    with profiler.span("request.permissions_graph"):
+        graph = build_graph(address, component_names=component_names())
+    profiler.incr("requests.permissions_graph")
     return (graph.source, 200, CORS_HEADERS)
+
+
+def graph_elements(request):
+    """Streams the graph elements (see eth_permissions.graph) as JSON Lines, for client side rendering"""
+    try:
+        address = request.args["address"]
+    except KeyError:
+        return {"error": "address is required"}, 400
+
+    from flask import Response
+
+    from eth_permissions.graph import build_elements, elements_jsonl
+
+    ensure_registry()
+
+    profiler = get_profiler()
+
+    def lines():
+        # The elements are built while the response is streamed, so the span covers the whole response
+        with profiler.span("request.graph_elements"):
+            yield from elements_jsonl(build_elements(address, component_names=component_names()))
+        profiler.incr("requests.graph_elements")
+
+    return Response(lines(), 200, CORS_HEADERS, mimetype="application/x-ndjson")
+
+
+def metrics(request):
+    """Prometheus scrape endpoint with the timings and counters collected by this instance."""
+    return (get_profiler().prometheus(), 200, {"Content-Type": "text/plain; version=0.0.4"})
@@ -0,0 +1,74 @@
+"""Archive ingest throughput benchmark.
+
+Writes a JSON Lines export of synthetic logs where a fraction belongs to the audited AccessManager, then
+reads it back with eth_permissions.archive and decodes the matches, reporting the logs scanned per second:
+
+    python benchmarks/archive.py [--logs 1000000] [--match 0.01] [--files 1]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic
+
+from eth_permissions import abis, decoder
+from eth_permissions.archive import ArchiveSource
+
+ROLE_GRANTED = next(
+    entry for entry in abis.OZ_ACCESS_MANAGER if entry["type"] == "event" and entry["name"] == "RoleGranted"
+)
+
+
+def write_archive(path, count, match, manager, seed=0):
+    rng = random.Random(seed)
+    topic0 = "0x" + event_abi_to_log_topic(ROLE_GRANTED).hex()
+    data = "0x" + encode(["uint32", "uint48", "bool"], [0, 0, True]).hex()
+    with open(path, "w") as f:
+        for index in range(count):
+            address = manager if rng.random() < match else "0x" + rng.randbytes(20).hex()
+            topics = [topic0, "0x" + encode(["uint64"], [rng.randrange(10)]).hex(), "0x" + bytes(12).hex()]
+            topics[2] += rng.randbytes(20).hex()
+            row = {
+                "address": address,
+                "topics": topics,
+                "data": data,
+                "block_number": index // 100,
+                "log_index": index % 100,
+                "transaction_hash": "0x" + rng.randbytes(32).hex(),
+            }
+            f.write(json.dumps(row) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--logs", type=int, default=1_000_000)
+    parser.add_argument("--match", type=float, default=0.01)
+    parser.add_argument("--files", type=int, default=1)
+    args = parser.parse_args()
+
+    manager = "0x" + "ab" * 20
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"logs-{index}.jsonl") for index in range(args.files)]
+        for index, path in enumerate(paths):
+            write_archive(path, args.logs // args.files, args.match, manager, seed=index)
+
+        start = time.perf_counter()
+        logs, last_block = ArchiveSource(paths).logs(manager, decoder.ACCESS_MANAGER.topics(["RoleGranted"]))
+        events = decoder.ACCESS_MANAGER.decode_all(logs)
+        elapsed = time.perf_counter() - start
+
+    print(
+        f"scanned {args.logs:,} logs in {elapsed:.2f}s ({args.logs / elapsed * 60:,.0f} logs/min), "
+        f"{len(events):,} events up to block {last_block}"
+    )
+
+
+if __name__ == "__main__":
+    main()
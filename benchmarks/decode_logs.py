@@ -0,0 +1,109 @@
+"""Log decoding throughput benchmark.
+
+Decodes a synthetic history of AccessManager logs (as formatted by web3's get_logs) with web3's generic event
+decoding and with the specialized decoder (see eth_permissions.decoder), and reports decoded logs per second:
+
+    python benchmarks/decode_logs.py [--logs 20000] [--accounts 200] [--runs 5]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic, to_checksum_address
+from hexbytes import HexBytes
+from web3 import Web3
+
+from eth_permissions import abis, decoder
+
+MANAGER = to_checksum_address("0x" + "ab" * 20)
+
+EVENTS = {entry["name"]: entry for entry in abis.OZ_ACCESS_MANAGER if entry["type"] == "event"}
+
+
+def make_logs(count, accounts, seed=0):
+    rng = random.Random(seed)
+    accounts = [to_checksum_address(rng.randbytes(20)) for _ in range(accounts)]
+    names = ["RoleGranted", "RoleGranted", "RoleRevoked", "TargetFunctionRoleUpdated", "RoleLabel"]
+    logs = []
+    for index in range(count):
+        name = rng.choice(names)
+        values = {
+            "roleId": rng.randrange(1, 50),
+            "account": rng.choice(accounts),
+            "target": rng.choice(accounts),
+            "delay": rng.randrange(0, 86400),
+            "since": 1_700_000_000 + index,
+            "newMember": True,
+            "selector": rng.randbytes(4),
+            "label": f"ROLE_{index % 50}",
+        }
+        entry = EVENTS[name]
+        topics = [HexBytes(event_abi_to_log_topic(entry))]
+        data_types, data_values = [], []
+        for arg in entry["inputs"]:
+            if arg["indexed"]:
+                topics.append(HexBytes(encode([arg["type"]], [values[arg["name"]]])))
+            else:
+                data_types.append(arg["type"])
+                data_values.append(values[arg["name"]])
+        logs.append(
+            {
+                "address": MANAGER,
+                "topics": topics,
+                "data": HexBytes(encode(data_types, data_values)),
+                "blockNumber": index // 4,
+                "logIndex": index % 4,
+                "transactionHash": HexBytes(rng.randbytes(32)),
+                "transactionIndex": 0,
+                "blockHash": HexBytes(bytes(32)),
+                "removed": False,
+            }
+        )
+    return logs
+
+
+def generic_decoder():
+    contract = Web3().eth.contract(address=MANAGER, abi=abis.OZ_ACCESS_MANAGER)
+    events = {
+        bytes(event_abi_to_log_topic(entry)): getattr(contract.events, name)()
+        for name, entry in EVENTS.items()
+    }
+    return lambda logs: [events[bytes(log["topics"][0])].process_log(log) for log in logs]
+
+
+def measure(decode, logs, runs):
+    timings = []
+    for _ in range(runs):
+        decoder._address.cache_clear()
+        start = time.perf_counter()
+        decode(logs)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings, count):
+    print(
+        f"{name:<12} median={count / statistics.median(timings):,.0f} logs/s "
+        f"best={count / min(timings):,.0f} logs/s runs={len(timings)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--logs", type=int, default=20000)
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    logs = make_logs(args.logs, args.accounts)
+    report("generic", measure(generic_decoder(), logs, args.runs), len(logs))
+    report("specialized", measure(decoder.ACCESS_MANAGER.decode_all, logs, args.runs), len(logs))
+
+
+if __name__ == "__main__":
+    main()
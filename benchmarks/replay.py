@@ -0,0 +1,63 @@
+"""Partitioned replay benchmark.
+
+Builds the AccessManager state of a synthetic history with the sequential replay and with the partitioned one
+on an increasing number of processes (see eth_permissions.replay):
+
+    python benchmarks/replay.py [--events 1000000] [--roles 200] [--targets 200] [--workers 1 2 4 8]
+"""
+
+import argparse
+import os
+import random
+import time
+
+from eth_utils import to_checksum_address
+
+from eth_permissions import replay
+
+NOW = 1_700_000_000
+
+
+def make_stream(count, roles, targets, seed=0):
+    rng = random.Random(seed)
+    accounts = [to_checksum_address(rng.randbytes(20)) for _ in range(1000)]
+    target_addresses = [to_checksum_address(rng.randbytes(20)) for _ in range(targets)]
+    stream = []
+    for order in range(count):
+        role = rng.randrange(1, roles + 1)
+        kind = rng.random()
+        if kind < 0.6:
+            name = "RoleGranted"
+            args = {"roleId": role, "account": rng.choice(accounts), "delay": 0, "since": 0}
+        elif kind < 0.8:
+            name, args = "RoleRevoked", {"roleId": role, "account": rng.choice(accounts)}
+        else:
+            name = "TargetFunctionRoleUpdated"
+            args = {"roleId": role, "target": rng.choice(target_addresses), "selector": rng.randbytes(4)}
+        stream.append({"event": name, "args": args, "order": (order, 0)})
+    return stream
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--roles", type=int, default=200)
+    parser.add_argument("--targets", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    args = parser.parse_args()
+
+    stream = make_stream(args.events, args.roles, args.targets)
+    for workers in sorted(set(args.workers)):
+        start = time.perf_counter()
+        state = replay.replay_access_manager(stream, timestamp=NOW, workers=workers)
+        elapsed = time.perf_counter() - start
+        print(
+            f"workers={workers:<3} {elapsed:.2f}s {args.events / elapsed:,.0f} events/s "
+            f"content_hash=0x{state.content_hash.hex()[:16]}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Startup latency benchmark.
+
+Tracks the time to run `python -m eth_permissions --help` and the cold start of the cloud function (importing
+app/main.py and loading the roles registry), each in a fresh interpreter:
+
+    python benchmarks/startup.py [--runs 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+COLD_START_SNIPPET = "import main; main.ensure_registry()"
+
+
+def measure(cmd, runs, **kwargs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print(
+        f"{name:<24} median={statistics.median(timings):.3f}s "
+        f"min={min(timings):.3f}s max={max(timings):.3f}s runs={len(timings)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    report("cli --help", measure([sys.executable, "-m", "eth_permissions", "--help"], args.runs))
+    try:
+        timings = measure(
+            [sys.executable, "-c", COLD_START_SNIPPET], args.runs, cwd=APP_DIR, stderr=subprocess.DEVNULL
+        )
+    except subprocess.CalledProcessError:
+        print("function cold start      skipped (requires functions-framework)")
+    else:
+        report("function cold start", timings)
+
+
+if __name__ == "__main__":
+    main()
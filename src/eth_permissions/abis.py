@@ -119,4 +119,141 @@ OZ_ACCESS_MANAGER = [
         "name": "TargetAdminDelayUpdated",
         "type": "event",
     },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "bytes32", "name": "operationId", "type": "bytes32"},
+            {"indexed": True, "internalType": "uint32", "name": "nonce", "type": "uint32"},
+            {"indexed": False, "internalType": "uint48", "name": "schedule", "type": "uint48"},
+            {"indexed": False, "internalType": "address", "name": "caller", "type": "address"},
+            {"indexed": False, "internalType": "address", "name": "target", "type": "address"},
+            {"indexed": False, "internalType": "bytes", "name": "data", "type": "bytes"},
+        ],
+        "name": "OperationScheduled",
+        "type": "event",
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "bytes32", "name": "operationId", "type": "bytes32"},
+            {"indexed": True, "internalType": "uint32", "name": "nonce", "type": "uint32"},
+        ],
+        "name": "OperationExecuted",
+        "type": "event",
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "bytes32", "name": "operationId", "type": "bytes32"},
+            {"indexed": True, "internalType": "uint32", "name": "nonce", "type": "uint32"},
+        ],
+        "name": "OperationCanceled",
+        "type": "event",
+    },
+]
+
+OZ_ACCESS_MANAGER_ADMIN = [
+    {
+        "inputs": [
+            {"internalType": "uint64", "name": "roleId", "type": "uint64"},
+            {"internalType": "string", "name": "label", "type": "string"},
+        ],
+        "name": "labelRole",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "uint64", "name": "roleId", "type": "uint64"},
+            {"internalType": "address", "name": "account", "type": "address"},
+            {"internalType": "uint32", "name": "executionDelay", "type": "uint32"},
+        ],
+        "name": "grantRole",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "uint64", "name": "roleId", "type": "uint64"},
+            {"internalType": "address", "name": "account", "type": "address"},
+        ],
+        "name": "revokeRole",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "uint64", "name": "roleId", "type": "uint64"},
+            {"internalType": "uint64", "name": "admin", "type": "uint64"},
+        ],
+        "name": "setRoleAdmin",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "uint64", "name": "roleId", "type": "uint64"},
+            {"internalType": "uint64", "name": "guardian", "type": "uint64"},
+        ],
+        "name": "setRoleGuardian",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "uint64", "name": "roleId", "type": "uint64"},
+            {"internalType": "uint32", "name": "newDelay", "type": "uint32"},
+        ],
+        "name": "setGrantDelay",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "target", "type": "address"},
+            {"internalType": "bytes4[]", "name": "selectors", "type": "bytes4[]"},
+            {"internalType": "uint64", "name": "roleId", "type": "uint64"},
+        ],
+        "name": "setTargetFunctionRole",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "target", "type": "address"},
+            {"internalType": "uint32", "name": "newDelay", "type": "uint32"},
+        ],
+        "name": "setTargetAdminDelay",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "target", "type": "address"},
+            {"internalType": "bool", "name": "closed", "type": "bool"},
+        ],
+        "name": "setTargetClosed",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "bytes[]", "name": "data", "type": "bytes[]"},
+        ],
+        "name": "multicall",
+        "outputs": [
+            {"internalType": "bytes[]", "name": "results", "type": "bytes[]"},
+        ],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
 ]
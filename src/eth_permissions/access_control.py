@@ -1,10 +1,12 @@
+import pickle
+import re
 from dataclasses import dataclass
 from itertools import zip_longest
 
-from eth_utils import add_0x_prefix
+from eth_utils import add_0x_prefix, keccak, to_checksum_address
 from hexbytes import HexBytes
-from web3 import Web3
 
+from .merkle import MerkleMap, hash_leaf
 from .utils import ellipsize
 
 
@@ -26,7 +28,7 @@ class Role:
     def __init__(self, name, component: Component = None):
         self.name = name
         self.component = component
-        self._role_hash = HexBytes(Web3.keccak(text=name))
+        self._role_hash = HexBytes(keccak(text=name))
 
     @classmethod
     def from_hash(cls, hash: HexBytes, component: Component = None):
@@ -98,6 +100,8 @@ class Role:
 
 
 class Registry:
+    name_index = None  # Optional role_names.RoleNameIndex, consulted for hashes that aren't registered
+
     def __init__(self):
         self._map = {}
         self.add(Role.default_admin())
@@ -113,6 +117,7 @@ class Registry:
 
     def add(self, role):
         self._map[role.hash] = role
+        self._names = None
         if role.component and role._role_hash not in self._map:
             base_role = Role(role.name)
             base_role._role_hash = role._role_hash
@@ -123,6 +128,12 @@ class Registry:
             hash = HexBytes(hash)
         if hash in self._map:
             return self._map[hash]
+        if self.name_index is not None:
+            name = self.name_index.name(hash)
+            if name is not None:
+                role = Role(name)
+                self.add(role)
+                return role
         # Try to match the last part of the hash
         hash_tail = hash.hex()[-24:]
         base_role = next(
@@ -134,6 +145,38 @@ class Registry:
         else:
             return Role.from_hash(hash)
 
+    def find(self, name) -> Role:
+        """The role of a name as printed in the snapshots (`Role:NAME@Component` or `NAME@Component`, with the
+        component name or address), a base role name or a role hash"""
+        name = name[len("Role:") :] if name.startswith("Role:") else name
+        if re.fullmatch(r"0x[0-9a-fA-F]{64}", name):
+            return self.get(name)
+        if getattr(self, "_names", None) is None:
+            self._names = {}
+            for role in self._map.values():
+                # The first one wins: DEFAULT_ADMIN_ROLE is 0x00..00, not the hash of its name
+                self._names.setdefault(str(role)[len("Role:") :], role)
+        if name in self._names:
+            return self._names[name]
+        role_name, _, component = name.partition("@")
+        if re.fullmatch(r"0x[0-9a-fA-F]{40}", component):
+            return self.get(Role(role_name, Component(HexBytes(component))).hash)
+        if component:
+            raise ValueError(f"Unknown component {component} of role {role_name}")
+        return self.get(Role(role_name).hash)
+
+    def save(self, path):
+        """Writes the registry to a file, so it can be loaded without hashing every role again."""
+        with open(path, "wb") as f:
+            pickle.dump(self._map, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path) -> "Registry":
+        ret = cls.__new__(cls)
+        with open(path, "rb") as f:
+            ret._map = pickle.load(f)
+        return ret
+
 
 _registry = None
 
@@ -143,3 +186,65 @@ def get_registry():
     if _registry is None:
         _registry = Registry()
     return _registry
+
+
+def set_registry(registry):
+    global _registry
+    _registry = registry
+
+
+def snapshot_tree(snapshot) -> MerkleMap:
+    """Merkle map of role hash -> hash of its members, for a snapshot as returned by
+    AccessControlEventStream.snapshot (or onchain_snapshot). Its root is the snapshot's content hash."""
+    tree = MerkleMap()
+    for item in snapshot:
+        if item["members"]:
+            tree[item["role"].hash.hex()] = hash_leaf(sorted(item["members"]))
+    return tree
+
+
+def snapshot_from_dict(items, registry: Registry = None) -> list:
+    """A snapshot (as returned by AccessControlEventStream.snapshot) from its json version: a list of
+    {"role": name or hash, "members": [...], "admin": name or hash (optional)} items. The names are resolved
+    with the registry, see `Registry.find`. A `role_hash`, when present, takes precedence over the name."""
+    registry = registry or get_registry()
+    snapshot = []
+    for item in items:
+        role = registry.get(item["role_hash"]) if item.get("role_hash") else registry.find(item["role"])
+        parsed = {"role": role, "members": [to_checksum_address(member) for member in item["members"]]}
+        if item.get("admin") is not None:
+            parsed["admin"] = registry.find(item["admin"])
+        snapshot.append(parsed)
+    return snapshot
+
+
+def compare(current, snapshot, current_admins=None) -> list:
+    """Compares two AccessControl snapshots. Returns the grantRole, revokeRole and setRoleAdmin operations
+    that bring the `current` state to the `snapshot` state.
+
+    The roles are matched by hash. Admins are only compared for the snapshot items with an "admin";
+    current_admins maps role hashes to the current admin (DEFAULT_ADMIN_ROLE when missing).
+    """
+    from .access_manager import Operation
+
+    current_members = {bytes(item["role"].hash): (item["role"], set(item["members"])) for item in current}
+    snapshot_members = {bytes(item["role"].hash): (item["role"], set(item["members"])) for item in snapshot}
+    snapshot_admins = {bytes(item["role"].hash): item["admin"] for item in snapshot if "admin" in item}
+    current_admins = {bytes(role_hash): admin for role_hash, admin in (current_admins or {}).items()}
+    default_admin = Role.default_admin()
+
+    differences = []
+    for role_hash in sorted(current_members.keys() | snapshot_members.keys() | snapshot_admins.keys()):
+        role, members = current_members.get(role_hash, (None, set()))
+        snapshot_role, expected = snapshot_members.get(role_hash, (None, set()))
+        role = role or snapshot_role or get_registry().get(HexBytes(role_hash))
+
+        if role_hash in snapshot_admins:
+            admin = snapshot_admins[role_hash]
+            if current_admins.get(role_hash, default_admin).hash != admin.hash:
+                differences.append(Operation("setRoleAdmin", {"role": role, "admin": admin}))
+        for account in sorted(members - expected):
+            differences.append(Operation("revokeRole", {"role": role, "account": account}))
+        for account in sorted(expected - members):
+            differences.append(Operation("grantRole", {"role": role, "account": account}))
+    return differences
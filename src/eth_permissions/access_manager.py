@@ -1,11 +1,17 @@
+import heapq
 import itertools
+import time
 from collections import defaultdict
 from dataclasses import dataclass
 from datetime import timedelta
-from typing import Dict, List, Literal, Optional, Set
+from typing import Any, Dict, Iterable, List, Literal, Optional, Set, Tuple
 
 from eth_typing import ChecksumAddress, HexStr
-from eth_utils import add_0x_prefix, to_checksum_address
+from eth_utils import add_0x_prefix, keccak, to_checksum_address
+from hexbytes import HexBytes
+
+from .merkle import MerkleMap, hash_leaf
+from .profiling import profiled
 
 MAX_UINT64 = 2**64 - 1
 
@@ -130,54 +136,77 @@ class AccessManager:
         self.role_guardians = {}
         self.target_allowed_roles = defaultdict(set)
 
+        # Content hash per role and per target, refreshed lazily for the roles/targets changed since then
+        self._role_hashes = MerkleMap()
+        self._target_hashes = MerkleMap()
+        self._dirty_roles = set(self.roles)
+        self._dirty_targets = set()
+
+        # Changes that take effect later (grants, execution/grant/admin delays with a `since` in the future).
+        # Each key has at most one pending value; the heap is the activation queue, ordered by since. Entries
+        # overridden by a later change are skipped when popped.
+        self.timestamp = 0  # Changes with since <= timestamp are in effect
+        self._pending: Dict[tuple, Tuple[int, Any]] = {}  # key -> (since, value)
+        self._activations: List[Tuple[int, tuple]] = []  # (since, key)
+
     @classmethod
-    def from_events(cls, events: List[dict]) -> "AccessManager":
-        """Loads a current state access manager as defined by the events."""
+    @profiled("access_manager.from_events")
+    def from_events(cls, events: List[dict], timestamp: int = None) -> "AccessManager":
+        """Loads the access manager state as defined by the events, effective at the given timestamp (by
+        default, now). The changes that take effect later are kept pending, see `at_time`."""
         am = cls()
-        for role_id, events in itertools.groupby(events, key=lambda e: e["args"].roleId):
+        am.timestamp = int(time.time()) if timestamp is None else timestamp
+        # Target events (TargetClosed, TargetAdminDelayUpdated) have no roleId, they're grouped under None
+        for role_id, events in itertools.groupby(events, key=lambda e: e["args"].get("roleId")):
             for event in events:
                 if event["event"] == "RoleGranted":
                     # RoleGranted(uint64 indexed roleId, address indexed account, uint32 delay, uint48 since, bool newMember);  # noqa
                     am.grant_role(
                         Role(role_id),
-                        to_checksum_address(event["args"].account),
-                        timedelta(seconds=event["args"].delay),
+                        to_checksum_address(event["args"]["account"]),
+                        timedelta(seconds=event["args"]["delay"]),
+                        since=event["args"].get("since", 0),
                     )
                 elif event["event"] == "RoleRevoked":
                     # RoleRevoked(uint64 indexed roleId, address indexed account)
-                    am.revoke_role(Role(role_id), to_checksum_address(event["args"].account))
+                    am.revoke_role(Role(role_id), to_checksum_address(event["args"]["account"]))
                 elif event["event"] == "RoleGuardianChanged":
                     # RoleGuardianChanged(uint64 indexed roleId, uint64 indexed guardian)
-                    am.set_role_guardian(Role(role_id), Role(event["args"].guardian))
+                    am.set_role_guardian(Role(role_id), Role(event["args"]["guardian"]))
                 elif event["event"] == "RoleAdminChanged":
                     # RoleAdminChanged(uint64 indexed roleId, uint64 indexed admin)
-                    am.set_role_admin(Role(role_id), Role(event["args"].admin))
+                    am.set_role_admin(Role(role_id), Role(event["args"]["admin"]))
                 elif event["event"] == "RoleLabel":
                     # RoleLabel(uint64 indexed roleId, string label)
-                    am.label_role(Role(role_id), event["args"].label)
+                    am.label_role(Role(role_id), event["args"]["label"])
                 elif event["event"] == "TargetFunctionRoleUpdated":
                     # TargetFunctionRoleUpdated(address indexed target, bytes4 selector, uint64 indexed roleId)  # noqa
                     am.set_target_function_role(
-                        am.get_target(to_checksum_address(event["args"].target)),
-                        {add_0x_prefix(HexStr(event["args"].selector.hex()))},
+                        am.get_target(to_checksum_address(event["args"]["target"])),
+                        {add_0x_prefix(HexStr(event["args"]["selector"].hex()))},
                         Role(role_id),
                     )
                 elif event["event"] == "RoleGrantDelayChanged":
                     # RoleGrantDelayChanged(uint64 indexed roleId, uint32 delay, uint48 since);
-                    am.set_grant_delay(Role(role_id), timedelta(seconds=event["args"].delay))
+                    am.set_grant_delay(
+                        Role(role_id),
+                        timedelta(seconds=event["args"]["delay"]),
+                        since=event["args"].get("since", 0),
+                    )
                 elif event["event"] == "TargetClosed":
                     # TargetClosed(address indexed target, bool closed)
                     am.set_target_closed(
-                        am.get_target(to_checksum_address(event["args"].target)), event["args"].closed
+                        am.get_target(to_checksum_address(event["args"]["target"])), event["args"]["closed"]
                     )
                 elif event["event"] == "TargetAdminDelayUpdated":
                     # TargetAdminDelayUpdated(address indexed target, uint32 delay, uint48 since)
                     am.set_target_admin_delay(
-                        am.get_target(to_checksum_address(event["args"].target)),
-                        timedelta(seconds=event["args"].delay),
+                        am.get_target(to_checksum_address(event["args"]["target"])),
+                        timedelta(seconds=event["args"]["delay"]),
+                        since=event["args"].get("since", 0),
                     )
                 else:
-                    raise RuntimeError(f"Unexpected event {event.name} for role {role_id}")
+                    raise RuntimeError(f"Unexpected event {event['event']} for role {role_id}")
         return am
 
     def get_role(self, role_id: int) -> Optional[Role]:
@@ -216,6 +245,7 @@ class AccessManager:
         return ret
 
     def label_role(self, role: Role, label: str):
+        self._dirty_roles.add(role.id)
         if role.id in self.roles:
             if self.roles[role.id].label != label:
                 self.roles[role.id] = Role(role.id, label, self.roles[role.id].grant_delay)
@@ -224,7 +254,90 @@ class AccessManager:
 
         return self.roles[role.id]
 
-    def set_grant_delay(self, role: Role, delay: timedelta):
+    def _schedule(self, key: tuple, since: int, value) -> bool:
+        """Queues the change if it takes effect after the current timestamp. Otherwise, it discards any
+        pending change for the same key and returns False so the caller applies it right away."""
+        if since <= self.timestamp:
+            self._pending.pop(key, None)
+            return False
+        self._pending[key] = (since, value)
+        heapq.heappush(self._activations, (since, key))
+        return True
+
+    def promote(self, timestamp: int):
+        """Applies, in place, the pending changes that take effect up to the timestamp"""
+        if timestamp < self.timestamp:
+            raise ValueError(f"State already at {self.timestamp}, can't go back to {timestamp}")
+        self.timestamp = timestamp
+        while self._activations and self._activations[0][0] <= timestamp:
+            since, key = heapq.heappop(self._activations)
+            if self._pending.get(key, (None,))[0] != since:
+                continue  # Overridden by a later change
+            _, value = self._pending.pop(key)
+            if key[0] == "member":
+                self.grant_role(Role(key[1]), value.address, value.execution_delay)
+            elif key[0] == "execution_delay":
+                self.grant_role(Role(key[1]), key[2], value)
+            elif key[0] == "grant_delay":
+                self.set_grant_delay(Role(key[1]), value)
+            elif key[0] == "admin_delay":
+                self.set_target_admin_delay(self.get_target(key[1]), value)
+
+    def at_time(self, timestamp: int) -> "AccessManager":
+        """A copy of the state effective at the timestamp, which can't be earlier than `self.timestamp`.
+
+        Only the pending changes are applied, the events aren't replayed. To query past timestamps, build the
+        state with `from_events(events, timestamp=0)` and call `at_time` on it.
+        """
+        state = self.copy()
+        state.promote(timestamp)
+        return state
+
+    def pending_changes(self) -> List[dict]:
+        """The changes that aren't effective yet, in activation order"""
+        changes = []
+        for key, (since, value) in sorted(self._pending.items(), key=lambda item: item[1][0]):
+            if key[0] == "member":
+                change = {
+                    "change": "grantRole",
+                    "roleId": key[1],
+                    "account": value.address,
+                    "executionDelay": value.execution_delay,
+                }
+            elif key[0] == "execution_delay":
+                change = {"change": "grantRole", "roleId": key[1], "account": key[2], "executionDelay": value}
+            elif key[0] == "grant_delay":
+                change = {"change": "setGrantDelay", "roleId": key[1], "newDelay": value}
+            else:
+                change = {"change": "setTargetAdminDelay", "target": key[1], "newDelay": value}
+            changes.append({**change, "since": since})
+        return changes
+
+    def copy(self) -> "AccessManager":
+        state = self.__class__.__new__(self.__class__)
+        state.roles = dict(self.roles)
+        state.targets = dict(self.targets)
+        state.role_members = defaultdict(
+            set, {role_id: set(members) for role_id, members in self.role_members.items()}
+        )
+        state.role_admins = dict(self.role_admins)
+        state.role_guardians = dict(self.role_guardians)
+        state.target_allowed_roles = defaultdict(
+            set, {address: set(roles) for address, roles in self.target_allowed_roles.items()}
+        )
+        state._role_hashes = self._role_hashes.copy()
+        state._target_hashes = self._target_hashes.copy()
+        state._dirty_roles = set(self._dirty_roles)
+        state._dirty_targets = set(self._dirty_targets)
+        state.timestamp = self.timestamp
+        state._pending = dict(self._pending)
+        state._activations = list(self._activations)
+        return state
+
+    def set_grant_delay(self, role: Role, delay: timedelta, since: int = 0):
+        if self._schedule(("grant_delay", role.id), since, delay):
+            return self.roles.get(role.id, role)
+        self._dirty_roles.add(role.id)
         if role.id in self.roles:
             if self.roles[role.id].grant_delay != delay:
                 self.roles[role.id] = Role(role.id, self.roles[role.id].label, delay)
@@ -233,11 +346,27 @@ class AccessManager:
 
         return self.roles[role.id]
 
-    def grant_role(self, role: Role, member: ChecksumAddress, execution_delay: timedelta = timedelta(0)):
+    def grant_role(
+        self, role: Role, member: ChecksumAddress, execution_delay: timedelta = timedelta(0), since: int = 0
+    ):
+        self._dirty_roles.add(role.id)
         if role.id not in self.roles:
             self.roles[role.id] = role
 
         new_member = RoleMember(member, execution_delay)
+        if (
+            new_member in self.role_members.get(role.id, set())
+            or ("member", role.id, member) in self._pending
+        ):
+            # Regranting a member (even one whose grant isn't effective yet) only changes its delay
+            if self._schedule(("execution_delay", role.id, member), since, execution_delay):
+                return new_member
+            if new_member not in self.role_members.get(role.id, set()):
+                pending_since, _ = self._pending[("member", role.id, member)]
+                self._schedule(("member", role.id, member), pending_since, new_member)
+                return new_member
+        elif self._schedule(("member", role.id, member), since, new_member):
+            return new_member
 
         if new_member in self.role_members.get(role.id, set()):
             # Member already has the role, remove it in case the delay has changed
@@ -247,14 +376,18 @@ class AccessManager:
         return new_member
 
     def revoke_role(self, role: Role, member: ChecksumAddress):
+        self._dirty_roles.add(role.id)
         if role.id not in self.roles:
             self.roles[role.id] = role
 
+        self._pending.pop(("member", role.id, member), None)
+        self._pending.pop(("execution_delay", role.id, member), None)
         member = RoleMember(member)
         if member in self.role_members.get(role.id, set()):
             self.role_members[role.id].remove(member)
 
     def set_role_admin(self, role: Role, admin: Role):
+        self._dirty_roles.update((role.id, admin.id))
         if role.id not in self.roles:
             self.roles[role.id] = role
         if admin.id not in self.roles:
@@ -266,6 +399,7 @@ class AccessManager:
         self.role_admins[role.id] = admin
 
     def set_role_guardian(self, role: Role, guardian: Role):
+        self._dirty_roles.update((role.id, guardian.id))
         if role.id not in self.roles:
             self.roles[role.id] = role
         if guardian.id not in self.roles:
@@ -277,6 +411,8 @@ class AccessManager:
         self.role_guardians[role.id] = guardian
 
     def set_target_function_role(self, target: Target, selectors: Set[HexStr], role: Role):
+        self._dirty_roles.add(role.id)
+        self._dirty_targets.add(target.address)
         if role.id not in self.roles:
             self.roles[role.id] = role
 
@@ -284,12 +420,22 @@ class AccessManager:
 
         if not selectors:
             return
-        for selector in selectors:
-            selector_role = SelectorRole(role, selector)
-            if selector_role not in self.target_allowed_roles.get(target.address, set()):
-                self.target_allowed_roles[target.address].add(selector_role)
+        # Each selector has a single role, drop the previous assignments
+        self.target_allowed_roles[target.address] = {
+            selector_role
+            for selector_role in self.target_allowed_roles[target.address]
+            if selector_role.selector not in selectors
+        } | {SelectorRole(role, selector) for selector in selectors}
+
+    def add_targets(self, addresses: Iterable[ChecksumAddress]):
+        """Adds the managed contracts that have no configuration (they use the default settings)"""
+        for address in addresses:
+            if address not in self.targets:
+                self.targets[address] = Target(address)
+                self._dirty_targets.add(address)
 
     def set_target_closed(self, target: Target, closed: bool):
+        self._dirty_targets.add(target.address)
         if target.address not in self.targets:
             self.targets[target.address] = Target(target.address, closed, target.admin_delay)
         else:
@@ -299,7 +445,10 @@ class AccessManager:
 
         return self.targets[target.address]
 
-    def set_target_admin_delay(self, target: Target, delay: timedelta):
+    def set_target_admin_delay(self, target: Target, delay: timedelta, since: int = 0):
+        if self._schedule(("admin_delay", target.address), since, delay):
+            return self.get_target(target.address)
+        self._dirty_targets.add(target.address)
         if target.address not in self.targets:
             self.targets[target.address] = Target(target.address, target.closed, delay)
         else:
@@ -326,7 +475,73 @@ class AccessManager:
                 }
                 for role in self.roles.values()
             },
-            "targets": {address: target.as_dict for address, target in self.targets.items()},
+            "targets": {address: target.as_dict() for address, target in self.targets.items()},
+        }
+
+    def _role_leaf(self, role: Role) -> bytes:
+        return hash_leaf(
+            [
+                role.id,
+                role.label,
+                int(role.grant_delay.total_seconds()),
+                self.get_role_admin(role).id,
+                self.get_role_guardian(role).id,
+                sorted(
+                    [member.address, int(member.execution_delay.total_seconds())]
+                    for member in self.get_role_members(role)
+                ),
+            ]
+        )
+
+    def _target_leaf(self, address: ChecksumAddress) -> bytes:
+        target = self.get_target(address)
+        selector_groups = defaultdict(list)
+        for selector_role in self.target_allowed_roles.get(address, set()):
+            selector_groups[selector_role.role.id].append(selector_role.selector)
+        group_hashes = sorted(
+            hash_leaf([role_id, sorted(selectors)]).hex() for role_id, selectors in selector_groups.items()
+        )
+        return hash_leaf([address, target.closed, int(target.admin_delay.total_seconds()), group_hashes])
+
+    def _refresh_hashes(self):
+        for role_id in self._dirty_roles:
+            if role_id in self.roles:
+                self._role_hashes[role_id] = self._role_leaf(self.roles[role_id])
+            else:
+                self._role_hashes.discard(role_id)
+        for address in self._dirty_targets:
+            if address in self.targets or self.target_allowed_roles.get(address):
+                self._target_hashes[address] = self._target_leaf(address)
+            else:
+                self._target_hashes.discard(address)
+        self._dirty_roles.clear()
+        self._dirty_targets.clear()
+
+    @property
+    def content_hash(self) -> HexBytes:
+        """Deterministic hash of the whole state, built Merkle style from a hash per role and per target.
+
+        Two snapshots with the same content hash have the same permissions. Only the roles and targets
+        changed since the last call are hashed again.
+        """
+        self._refresh_hashes()
+        return HexBytes(keccak(self._role_hashes.root + self._target_hashes.root))
+
+    def subtree_hashes(self) -> dict:
+        """The hash of each role and target, as combined in the content hash"""
+        self._refresh_hashes()
+        return {
+            "roles": {role_id: HexBytes(leaf) for role_id, leaf in self._role_hashes.items()},
+            "targets": {address: HexBytes(leaf) for address, leaf in self._target_hashes.items()},
+        }
+
+    def changed_subtrees(self, other: "AccessManager") -> dict:
+        """The role ids and target addresses whose configuration differs between both snapshots"""
+        self._refresh_hashes()
+        other._refresh_hashes()
+        return {
+            "roles": sorted(self._role_hashes.diff(other._role_hashes)),
+            "targets": sorted(self._target_hashes.diff(other._target_hashes)),
         }
 
     @classmethod
@@ -335,6 +550,7 @@ class AccessManager:
         for address, target_data in data.get("targets", {}).items():
             address = to_checksum_address(address)
             am.targets[address] = Target.from_dict(target_data)
+            am._dirty_targets.add(address)
 
         for role_id, role_data in data.get("roles", {}).items():
             role_id = int(role_id)
@@ -363,6 +579,7 @@ class Operation:
     # setGrantDelay(uint64 roleId, uint32 newDelay)
     # setTargetFunctionRole(address target, bytes4[] calldata selectors, uint64 roleId)
     # setTargetAdminDelay(address target, uint32 newDelay)
+    # setTargetClosed(address target, bool closed)
     op: Literal[
         "grantRole",
         "revokeRole",
@@ -372,8 +589,183 @@ class Operation:
         "setTargetFunctionRole",
         "setGrantDelay",
         "setTargetAdminDelay",
+        "setTargetClosed",
     ]
     args: dict
 
     def as_dict(self):
         return {"op": self.op, "args": self.args}
+
+
+@profiled("access_manager.compare")
+def compare(current: AccessManager, snapshot: AccessManager) -> List[Operation]:
+    """Compares two access manager states. Returns the differences.
+
+    The differences are returned as a series of operations to apply to bring the `current` state to the
+    `snapshot` state.
+    """
+    differences = []
+
+    # Roles missing on either side are compared against an unconfigured role, so missing grants show up too
+    for role_id in sorted(current.roles.keys() | snapshot.roles.keys()):
+        current_role = current.roles.get(role_id, Role(id=role_id, label=""))
+        snapshot_role = snapshot.roles.get(role_id, Role(id=role_id, label=""))
+
+        if (current_role.label or "") != (snapshot_role.label or ""):
+            differences.append(Operation("labelRole", {"roleId": current_role, "label": snapshot_role.label}))
+        if current.get_role_admin(current_role) != snapshot.get_role_admin(snapshot_role):
+            differences.append(
+                Operation(
+                    "setRoleAdmin",
+                    {"roleId": current_role, "admin": snapshot.get_role_admin(snapshot_role)},
+                )
+            )
+        if current.get_role_guardian(current_role) != snapshot.get_role_guardian(snapshot_role):
+            differences.append(
+                Operation(
+                    "setRoleGuardian",
+                    {"roleId": current_role, "guardian": snapshot.get_role_guardian(snapshot_role)},
+                )
+            )
+        if current_role.grant_delay != snapshot_role.grant_delay:
+            differences.append(
+                Operation(
+                    "setGrantDelay",
+                    {"roleId": current_role, "newDelay": snapshot_role.grant_delay},
+                )
+            )
+
+        if current.get_role_members(current_role) != snapshot.get_role_members(snapshot_role):
+            for member in current.get_role_members(current_role) - snapshot.get_role_members(snapshot_role):
+                differences.append(
+                    Operation("revokeRole", {"roleId": current_role, "account": member.address})
+                )
+
+            for member in snapshot.get_role_members(snapshot_role) - current.get_role_members(current_role):
+                differences.append(
+                    Operation(
+                        "grantRole",
+                        {
+                            "roleId": current_role,
+                            "account": member.address,
+                            "executionDelay": member.execution_delay,
+                        },
+                    )
+                )
+
+        # For common members just need to check the execution delay is properly set
+        for common_member in current.get_role_members(current_role) & snapshot.get_role_members(
+            snapshot_role
+        ):
+            # Can't get te members from iterating the intersection, because we need to distinguish them
+            current_member = [
+                member for member in current.get_role_members(current_role) if member == common_member
+            ][0]
+            snapshot_member = [
+                member for member in snapshot.get_role_members(snapshot_role) if member == common_member
+            ][0]
+            if current_member.execution_delay != snapshot_member.execution_delay:
+                differences.append(
+                    Operation(
+                        "grantRole",
+                        {
+                            "roleId": current_role,
+                            "account": snapshot_member.address,
+                            "executionDelay": snapshot_member.execution_delay,
+                        },
+                    )
+                )
+
+    snapshot_targets = set(snapshot.targets.values())
+    current_targets = set(current.targets.values())
+    if current_targets != snapshot_targets:
+        # The targets not present in the snapshot need to be reset to default values
+        for target in current_targets - snapshot_targets:
+            if target.closed:
+                differences.append(Operation("setTargetClosed", {"target": target, "closed": False}))
+            if target.admin_delay != timedelta(0):
+                differences.append(Operation("setTargetAdminDelay", {"target": target, "newDelay": 0}))
+
+        # The targets in snapshot but missing from current need to be properly configured
+        for target in snapshot_targets - current_targets:
+            if target.closed:
+                differences.append(Operation("setTargetClosed", {"target": target, "closed": target.closed}))
+            if target.admin_delay != timedelta(0):
+                differences.append(
+                    Operation("setTargetAdminDelay", {"target": target, "newDelay": target.admin_delay})
+                )
+
+        # The common targets need to be checked for matching config
+        for common_target in current_targets & snapshot_targets:
+            current_target = [target for target in current_targets if target == common_target][0]
+            snapshot_target = [target for target in snapshot_targets if target == common_target][0]
+            if current_target.closed != snapshot_target.closed:
+                differences.append(
+                    Operation("setTargetClosed", {"target": current_target, "closed": snapshot_target.closed})
+                )
+            if current_target.admin_delay != snapshot_target.admin_delay:
+                differences.append(
+                    Operation(
+                        "setTargetAdminDelay",
+                        {"target": current_target, "newDelay": snapshot_target.admin_delay},
+                    )
+                )
+
+    current_selectors = {
+        (target, selector_role.selector)
+        for target, selector_roles in current.target_allowed_roles.items()
+        for selector_role in selector_roles
+    }
+    snapshot_selectors = {
+        (target, selector_role.selector)
+        for target, selector_roles in snapshot.target_allowed_roles.items()
+        for selector_role in selector_roles
+    }
+
+    if current_selectors != snapshot_selectors:
+        # The target -> selectors not present in the snapshot need to be assigned to ADMIN_ROLE
+        for target, selector in current_selectors - snapshot_selectors:
+            differences.append(
+                Operation(
+                    "setTargetFunctionRole",
+                    {
+                        "target": target,
+                        "selectors": {selector},
+                        "roleId": snapshot.ADMIN_ROLE,
+                    },
+                )
+            )
+
+        # The target -> selectors in snapshot missing from current need to be set on current
+        for target, selector in snapshot_selectors - current_selectors:
+            role = snapshot.get_target_allowed_role(target, selector)
+            if role == snapshot.ADMIN_ROLE:
+                continue
+            differences.append(
+                Operation(
+                    "setTargetFunctionRole",
+                    {
+                        "target": target,
+                        "selectors": {selector},
+                        "roleId": role,
+                    },
+                )
+            )
+
+    # The common target -> selectors need to be checked for matching role
+    for common_target, common_selector in current_selectors & snapshot_selectors:
+        current_role = current.get_target_allowed_role(common_target, common_selector)
+        snapshot_role = snapshot.get_target_allowed_role(common_target, common_selector)
+        if current_role != snapshot_role:
+            differences.append(
+                Operation(
+                    "setTargetFunctionRole",
+                    {
+                        "target": common_target,
+                        "selectors": {common_selector},
+                        "roleId": snapshot_role,
+                    },
+                )
+            )
+
+    return differences
@@ -0,0 +1,163 @@
+"""Backfill of the event streams from exported log archives.
+
+Bulk exports of a `logs` table (from an indexer or a data warehouse) are much cheaper to read than paging the
+whole history with `eth_getLogs`. An ArchiveSource reads them in streaming fashion, keeps the logs of the
+contract with the requested topic0s and hands them to the stream's decoder. The stream only requests the
+blocks after the archive's last one over RPC (see BaseEventStream.archive).
+
+Supported files (optionally gzipped): JSON Lines (.jsonl, .ndjson, .json), CSV (.csv) and Parquet (.parquet,
+requires pyarrow). The usual column names are recognized:
+- address: address, contract_address
+- topics: topics (a list, a json list or comma separated) or topic0, topic1, topic2, topic3
+- data
+- block number: blockNumber, block_number
+- log index: logIndex, log_index, index
+- transaction hash: transactionHash, transaction_hash, tx_hash
+Numbers may be ints, decimal or 0x prefixed hex strings. Binary columns (Parquet) may be raw bytes.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from .profiling import get_profiler
+
+ADDRESS_COLUMNS = ("address", "contract_address")
+BLOCK_COLUMNS = ("blockNumber", "block_number")
+LOG_INDEX_COLUMNS = ("logIndex", "log_index", "index")
+TRANSACTION_COLUMNS = ("transactionHash", "transaction_hash", "tx_hash")
+TOPIC_COLUMNS = ("topic0", "topic1", "topic2", "topic3")
+
+PARQUET_BATCH_SIZE = 65536
+
+
+def _column(row, names):
+    for name in names:
+        value = row.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def _hex(value) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    return value.lower()
+
+
+def _int(value) -> int:
+    if isinstance(value, str):
+        return int(value, 16) if value.startswith("0x") else int(value)
+    return int(value)
+
+
+def _topics(row) -> List[str]:
+    topics = row.get("topics")
+    if topics is None:
+        topics = [row.get(column) for column in TOPIC_COLUMNS]
+    elif isinstance(topics, str):
+        topics = json.loads(topics) if topics.startswith("[") else topics.split(",")
+    return [_hex(topic) for topic in topics if topic]
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _rows(path, needle: str) -> Iterator[dict]:
+    """The rows of the file. For text files, only the lines that contain the needle (lowercase, but it may be
+    checksummed in the file) are parsed."""
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet archives requires pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=PARQUET_BATCH_SIZE):
+            yield from batch.to_pylist()
+    elif name.endswith(".csv"):
+        with _open_text(path) as f:
+            header = next(csv.reader([f.readline()]))
+            lines = (line for line in f if needle in line or needle in line.lower())
+            for values in csv.reader(lines):
+                yield dict(zip(header, values))
+    else:
+        with _open_text(path) as f:
+            for line in f:
+                # Most lines are other contracts' logs: skip them without parsing the json
+                if needle in line or needle in line.lower():
+                    yield json.loads(line)
+
+
+def read_logs(
+    path: str, address: str, topics: Iterable[str], from_block: int = 0, to_block: Optional[int] = None
+) -> List[dict]:
+    """The logs of the file emitted by the address with any of the topic0s, as raw JSON-RPC style logs"""
+    address = address.lower()
+    topics = {topic.lower() for topic in topics}
+    logs = []
+    for row in _rows(path, address[2:]):
+        row_address = _column(row, ADDRESS_COLUMNS)
+        if row_address is None or _hex(row_address) != address:
+            continue
+        row_topics = _topics(row)
+        if not row_topics or row_topics[0] not in topics:
+            continue
+        block = _int(_column(row, BLOCK_COLUMNS))
+        if block < from_block or (to_block is not None and block > to_block):
+            continue
+        logs.append(
+            {
+                "address": address,
+                "topics": row_topics,
+                "data": _hex(row.get("data") or "0x"),
+                "blockNumber": block,
+                "logIndex": _int(_column(row, LOG_INDEX_COLUMNS)),
+                "transactionHash": _hex(_column(row, TRANSACTION_COLUMNS) or "0x"),
+            }
+        )
+    return logs
+
+
+class ArchiveSource:
+    """A set of exported log files, read on up to `workers` processes (one file each).
+
+    `last_block` is the last block the archive covers. When not given, it's the block of the last log found,
+    so the RPC tail starts right after it: only safe if the export has every log up to its end.
+    """
+
+    def __init__(self, paths: Sequence[str], last_block: Optional[int] = None, workers: int = None):
+        self.paths = [str(path) for path in paths]
+        self.last_block = last_block
+        self.workers = workers or min(len(self.paths), os.cpu_count() or 1)
+
+    def logs(self, address: str, topics: Iterable[str], from_block: int = 0, to_block: int = None):
+        """The logs of the address with the topic0s, in chain order, and the last block the archive covers
+        for them"""
+        topics = ["0x" + topic.hex() if isinstance(topic, bytes) else topic for topic in topics]
+        if self.last_block is not None:
+            to_block = self.last_block if to_block is None else min(to_block, self.last_block)
+        args = (address, topics, from_block, to_block)
+        with get_profiler().span("archive.read"):
+            if self.workers <= 1 or len(self.paths) == 1:
+                per_file = [read_logs(path, *args) for path in self.paths]
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    per_file = list(
+                        pool.map(read_logs, self.paths, *([arg] * len(self.paths) for arg in args))
+                    )
+        logs = sorted(
+            (log for logs in per_file for log in logs), key=lambda log: (log["blockNumber"], log["logIndex"])
+        )
+        get_profiler().incr("archive_logs", len(logs))
+        if self.last_block is not None:
+            last_block = to_block
+        else:
+            last_block = logs[-1]["blockNumber"] if logs else None
+        return logs, last_block
@@ -0,0 +1,117 @@
+"""logsBloom prefiltering of event fetches.
+
+Each block header has a 2048 bits bloom filter of the addresses and topics of its logs. Checking the contract
+address and the event topics against the blooms tells which blocks may have the events, so `eth_getLogs` is
+only requested for the ranges around them instead of the whole history in node-capped ranges.
+
+The blooms are kept in a HeaderCache shared by all the contracts of the same chain (see `get_header_cache`),
+optionally persisted to a SQLite file. They're fetched, persisted and scanned in bounded windows of blocks.
+"""
+
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, Tuple
+
+from eth_utils import keccak, to_bytes
+
+from .profiling import get_profiler
+
+BLOOM_BITS = 2048
+
+
+def bloom_bits(value: bytes) -> Tuple[int, int, int]:
+    """The 3 bits set in the bloom for an address or topic"""
+    digest = keccak(value)
+    return tuple(((digest[i] << 8) | digest[i + 1]) % BLOOM_BITS for i in (0, 2, 4))
+
+
+def bloom_contains(bloom: bytes, value: bytes) -> bool:
+    # Bit 0 is the least significant bit of the last byte
+    return all(bloom[len(bloom) - 1 - bit // 8] & (1 << (bit % 8)) for bit in bloom_bits(value))
+
+
+def may_have_logs(bloom: bytes, address: str, topics: Iterable) -> bool:
+    """Whether the block may have logs of the address with any of the topics (topic0)"""
+    return bloom_contains(bloom, to_bytes(hexstr=address)) and any(
+        bloom_contains(bloom, bytes(topic)) for topic in topics
+    )
+
+
+class HeaderCache:
+    """The logsBloom of each block of a chain, fetched once and kept in memory or in a SQLite file"""
+
+    def __init__(self, w3, path=":memory:", workers=16):
+        self.w3 = w3
+        self.workers = workers
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS blooms (block INTEGER PRIMARY KEY, bloom BLOB NOT NULL)")
+
+    def _fetch_bloom(self, block: int) -> bytes:
+        return bytes(self.w3.eth.get_block(block)["logsBloom"])
+
+    def blooms(self, from_block: int, to_block: int) -> Dict[int, bytes]:
+        """The blooms of the blocks in [from_block, to_block], fetching the missing headers concurrently.
+
+        The fetched blooms are committed before returning, so keep the range bounded (see `windows`).
+        """
+        with self._lock:
+            cached = dict(
+                self.db.execute(
+                    "SELECT block, bloom FROM blooms WHERE block BETWEEN ? AND ?", (from_block, to_block)
+                )
+            )
+        missing = [block for block in range(from_block, to_block + 1) if block not in cached]
+        if missing:
+            with get_profiler().span("fetch_headers"), ThreadPoolExecutor(max_workers=self.workers) as pool:
+                fetched = dict(zip(missing, pool.map(self._fetch_bloom, missing)))
+            get_profiler().incr("headers", len(fetched))
+            with self._lock, self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO blooms (block, bloom) VALUES (?, ?)", fetched.items()
+                )
+            cached.update(fetched)
+        return cached
+
+    def windows(self, from_block: int, to_block: int, size: int) -> Iterator[Dict[int, bytes]]:
+        """The blooms of [from_block, to_block] in windows of at most size blocks, each fetched and persisted
+        when it's reached, so a failure midway keeps the progress and only a window is in memory"""
+        for start in range(from_block, to_block + 1, size):
+            yield self.blooms(start, min(start + size - 1, to_block))
+
+    def candidate_ranges(
+        self, address: str, topics: Iterable, from_block: int, to_block: int, max_range: int
+    ) -> Iterator[Tuple[int, int]]:
+        """Ranges of at most max_range blocks that cover every block that may have the logs.
+
+        Nearby candidate blocks share a range, so each range costs a single eth_getLogs request. The blooms
+        are scanned in windows of max_range blocks and each range is yielded once it can't grow anymore.
+        """
+        topics = list(topics)
+        current = None
+        for window in self.windows(from_block, to_block, max_range):
+            for block in sorted(window):
+                if not may_have_logs(window[block], address, topics):
+                    continue
+                if current is not None and block - current[0] < max_range:
+                    current = (current[0], block)
+                    continue
+                if current is not None:
+                    yield current
+                current = (block, block)
+        if current is not None:
+            yield current
+
+
+_header_caches: Dict[int, HeaderCache] = {}
+_header_caches_lock = threading.Lock()
+
+
+def get_header_cache(w3, path=None) -> HeaderCache:
+    """The HeaderCache of the chain of w3, shared by all the streams of that chain"""
+    chain_id = w3.eth.chain_id
+    with _header_caches_lock:
+        if chain_id not in _header_caches:
+            _header_caches[chain_id] = HeaderCache(w3, path or ":memory:")
+        return _header_caches[chain_id]
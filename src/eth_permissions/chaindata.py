@@ -1,33 +1,143 @@
-import itertools
-from collections import defaultdict
-from datetime import timedelta
-from warnings import warn
+from typing import List
 
+from eth_utils import event_abi_to_log_topic, to_bytes, to_checksum_address
 from ethproto.wrappers import ETHWrapper, get_provider
+from hexbytes import HexBytes
 
 from . import abis
+from . import access_control as ac
 from . import access_manager as am
-from .access_control import get_registry
+from . import decoder, delta, replay
+from .access_control import Role, get_registry, snapshot_tree
+from .multicall import Call, aggregate
+from .profiling import get_profiler, profiled
+from .scheduling import SCHEDULE_EVENTS, PendingOperations
+from .timeline import MembershipTimeline
+
+# ERC-165 interface id of AccessControlEnumerable
+ACCESS_CONTROL_ENUMERABLE_ID = bytes.fromhex("5a05180f")
 
 
 class BaseEventStream:
     ABI = None
+    DECODER = None  # decoder.LogDecoder of the ABI's events
+
+    # Blocks per eth_getLogs request when prefiltering with a header cache
+    MAX_BLOCK_RANGE = 2000
 
-    def __init__(self, contract_address, provider=None):
+    def __init__(self, contract_address, provider=None, header_cache=None, chain=None):
         self.contract_address = contract_address
         self._event_stream = None
+        # delta.KeyIndex of the loaded stream by key_value function, see _prior_state
+        self._key_indexes = {}
 
+        # Optional chains.ChainConfig, with the provider and the eth_getLogs limits of the contract's chain
+        self.chain = chain
         if provider is None:
-            provider = get_provider("w3")
+            provider = chain.provider() if chain is not None else get_provider("w3")
         self.provider = provider
+        # Optional bloom.HeaderCache, to only request the logs of the blocks that may have the events
+        self.header_cache = header_cache
+        # Processes to replay the events on, see the replay module
+        self.replay_workers = 1
+        # Optional archive.ArchiveSource. The events it has are read from it, only the later ones from RPC.
+        self.archive = None
 
     def _get_contract_wrapper(self):
         contract = self.provider.w3.eth.contract(address=self.contract_address, abi=self.ABI)
         return ETHWrapper.connect(contract)
 
-    def _get_events(self, event_names):
+    def _get_events(self, event_names, from_block=None, to_block=None):
+        profiler = get_profiler()
+        profiler.instrument_web3(self.provider.w3)
         contract_wrapper = self._get_contract_wrapper()
-        return self.provider.get_events(contract_wrapper, event_names)
+        if to_block is None and self.chain is not None and self.chain.confirmations:
+            to_block = self._latest_block()
+        filter_kwargs = {}
+        if from_block is not None:
+            filter_kwargs["from_block"] = from_block
+        if to_block is not None:
+            filter_kwargs["to_block"] = to_block
+        archive_events = []
+        if self.archive is not None:
+            archive_events, from_block = self._get_archive_events(event_names, from_block, to_block)
+            if from_block is not None:
+                if to_block is not None and from_block > to_block:
+                    profiler.incr("events", len(archive_events))
+                    return archive_events
+                filter_kwargs["from_block"] = from_block
+        with profiler.span("fetch_events"):
+            if self.header_cache is not None:
+                events = self._get_prefiltered_events(contract_wrapper, event_names, from_block, to_block)
+            elif self.chain is not None and self.chain.max_block_range:
+                events = self._get_chunked_events(contract_wrapper, event_names, from_block, to_block)
+            else:
+                events = self._fetch_logs(contract_wrapper, event_names, filter_kwargs)
+        events = archive_events + events
+        profiler.incr("events", len(events))
+        return events
+
+    def _latest_block(self) -> int:
+        """The last block to read: the head of the chain, minus the chain's confirmations if configured"""
+        confirmations = self.chain.confirmations if self.chain is not None else 0
+        return self.provider.w3.eth.block_number - (confirmations or 0)
+
+    def _get_archive_events(self, event_names, from_block=None, to_block=None):
+        """The events in the archive and the first block to request over RPC"""
+        logs, last_block = self.archive.logs(
+            self.contract_address, self.DECODER.topics(event_names), from_block or 0, to_block
+        )
+        with get_profiler().span("decode_events"):
+            events = self.DECODER.decode_all(logs)
+        if last_block is None:
+            return events, from_block
+        return events, max(last_block + 1, from_block or 0)
+
+    def _fetch_logs(self, contract_wrapper, event_names, filter_kwargs):
+        """A single eth_getLogs request, decoded with the specialized decoder instead of web3's"""
+        from_block = filter_kwargs.get("from_block")
+        filter_params = {
+            "fromBlock": (
+                self.provider.get_first_block(contract_wrapper) if from_block is None else from_block
+            ),
+            "toBlock": filter_kwargs.get("to_block", "latest"),
+            "address": self.contract_address,
+            "topics": [["0x" + topic.hex() for topic in self.DECODER.topics(event_names)]],
+        }
+        logs = self.provider.w3.eth.get_logs(filter_params)
+        with get_profiler().span("decode_events"):
+            return self.DECODER.decode_all(logs)
+
+    def _get_chunked_events(self, contract_wrapper, event_names, from_block=None, to_block=None):
+        """Fetches the events in ranges of at most the chain's max_block_range blocks"""
+        max_range = self.chain.max_block_range
+        from_block = self.provider.get_first_block(contract_wrapper) if from_block is None else from_block
+        to_block = self.provider.w3.eth.block_number if to_block is None else to_block
+        events = []
+        for start in range(from_block, to_block + 1, max_range):
+            filter_kwargs = {"from_block": start, "to_block": min(start + max_range - 1, to_block)}
+            events.extend(self._fetch_logs(contract_wrapper, event_names, filter_kwargs))
+        return events
+
+    def _get_prefiltered_events(self, contract_wrapper, event_names, from_block=None, to_block=None):
+        topics = [
+            event_abi_to_log_topic(entry)
+            for entry in self.ABI
+            if entry["type"] == "event" and entry["name"] in event_names
+        ]
+        ranges = self.header_cache.candidate_ranges(
+            self.contract_address,
+            topics,
+            self.provider.get_first_block(contract_wrapper) if from_block is None else from_block,
+            self.provider.w3.eth.block_number if to_block is None else to_block,
+            self.chain.max_block_range if self.chain and self.chain.max_block_range else self.MAX_BLOCK_RANGE,
+        )
+        events = []
+        for start, end in ranges:
+            events.extend(
+                self._fetch_logs(contract_wrapper, event_names, {"from_block": start, "to_block": end})
+            )
+        return events
 
     @property
     def stream(self):
@@ -35,75 +145,261 @@ class BaseEventStream:
             self._load_stream()
         return self._event_stream
 
+    def _prior_state(self, keys, key_value, default, read, from_block, value=None) -> dict:
+        """The values of the keys before from_block (see the delta module): from the loaded stream if there's
+        one, otherwise read from the contract at the block before"""
+        if not keys or from_block == 0:
+            return {key: default(key) for key in keys}
+        if self._event_stream is not None:
+            stream, index = self._key_indexes.get(key_value, (None, None))
+            if stream is not self._event_stream:  # Not indexed yet, or the stream was reloaded since
+                index = delta.KeyIndex(self._event_stream, key_value)
+                self._key_indexes[key_value] = (self._event_stream, index)
+            return index.prior(keys, default, (from_block, 0))
+        with get_profiler().span("delta.prior_state"):
+            return delta.prior_from_chain(
+                self.provider.w3, self.contract_address, keys, read, from_block - 1, value
+            )
+
 
 class AccessControlEventStream(BaseEventStream):
     ABI = abis.OZ_ACCESS_CONTROL
+    DECODER = decoder.ACCESS_CONTROL
 
-    def _load_stream(self):
-        events = self._get_events(["RoleGranted", "RoleRevoked"])  # TODO: RoleAdminChanged
+    EVENTS = ["RoleGranted", "RoleRevoked"]
+    ADMIN_EVENTS = ["RoleAdminChanged"]
+
+    def __init__(self, contract_address, provider=None, header_cache=None, chain=None):
+        super().__init__(contract_address, provider, header_cache, chain)
+        self._role_admins = None
+        # Optional component_names.ComponentNames, to name the unknown components of the roles from the chain
+        self.component_names = None
 
+    def _parse_events(self, events):
         event_stream = []
         for event in events:
             event_stream.append(
                 {
-                    "role": get_registry().get("0x" + event.args.role.hex()),
-                    "subject": event.args.account,
-                    "requester": event.args.sender,
-                    "order": (event.blockNumber, event.logIndex),
-                    "event": event.event,
+                    "role": get_registry().get("0x" + event["args"]["role"].hex()),
+                    "subject": event["args"]["account"],
+                    "requester": event["args"]["sender"],
+                    "order": (event["blockNumber"], event["logIndex"]),
+                    "event": event["event"],
                 }
             )
-        self._event_stream = sorted(event_stream, key=lambda e: (e["role"].hash, e["order"]))
+        return sorted(event_stream, key=lambda e: (e["role"].hash, e["order"]))
+
+    def _load_stream(self):
+        self._event_stream = self._parse_events(self._get_events(self.EVENTS))
+        if self.component_names is not None:
+            self.component_names.name_roles(self.provider.w3, (event["role"] for event in self._event_stream))
 
     @property
+    @profiled("access_control.snapshot")
     def snapshot(self):
-        snapshot = defaultdict(set)
-        for role, events in itertools.groupby(self.stream, key=lambda e: e["role"].hash):
-            for event in events:
-                if event["event"] == "RoleGranted":
-                    snapshot[role].add(event["subject"])
-                elif event["event"] == "RoleRevoked":
-                    try:
-                        snapshot[role].remove(event["subject"])
-                        if not snapshot[role]:
-                            snapshot.pop(role)
-                    except KeyError:
-                        warn(f"WARNING: can't remove ungranted role {role} from {event['subject']}")
-                else:
-                    raise RuntimeError(f"Unexpected event {event.name} for role {role}")
+        snapshot = replay.replay_access_control(self.stream, workers=self.replay_workers)
         return [
-            {"role": get_registry().get(role), "members": list(members)} for role, members in snapshot.items()
+            {"role": get_registry().get(HexBytes(role)), "members": list(members)}
+            for role, members in snapshot.items()
         ]
 
+    @property
+    def role_admins(self) -> dict:
+        """Role hash -> admin Role, for the roles whose admin changed (the rest have DEFAULT_ADMIN_ROLE)"""
+        if self._role_admins is None:
+            events = sorted(
+                self._get_events(self.ADMIN_EVENTS), key=lambda e: (e["blockNumber"], e["logIndex"])
+            )
+            self._role_admins = {
+                HexBytes(e["args"]["role"]): get_registry().get(HexBytes(e["args"]["newAdminRole"]))
+                for e in events
+            }
+        return self._role_admins
+
+    def compare(self, snapshot):
+        """Compares the current snapshot with the given one (see access_control.snapshot_from_dict). Returns
+        the grantRole, revokeRole and setRoleAdmin operations that bring the current state to the snapshot.
 
-class AccessManagerEventStream(BaseEventStream):
-    ABI = abis.OZ_ACCESS_MANAGER
+        The current admins are only fetched when the snapshot has any.
+        """
+        admins = self.role_admins if any("admin" in item for item in snapshot) else {}
+        return ac.compare(self.snapshot, snapshot, admins)
 
-    def _load_stream(self):
-        events = self._get_events(
-            [
-                "RoleGranted",
-                "RoleRevoked",
-                "RoleGuardianChanged",
-                "RoleAdminChanged",
-                "RoleLabel",
-                "TargetFunctionRoleUpdated",
-                "RoleGrantDelayChanged",
-                "TargetClosed",
-                "TargetAdminDelayUpdated",
+    @profiled("access_control.delta")
+    def delta(self, from_block: int, to_block: int = None):
+        """The net changes between from_block and to_block (inclusive, by default the latest block), as the
+        grantRole, revokeRole and setRoleAdmin operations `compare()` returns for the states before and after.
+
+        Only the events in the range are fetched. The membership before the range of the (role, account)
+        pairs they touch comes from the loaded stream, which must cover the blocks before from_block, or from
+        batched hasRole calls. RoleAdminChanged events carry the previous admin.
+        """
+        events = self._get_events(self.EVENTS + self.ADMIN_EVENTS, from_block=from_block, to_block=to_block)
+        members = self._parse_events([e for e in events if e["event"] in self.EVENTS])
+        admins, prior_admins = delta.access_control_admins(
+            sorted(
+                (e for e in events if e["event"] in self.ADMIN_EVENTS),
+                key=lambda e: (e["blockNumber"], e["logIndex"]),
+            )
+        )
+        net = delta.collapse(members, delta.access_control_member)
+        prior = self._prior_state(
+            net.keys(),
+            delta.access_control_member,
+            delta.access_control_default,
+            delta.access_control_read,
+            from_block,
+        )
+        return delta.access_control_operations(
+            delta.changes(net, prior) + delta.changes(admins, prior_admins)
+        )
+
+    @property
+    def timeline(self) -> MembershipTimeline:
+        """History of (role, account) memberships, keyed by Role"""
+        return MembershipTimeline.from_access_control_stream(self.stream)
+
+    @property
+    def content_hash(self) -> HexBytes:
+        """Deterministic hash of the current snapshot. See access_control.snapshot_tree"""
+        return HexBytes(snapshot_tree(self.snapshot).root)
+
+    def onchain_snapshot(self, candidates=None, from_block=None, block_identifier="latest"):
+        """Returns the current permissions read from the contract state, instead of replaying the whole log.
+
+        The (role hash, account) candidates are confirmed with batched hasRole calls through Multicall3. When
+        not given, they're taken from the already loaded stream or, with from_block, from the logs since that
+        block. For AccessControlEnumerable contracts the members of every candidate role are read with
+        getRoleMemberCount/getRoleMember instead, so members granted before from_block aren't missed.
+
+        The result has the same shape as `snapshot`, plus the admin of each role.
+        """
+        if candidates is None:
+            if self._event_stream is None and from_block is not None:
+                stream = self._parse_events(self._get_events(self.EVENTS, from_block=from_block))
+            else:
+                stream = self.stream
+            candidates = {(event["role"].hash, event["subject"]) for event in stream}
+
+        w3 = self.provider.w3
+        address = self.contract_address
+        roles = sorted({HexBytes(role) for role, _ in candidates} | {Role.default_admin().hash})
+
+        (enumerable,) = aggregate(
+            w3,
+            [Call(address, "supportsInterface(bytes4)", (ACCESS_CONTROL_ENUMERABLE_ID,), ("bool",))],
+            block_identifier=block_identifier,
+        )
+        if enumerable:
+            counts = aggregate(
+                w3,
+                [Call(address, "getRoleMemberCount(bytes32)", (role,), ("uint256",)) for role in roles],
+                block_identifier=block_identifier,
+            )
+            calls = [
+                Call(address, "getRoleMember(bytes32,uint256)", (role, index), ("address",))
+                for role, count in zip(roles, counts)
+                for index in range(count or 0)
             ]
+            members = aggregate(w3, calls, block_identifier=block_identifier)
+            granted = {(call.args[0], to_checksum_address(member)) for call, member in zip(calls, members)}
+        else:
+            candidates = sorted(
+                (HexBytes(role), to_checksum_address(account)) for role, account in candidates
+            )
+            has_role = aggregate(
+                w3,
+                [Call(address, "hasRole(bytes32,address)", candidate, ("bool",)) for candidate in candidates],
+                block_identifier=block_identifier,
+            )
+            granted = {candidate for candidate, has in zip(candidates, has_role) if has}
+
+        admins = aggregate(
+            w3,
+            [Call(address, "getRoleAdmin(bytes32)", (role,), ("bytes32",)) for role in roles],
+            block_identifier=block_identifier,
         )
 
+        registry = get_registry()
+        snapshot = []
+        for role, admin in zip(roles, admins):
+            members = sorted(account for granted_role, account in granted if granted_role == role)
+            if members:
+                snapshot.append(
+                    {
+                        "role": registry.get(role),
+                        "members": members,
+                        "admin": registry.get(HexBytes(admin)) if admin is not None else None,
+                    }
+                )
+        return snapshot
+
+    def check_consistency(self, onchain_snapshot=None):
+        """Returns the (role, account) pairs where the snapshot built from the events and the on-chain state
+        disagree."""
+        from_events = {(item["role"].hash, member) for item in self.snapshot for member in item["members"]}
+        if onchain_snapshot is None:
+            onchain_snapshot = self.onchain_snapshot()
+        onchain = {(item["role"].hash, member) for item in onchain_snapshot for member in item["members"]}
+        return [
+            {
+                "role": get_registry().get(role),
+                "account": account,
+                "in_events": (role, account) in from_events,
+                "onchain": (role, account) in onchain,
+            }
+            for role, account in sorted(from_events ^ onchain)
+        ]
+
+
+class AccessManagerEventStream(BaseEventStream):
+    ABI = abis.OZ_ACCESS_MANAGER
+    DECODER = decoder.ACCESS_MANAGER
+
+    EVENTS = [
+        "RoleGranted",
+        "RoleRevoked",
+        "RoleGuardianChanged",
+        "RoleAdminChanged",
+        "RoleLabel",
+        "TargetFunctionRoleUpdated",
+        "RoleGrantDelayChanged",
+        "TargetClosed",
+        "TargetAdminDelayUpdated",
+    ]
+
+    def __init__(self, contract_address, provider=None, header_cache=None, chain=None):
+        super().__init__(contract_address, provider, header_cache, chain)
+        self._schedule_stream = None
+
+    def _parse_events(self, events):
         event_stream = [
             {
-                "event": e.event,
-                "args": e.args,
-                "order": (e.blockNumber, e.logIndex),
+                "event": e["event"],
+                "args": e["args"],
+                "order": (e["blockNumber"], e["logIndex"]),
             }
             for e in events
         ]
 
-        self._event_stream = sorted(event_stream, key=lambda e: e["order"])
+        return sorted(event_stream, key=lambda e: e["order"])
+
+    def _load_stream(self):
+        self._event_stream = self._parse_events(self._get_events(self.EVENTS))
+
+    @property
+    def schedule_stream(self):
+        """OperationScheduled, OperationExecuted and OperationCanceled events, in chronological order"""
+        if self._schedule_stream is None:
+            self._schedule_stream = self._parse_events(self._get_events(SCHEDULE_EVENTS))
+        return self._schedule_stream
+
+    @property
+    def pending_operations(self) -> PendingOperations:
+        """The operations scheduled on this manager that weren't executed or canceled yet"""
+        pending = PendingOperations()
+        pending.apply_events(self.contract_address, self.schedule_stream)
+        return pending
 
     @property
     def snapshot(self) -> am.AccessManager:
@@ -111,193 +407,124 @@ class AccessManagerEventStream(BaseEventStream):
 
         The snapshot is an instance of AccessManager with the current state of the permissions.
         """
-        return am.AccessManager.from_events(self.stream)
+        return replay.replay_access_manager(self.stream, workers=self.replay_workers)
+
+    @profiled("access_manager.delta")
+    def delta(self, from_block: int, to_block: int = None) -> List[am.Operation]:
+        """The net changes between from_block and to_block (inclusive, by default the latest block), as the
+        operations `compare()` returns for the states before and after.
+
+        Only the events in the range are fetched. The state before the range of the memberships, roles,
+        function roles and targets they touch comes from the loaded stream, which must cover the blocks before
+        from_block, or from batched reads of the contract at the block before. Labels can't be read, so
+        without a loaded stream every label set in the range shows up.
+
+        The grants and delay changes are resolved at the timestamp of to_block. The ones that take effect
+        later are returned last, with a `since` arg (see the delta module).
+        """
+        to_block = self._latest_block() if to_block is None else to_block
+        events = self._parse_events(self._get_events(self.EVENTS, from_block=from_block, to_block=to_block))
+        timestamp = self.provider.w3.eth.get_block(to_block)["timestamp"]
+        net, pending = delta.collapse_at(
+            events, delta.access_manager_change, delta.access_manager_since, timestamp
+        )
+        prior = self._prior_state(
+            net.keys(),
+            delta.access_manager_change,
+            delta.access_manager_default,
+            delta.access_manager_read,
+            from_block,
+            delta.access_manager_value,
+        )
+        return delta.access_manager_operations(
+            delta.changes(net, prior)
+        ) + delta.access_manager_pending_operations(pending)
+
+    @property
+    def timeline(self) -> MembershipTimeline:
+        """History of (role, account) memberships, keyed by role id"""
+        return MembershipTimeline.from_access_manager_stream(self.stream)
 
     @property
     def snapshot_dict(self) -> dict:
         return self.snapshot.as_dict()
 
-    def compare(self, snapshot: am.AccessManager):
-        """Compares the current snapshot with the given one. Returns the differences.
+    def discover_targets(self, authority_index) -> set:
+        """The contracts whose authority is this manager, configured or not. Updates the AuthorityIndex
+        (see the discovery module) with the blocks it didn't scan yet."""
+        authority_index.update()
+        return authority_index.managed_by(self.contract_address)
 
-        snapshot must be a snapshot previously obtained from the snapshot property.
+    def verify(self, snapshot: am.AccessManager = None, block_identifier="latest"):
+        """Checks a snapshot against the on-chain state of the manager, with batched hasRole,
+        getTargetFunctionRole, getRoleAdmin and getRoleGuardian calls through Multicall3.
 
-        The differences are returned as a series of operations to apply to bring the current state to the
-        snapshot state.
+        Without a snapshot it verifies the one built from the events. Returns the checks that don't match.
         """
-        current = self.snapshot
-        differences = []
-
-        for role_id, current_role in current.roles.items():
-            snapshot_role = snapshot.roles.get(role_id, am.Role(id=role_id, label=""))
-
-            if current_role.label != snapshot_role.label:
-                differences.append(
-                    am.Operation("labelRole", {"roleId": current_role, "label": snapshot_role.label})
-                )
-            if current.get_role_admin(current_role) != snapshot.get_role_admin(snapshot_role):
-                differences.append(
-                    am.Operation(
-                        "setRoleAdmin",
-                        {"roleId": current_role, "admin": snapshot.get_role_admin(snapshot_role)},
-                    )
+        if snapshot is None:
+            snapshot = self.snapshot
+        address = self.contract_address
+
+        checks = []
+        for role in snapshot.roles.values():
+            checks.append(
+                (
+                    {"check": "getRoleAdmin", "roleId": role.id},
+                    Call(address, "getRoleAdmin(uint64)", (role.id,), ("uint64",)),
+                    snapshot.get_role_admin(role).id,
                 )
-            if current.get_role_guardian(current_role) != snapshot.get_role_guardian(snapshot_role):
-                differences.append(
-                    am.Operation(
-                        "setRoleGuardian",
-                        {"roleId": current_role, "guardian": snapshot.get_role_guardian(snapshot_role)},
-                    )
+            )
+            checks.append(
+                (
+                    {"check": "getRoleGuardian", "roleId": role.id},
+                    Call(address, "getRoleGuardian(uint64)", (role.id,), ("uint64",)),
+                    snapshot.get_role_guardian(role).id,
                 )
-            if current_role.grant_delay != snapshot_role.grant_delay:
-                differences.append(
-                    am.Operation(
-                        "setGrantDelay",
-                        {"roleId": current_role, "newDelay": snapshot_role.grant_delay},
+            )
+            for member in snapshot.get_role_members(role):
+                checks.append(
+                    (
+                        {"check": "hasRole", "roleId": role.id, "account": member.address},
+                        Call(
+                            address, "hasRole(uint64,address)", (role.id, member.address), ("bool", "uint32")
+                        ),
+                        (True, int(member.execution_delay.total_seconds())),
                     )
                 )
-
-            if current.get_role_members(current_role) != snapshot.get_role_members(snapshot_role):
-                for member in current.get_role_members(current_role) - snapshot.get_role_members(
-                    snapshot_role
-                ):
-                    differences.append(
-                        am.Operation("revokeRole", {"roleId": current_role, "account": member.address})
-                    )
-
-                for member in snapshot.get_role_members(snapshot_role) - current.get_role_members(
-                    current_role
-                ):
-                    differences.append(
-                        am.Operation(
-                            "grantRole",
-                            {
-                                "roleId": current_role,
-                                "account": member.address,
-                                "executionDelay": member.execution_delay,
-                            },
-                        )
-                    )
-
-            # For common members just need to check the execution delay is properly set
-            for common_member in current.get_role_members(current_role) & snapshot.get_role_members(
-                snapshot_role
-            ):
-                # Can't get te members from iterating the intersection, because we need to distinguish them
-                current_member = [
-                    member for member in current.get_role_members(current_role) if member == common_member
-                ][0]
-                snapshot_member = [
-                    member for member in snapshot.get_role_members(snapshot_role) if member == common_member
-                ][0]
-                if current_member.execution_delay != snapshot_member.execution_delay:
-                    differences.append(
-                        am.Operation(
-                            "grantRole",
-                            {
-                                "roleId": current_role,
-                                "account": snapshot_member.address,
-                                "executionDelay": snapshot_member.execution_delay,
-                            },
-                        )
-                    )
-
-        snapshot_targets = set(snapshot.targets.values())
-        current_targets = set(current.targets.values())
-        if current_targets != snapshot_targets:
-            # The targets not present in the snapshot need to be reset to default values
-            for target in current_targets - snapshot_targets:
-                if target.closed:
-                    differences.append(am.Operation("setTargetClosed", {"target": target, "closed": False}))
-                if target.admin_delay != timedelta(0):
-                    differences.append(am.Operation("setTargetAdminDelay", {"target": target, "newDelay": 0}))
-
-            # The targets in snapshot but missing from current need to be properly configured
-            for target in snapshot_targets - current_targets:
-                if target.closed:
-                    differences.append(
-                        am.Operation("setTargetClosed", {"target": target, "closed": target.closed})
-                    )
-                if target.admin_delay != timedelta(0):
-                    differences.append(
-                        am.Operation(
-                            "setTargetAdminDelay", {"target": target, "newDelay": target.admin_delay}
-                        )
-                    )
-
-            # The common targets need to be checked for matching config
-            for common_target in current_targets & snapshot_targets:
-                current_target = [target for target in current_targets if target == common_target][0]
-                snapshot_target = [target for target in snapshot_targets if target == common_target][0]
-                if current_target.closed != snapshot_target.closed:
-                    differences.append(
-                        am.Operation(
-                            "setTargetClosed", {"target": current_target, "closed": snapshot_target.closed}
-                        )
-                    )
-                if current_target.admin_delay != snapshot_target.admin_delay:
-                    differences.append(
-                        am.Operation(
-                            "setTargetAdminDelay",
-                            {"target": current_target, "newDelay": snapshot_target.admin_delay},
-                        )
-                    )
-
-        current_selectors = {
-            (target, selector_role.selector)
-            for target, selector_roles in current.target_allowed_roles.items()
-            for selector_role in selector_roles
-        }
-        snapshot_selectors = {
-            (target, selector_role.selector)
-            for target, selector_roles in snapshot.target_allowed_roles.items()
-            for selector_role in selector_roles
-        }
-
-        if current_selectors != snapshot_selectors:
-            # The target -> selectors not present in the snapshot need to be assigned to ADMIN_ROLE
-            for target, selector in current_selectors - snapshot_selectors:
-                differences.append(
-                    am.Operation(
-                        "setTargetFunctionRole",
+        for target, selector_roles in snapshot.target_allowed_roles.items():
+            for selector_role in selector_roles:
+                checks.append(
+                    (
                         {
+                            "check": "getTargetFunctionRole",
                             "target": target,
-                            "selectors": {selector},
-                            "roleId": snapshot.ADMIN_ROLE,
+                            "selector": selector_role.selector,
                         },
+                        Call(
+                            address,
+                            "getTargetFunctionRole(address,bytes4)",
+                            (target, to_bytes(hexstr=selector_role.selector)),
+                            ("uint64",),
+                        ),
+                        selector_role.role.id,
                     )
                 )
 
-            # The target -> selectors in snapshot missing from current need to be set on current
-            for target, selector in snapshot_selectors - current_selectors:
-                role = snapshot.get_target_allowed_role(target, selector)
-                if role == snapshot.ADMIN_ROLE:
-                    continue
-                differences.append(
-                    am.Operation(
-                        "setTargetFunctionRole",
-                        {
-                            "target": target,
-                            "selectors": {selector},
-                            "roleId": role,
-                        },
-                    )
-                )
+        results = aggregate(
+            self.provider.w3, [call for _, call, _ in checks], block_identifier=block_identifier
+        )
+        return [
+            {**check, "expected": expected, "onchain": result}
+            for (check, _, expected), result in zip(checks, results)
+            if result != expected
+        ]
 
-        # The common target -> selectors need to be checked for matching role
-        for common_target, common_selector in current_selectors & snapshot_selectors:
-            current_role = current.get_target_allowed_role(common_target, common_selector)
-            snapshot_role = snapshot.get_target_allowed_role(common_target, common_selector)
-            if current_role != snapshot_role:
-                differences.append(
-                    am.Operation(
-                        "setTargetFunctionRole",
-                        {
-                            "target": common_target,
-                            "selectors": {common_selector},
-                            "roleId": snapshot_role,
-                        },
-                    )
-                )
+    def compare(self, snapshot: am.AccessManager):
+        """Compares the current snapshot with the given one. Returns the differences.
+
+        snapshot must be a snapshot previously obtained from the snapshot property.
 
-        return differences
+        The differences are returned as a series of operations to apply to bring the current state to the
+        snapshot state.
+        """
+        return am.compare(self.snapshot, snapshot)
@@ -0,0 +1,167 @@
+"""Per-chain configuration and concurrent audits across chains.
+
+The chains are configured in a json file keyed by chain id. The RPC urls may reference environment variables:
+
+    {
+        "1": {"name": "mainnet", "rpc_url": "https://eth-mainnet.g.alchemy.com/v2/$ALCHEMY_KEY"},
+        "137": {"rpc_url": "$POLYGON_RPC", "max_block_range": 2000, "confirmations": 64, "poa": true},
+        "42161": {"rpc_url": "$ARBITRUM_RPC", "max_block_range": 10000, "max_concurrency": 2}
+    }
+
+`audit` fetches the contracts of all the chains at the same time, each chain on its own pool so a slow or
+rate limited chain doesn't hold the others back, and yields the results tagged with their chain id.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from . import pipeline
+from .profiling import get_profiler
+
+EXPLORER_URL_TEMPLATES = {
+    1: "https://etherscan.io/address/{address}",
+    10: "https://optimistic.etherscan.io/address/{address}",
+    56: "https://bscscan.com/address/{address}",
+    100: "https://gnosisscan.io/address/{address}",
+    137: "https://polygonscan.com/address/{address}",
+    8453: "https://basescan.org/address/{address}",
+    42161: "https://arbiscan.io/address/{address}",
+    43114: "https://snowtrace.io/address/{address}",
+    80002: "https://amoy.polygonscan.com/address/{address}",
+    11155111: "https://sepolia.etherscan.io/address/{address}",
+}
+
+DEFAULT_EXPLORER_URL_TEMPLATE = EXPLORER_URL_TEMPLATES[137]
+
+
+_provider_lock = threading.Lock()
+
+
+@dataclass
+class ChainConfig:
+    chain_id: int
+    rpc_url: str
+    name: Optional[str] = None
+    explorer_url_template: Optional[str] = None
+    max_block_range: Optional[int] = None  # Blocks per eth_getLogs request, None for no limit
+    confirmations: int = 0  # Blocks behind the head considered final
+    max_concurrency: int = 4  # Simultaneous fetches on this chain
+    poa: bool = False  # Needs the extraData middleware (e.g. Polygon)
+    _provider: object = field(default=None, init=False, compare=False, repr=False)
+
+    @classmethod
+    def from_dict(cls, chain_id, data: dict) -> "ChainConfig":
+        return cls(
+            chain_id=int(chain_id),
+            rpc_url=os.path.expandvars(data["rpc_url"]),
+            name=data.get("name"),
+            explorer_url_template=data.get("explorer_url_template"),
+            max_block_range=data.get("max_block_range"),
+            confirmations=data.get("confirmations", 0),
+            max_concurrency=data.get("max_concurrency", 4),
+            poa=data.get("poa", False),
+        )
+
+    @property
+    def label(self) -> str:
+        return self.name or str(self.chain_id)
+
+    def explorer_url(self, address) -> str:
+        template = self.explorer_url_template or EXPLORER_URL_TEMPLATES.get(
+            self.chain_id, DEFAULT_EXPLORER_URL_TEMPLATE
+        )
+        return template.format(address=address)
+
+    def provider(self):
+        """The eth-prototype provider of this chain, created on first use"""
+        with _provider_lock:
+            if self._provider is None:
+                from ethproto.w3wrappers import W3Provider
+                from web3 import Web3
+
+                w3 = Web3(Web3.HTTPProvider(self.rpc_url))
+                if self.poa:
+                    from web3.middleware import ExtraDataToPOAMiddleware
+
+                    w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+                self._provider = W3Provider(w3)
+            return self._provider
+
+
+def load_chains(path) -> Dict[int, ChainConfig]:
+    with open(path, "r") as f:
+        data = json.load(f)
+    return {int(chain_id): ChainConfig.from_dict(chain_id, config) for chain_id, config in data.items()}
+
+
+def parse_target(target: str) -> Tuple[int, str]:
+    """Parses a `<chain id>:<address>` command line target"""
+    chain_id, _, address = target.partition(":")
+    if not address:
+        raise ValueError(f"Expected <chain id>:<address>, got {target}")
+    return int(chain_id), address
+
+
+def _snapshot(chain: ChainConfig, address: str, contract_type: str):
+    from .chaindata import AccessControlEventStream, AccessManagerEventStream
+
+    stream_class = AccessManagerEventStream if contract_type == "AccessManager" else AccessControlEventStream
+    with get_profiler().span(f"chains.fetch.{chain.label}"):
+        stream = stream_class(address, chain=chain)
+        stream.stream
+    if contract_type == "AccessManager":
+        snapshot = stream.snapshot
+        return {**snapshot.as_dict(), "content_hash": "0x" + snapshot.content_hash.hex()}
+    return [
+        {
+            "role": str(item["role"]),
+            "role_hash": "0x" + item["role"].hash.hex(),
+            "members": [{"address": member, "url": chain.explorer_url(member)} for member in item["members"]],
+        }
+        for item in stream.snapshot
+    ]
+
+
+def audit(
+    targets: Iterable[Tuple[int, str]], chains: Dict[int, ChainConfig], contract_type="AccessManager"
+) -> Iterator[dict]:
+    """Snapshots every (chain id, address), all the chains at the same time and at most max_concurrency
+    contracts at a time on each chain.
+
+    Yields a result per contract, tagged with its chain id, as soon as it's done.
+    """
+    targets = list(targets)
+    unknown = {chain_id for chain_id, _ in targets} - chains.keys()
+    if unknown:
+        raise ValueError(f"No configuration for chains {', '.join(map(str, sorted(unknown)))}")
+
+    pools = {
+        chain_id: ThreadPoolExecutor(
+            max_workers=chain.max_concurrency, thread_name_prefix=f"chain-{chain_id}"
+        )
+        for chain_id, chain in chains.items()
+    }
+    try:
+        stages = [
+            lambda target, _: pools[target[0]].submit(_snapshot, chains[target[0]], target[1], contract_type)
+        ]
+        for done in pipeline.run_pipeline(targets, stages):
+            chain_id, address = done.item
+            result = {
+                "chain_id": chain_id,
+                "chain": chains[chain_id].label,
+                "address": address,
+                "url": chains[chain_id].explorer_url(address),
+                "type": contract_type,
+            }
+            if done.error is not None:
+                yield {**result, "error": pipeline.describe(done.error)}
+            else:
+                yield {**result, "snapshot": done.result}
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
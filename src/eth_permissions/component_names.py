@@ -0,0 +1,86 @@
+"""Names of the components from the chain.
+
+The component roles of unknown components (see `Registry.get`) have a Component without a name, rendered as
+`Component<0x...>`. Most components are tokens or vaults, so their `name()` (or `symbol()`) is a good label.
+
+The unnamed components of a whole stream are collected first and resolved with a single batch of Multicall3
+calls. The names (and the components without one) are cached per chain, optionally in a json file:
+
+    names = ComponentNames("component-names.json")
+    stream = AccessControlEventStream(address)
+    stream.component_names = names
+    stream.snapshot  # Roles like Role:LEVEL1_ROLE@USD Coin
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional
+
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+
+from .access_control import Component, get_registry
+from .multicall import Call, aggregate
+from .profiling import get_profiler
+
+
+def component_address(component: Component) -> str:
+    # Component addresses rebuilt from a role hash lose their leading zero bytes
+    return to_checksum_address(bytes(component.address).rjust(20, b"\0"))
+
+
+class ComponentNames:
+    """Cache of the name of each component address, per chain id"""
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self.names: Dict[int, Dict[str, Optional[str]]] = {}  # chain id -> address -> name (None if unnamed)
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "r") as f:
+                self.names = {int(chain_id): names for chain_id, names in json.load(f).items()}
+
+    def save(self):
+        with self._lock, open(self.cache_path, "w") as f:
+            json.dump(self.names, f)
+
+    def resolve(self, w3, addresses: Iterable[str]) -> Dict[str, Optional[str]]:
+        """The names of the addresses, fetching the ones not cached yet in a single batch of calls"""
+        addresses = {to_checksum_address(address) for address in addresses}
+        with self._lock:
+            names = self.names.setdefault(w3.eth.chain_id, {})
+            missing = sorted(address for address in addresses if address not in names)
+        if missing:
+            calls = [
+                Call(address, signature, (), ("string",))
+                for address in missing
+                for signature in ("name()", "symbol()")
+            ]
+            with get_profiler().span("component_names.fetch"):
+                results = aggregate(w3, calls)
+            with self._lock:
+                for index, address in enumerate(missing):
+                    name, symbol = results[2 * index : 2 * index + 2]
+                    names[address] = (name or "").strip() or (symbol or "").strip() or None
+            if self.cache_path:
+                self.save()
+        return {address: names[address] for address in addresses}
+
+    def name_roles(self, w3, roles: Iterable) -> int:
+        """Names the unnamed components of the roles (in place) and registers them, so later lookups of
+        their roles get the names too. Returns the number of components named."""
+        unnamed = {}
+        for role in roles:
+            if role.component is not None and not role.component.name:
+                unnamed.setdefault(component_address(role.component), []).append(role.component)
+        if not unnamed:
+            return 0
+        resolved = {address: name for address, name in self.resolve(w3, unnamed).items() if name}
+        for address, name in resolved.items():
+            for component in unnamed[address]:
+                component.name = name
+        get_registry().add_components(
+            Component(HexBytes(address), name) for address, name in resolved.items()
+        )
+        return len(resolved)
@@ -0,0 +1,134 @@
+"""Specialized decoder for the logs of the AccessControl and AccessManager events.
+
+The layouts of the events in `abis` are fixed and small: every field is either a 32 bytes topic or a 32 bytes
+data slot (plus the tail of the `string`/`bytes` ones). Instead of going through web3's generic event
+decoding (eth_abi + AttributeDict for every log), a decoder is compiled once per topic0 that slices the
+topics and the data of the raw log directly.
+
+The decoded events are plain dicts with the same keys as web3's ones:
+
+    {"event": "RoleGranted", "args": {"roleId": 1, "account": "0x...", ...}, "blockNumber": 10, "logIndex": 0,
+     "transactionHash": b"...", "address": "0x..."}
+"""
+
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List
+
+from eth_utils import event_abi_to_log_topic, to_bytes, to_checksum_address
+
+from . import abis
+
+
+class UnknownEvent(ValueError):
+    pass
+
+
+def _as_bytes(value) -> bytes:
+    # Raw JSON-RPC logs have hex strings, the ones formatted by web3 have HexBytes
+    return to_bytes(hexstr=value) if isinstance(value, str) else bytes(value)
+
+
+def _as_int(value) -> int:
+    return int(value, 16) if isinstance(value, str) else value
+
+
+@lru_cache(maxsize=65536)
+def _address(word: bytes) -> str:
+    # The checksum (a keccak per address) is the slowest part of the decoding and the same accounts repeat
+    return to_checksum_address(word[12:])
+
+
+def _uint(word: bytes) -> int:
+    return int.from_bytes(word, "big")
+
+
+def _bool(word: bytes) -> bool:
+    return word[31] != 0
+
+
+def _word_decoder(type_: str) -> Callable[[bytes], object]:
+    if type_ == "address":
+        return _address
+    if type_ == "bool":
+        return _bool
+    if type_.startswith("uint"):
+        return _uint
+    if type_.startswith("bytes") and type_ != "bytes":
+        size = int(type_[len("bytes") :])
+        return lambda word: word[:size]
+    raise ValueError(f"Unsupported type {type_}")
+
+
+def _dynamic(data: bytes, offset_word: bytes) -> bytes:
+    offset = int.from_bytes(offset_word, "big")
+    length = int.from_bytes(data[offset : offset + 32], "big")
+    return data[offset + 32 : offset + 32 + length]
+
+
+def compile_event(abi_entry: dict) -> Callable[[list, bytes], dict]:
+    """A function (topics, data) -> args for the event, with the topics and the data as bytes"""
+    fields = []  # (name, from topics, position, decode)
+    topic, slot = 1, 0
+    for arg in abi_entry["inputs"]:
+        if arg["indexed"]:
+            if arg["type"] in ("string", "bytes"):
+                raise ValueError(f"Unsupported indexed {arg['type']} in {abi_entry['name']}")
+            fields.append((arg["name"], True, topic, _word_decoder(arg["type"])))
+            topic += 1
+        else:
+            if arg["type"] == "string":
+                fields.append(
+                    (arg["name"], False, slot, lambda value, data: _dynamic(data, value).decode("utf-8"))
+                )
+            elif arg["type"] == "bytes":
+                fields.append((arg["name"], False, slot, lambda value, data: _dynamic(data, value)))
+            else:
+                decode = _word_decoder(arg["type"])
+                fields.append((arg["name"], False, slot, lambda value, data, decode=decode: decode(value)))
+            slot += 1
+
+    def decode(topics, data):
+        args = {}
+        for name, indexed, position, decode_field in fields:
+            if indexed:
+                args[name] = decode_field(topics[position])
+            else:
+                args[name] = decode_field(data[position * 32 : position * 32 + 32], data)
+        return args
+
+    return decode
+
+
+class LogDecoder:
+    """Decodes the logs of the events of an ABI, keyed by topic0"""
+
+    def __init__(self, abi: Iterable[dict]):
+        self.decoders: Dict[bytes, tuple] = {}
+        for entry in abi:
+            if entry["type"] == "event":
+                self.decoders[bytes(event_abi_to_log_topic(entry))] = (entry["name"], compile_event(entry))
+
+    def topics(self, event_names) -> List[bytes]:
+        return [topic for topic, (name, _) in self.decoders.items() if name in event_names]
+
+    def decode(self, log) -> dict:
+        topics = [_as_bytes(topic) for topic in log["topics"]]
+        try:
+            name, decode_args = self.decoders[topics[0]]
+        except (IndexError, KeyError):
+            raise UnknownEvent(f"Unknown event {'0x' + topics[0].hex() if topics else 'without topics'}")
+        return {
+            "event": name,
+            "args": decode_args(topics, _as_bytes(log["data"])),
+            "blockNumber": _as_int(log["blockNumber"]),
+            "logIndex": _as_int(log["logIndex"]),
+            "transactionHash": _as_bytes(log["transactionHash"]),
+            "address": to_checksum_address(log["address"]),
+        }
+
+    def decode_all(self, logs) -> List[dict]:
+        return [self.decode(log) for log in logs]
+
+
+ACCESS_CONTROL = LogDecoder(abis.OZ_ACCESS_CONTROL)
+ACCESS_MANAGER = LogDecoder(abis.OZ_ACCESS_MANAGER)
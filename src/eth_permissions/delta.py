@@ -0,0 +1,302 @@
+"""Net permission changes in a block range, without replaying the whole history.
+
+The events of the range are collapsed to the last value of each key they touch: the (role, account)
+memberships, the admin, guardian, grant delay and label of the roles, the role of each (target, selector) and
+the closed flag and admin delay of the targets. Only the state of those keys before the range is looked up,
+in the already loaded event stream (indexed by key once, see KeyIndex) or with targeted reads at the block
+before the range (batched through Multicall3), so the cost depends on the activity in the range and not on the
+length of the history. The keys that end up with the value they had before are dropped.
+
+The changes are returned as the operations `compare()` returns for the states before and after the range.
+
+AccessManager grants and delay changes take effect at their `since`. The range is resolved at the timestamp of
+its last block: the changes that aren't in effect by then are returned after the rest, as operations with a
+`since` arg. Changes scheduled before the range that take effect within it aren't reported, since only the
+keys touched by the events of the range are looked at.
+"""
+
+from bisect import bisect_left
+from datetime import timedelta
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from eth_utils import add_0x_prefix, to_bytes, to_checksum_address
+from hexbytes import HexBytes
+
+from .access_control import get_registry
+from .access_manager import AccessManager, Operation, Role, Target
+from .multicall import Call, aggregate
+
+# (key, value) of an event
+KeyValue = Callable[[dict], Tuple[Hashable, object]]
+
+
+def collapse(events: Iterable[dict], key_value: KeyValue) -> dict:
+    """The last value of each key, from events in chronological order (at least within each key)"""
+    net = {}
+    for event in events:
+        key, value = key_value(event)
+        net[key] = value
+    return net
+
+
+def collapse_at(
+    events: Iterable[dict], key_value: KeyValue, since: Callable, timestamp: int
+) -> Tuple[dict, dict]:
+    """Like collapse, for changes that take effect at `since(event)`: the last value of each key in effect at
+    the timestamp, and the (since, value) of the keys with a change that's still pending then. A change in
+    effect discards the pending one of its key."""
+    net, pending = {}, {}
+    for event in events:
+        key, value = key_value(event)
+        effective_at = since(event)
+        if effective_at <= timestamp:
+            net[key] = value
+            pending.pop(key, None)
+        else:
+            pending[key] = (effective_at, value)
+    return net, pending
+
+
+class KeyIndex:
+    """The values each key of a loaded event stream took, in chronological order. Built once per stream, so
+    looking up the value of a key before any point of the history is a binary search instead of a pass over
+    the whole stream."""
+
+    def __init__(self, stream: Iterable[dict], key_value: KeyValue):
+        self._history = {}
+        for event in sorted(stream, key=lambda event: event["order"]):
+            key, value = key_value(event)
+            orders, values = self._history.setdefault(key, ([], []))
+            orders.append(event["order"])
+            values.append(value)
+
+    def prior(self, keys, default: Callable, before: tuple) -> dict:
+        """The values of the keys before the `before` (block, log index) order"""
+        prior = {}
+        for key in keys:
+            orders, values = self._history.get(key, ((), ()))
+            index = bisect_left(orders, before)
+            prior[key] = values[index - 1] if index else default(key)
+        return prior
+
+
+def prior_from_chain(w3, address, keys, read: Callable, block_identifier, value: Callable = None) -> dict:
+    """The values of the keys read from the contract at the given block, with a single batch of calls, and
+    converted with `value(key, result)` if given. The values that can't be read (reverted calls, keys without
+    a getter) are None."""
+    calls = [(key, read(address, key)) for key in keys]
+    calls = [(key, call) for key, call in calls if call is not None]
+    results = aggregate(w3, [call for _, call in calls], block_identifier=block_identifier)
+    prior = dict.fromkeys(keys)
+    for (key, _), result in zip(calls, results):
+        prior[key] = result if value is None or result is None else value(key, result)
+    return prior
+
+
+def changes(net: dict, prior: dict) -> List[tuple]:
+    """The (key, before, after) of the keys whose value changed. Unknown (None) prior values count as
+    changed."""
+    return [(key, prior.get(key), after) for key, after in net.items() if prior.get(key) != after]
+
+
+# AccessControl
+
+
+def access_control_member(event) -> tuple:
+    """Key and value of an AccessControlEventStream.stream event"""
+    return ("member", bytes(event["role"].hash), event["subject"]), event["event"] == "RoleGranted"
+
+
+def access_control_default(key) -> bool:
+    return False
+
+
+def access_control_read(address, key) -> Call:
+    _, role_hash, account = key
+    return Call(address, "hasRole(bytes32,address)", (role_hash, account), ("bool",))
+
+
+def access_control_admins(events: List[dict]) -> Tuple[dict, dict]:
+    """The last and the previous admin of each role changed by the RoleAdminChanged events, in chronological
+    order. The events carry the previous admin, so no lookup is needed."""
+    net, prior = {}, {}
+    for event in events:
+        key = ("admin", bytes(event["args"]["role"]))
+        prior.setdefault(key, bytes(event["args"]["previousAdminRole"]))
+        net[key] = bytes(event["args"]["newAdminRole"])
+    return net, prior
+
+
+def access_control_operations(changed: List[tuple]) -> List[Operation]:
+    """The grantRole, revokeRole and setRoleAdmin operations, in the order of access_control.compare"""
+
+    def sort_key(change):
+        (kind, role_hash, *account), _, after = change
+        return role_hash, 0 if kind == "admin" else 2 if after else 1, account
+
+    registry = get_registry()
+    operations = []
+    for (kind, role_hash, *account), _, after in sorted(changed, key=sort_key):
+        role = registry.get(HexBytes(role_hash))
+        if kind == "admin":
+            operations.append(
+                Operation("setRoleAdmin", {"role": role, "admin": registry.get(HexBytes(after))})
+            )
+        else:
+            operations.append(
+                Operation("grantRole" if after else "revokeRole", {"role": role, "account": account[0]})
+            )
+    return operations
+
+
+# AccessManager
+
+_ACCESS_MANAGER_DEFAULTS = {
+    "label": "",
+    "admin": AccessManager.ADMIN_ROLE.id,
+    "guardian": AccessManager.ADMIN_ROLE.id,
+    "grantDelay": 0,
+    "member": (False, 0),
+    "closed": False,
+    "adminDelay": 0,
+    "function": AccessManager.ADMIN_ROLE.id,
+}
+_ACCESS_MANAGER_ORDER = {kind: index for index, kind in enumerate(_ACCESS_MANAGER_DEFAULTS)}
+
+
+def access_manager_change(event) -> tuple:
+    """Key and value of an AccessManagerEventStream.stream event"""
+    name, args = event["event"], event["args"]
+    if name == "RoleGranted":
+        return ("member", args["roleId"], to_checksum_address(args["account"])), (True, args["delay"])
+    elif name == "RoleRevoked":
+        return ("member", args["roleId"], to_checksum_address(args["account"])), (False, 0)
+    elif name == "RoleAdminChanged":
+        return ("admin", args["roleId"]), args["admin"]
+    elif name == "RoleGuardianChanged":
+        return ("guardian", args["roleId"]), args["guardian"]
+    elif name == "RoleGrantDelayChanged":
+        return ("grantDelay", args["roleId"]), args["delay"]
+    elif name == "RoleLabel":
+        return ("label", args["roleId"]), args["label"]
+    elif name == "TargetFunctionRoleUpdated":
+        selector = add_0x_prefix(HexBytes(args["selector"]).hex())
+        return ("function", to_checksum_address(args["target"]), selector), args["roleId"]
+    elif name == "TargetClosed":
+        return ("closed", to_checksum_address(args["target"])), args["closed"]
+    elif name == "TargetAdminDelayUpdated":
+        return ("adminDelay", to_checksum_address(args["target"])), args["delay"]
+    raise RuntimeError(f"Unexpected event {name}")
+
+
+def access_manager_since(event) -> int:
+    """When the change of an AccessManagerEventStream.stream event takes effect. Only grants and delay
+    changes carry a since, the rest are immediate."""
+    return event["args"].get("since", 0)
+
+
+def access_manager_default(key):
+    return _ACCESS_MANAGER_DEFAULTS[key[0]]
+
+
+def access_manager_read(address, key) -> Optional[Call]:
+    """The call that reads the current value of a key. Labels are only in the events."""
+    kind, *args = key
+    if kind == "member":
+        return Call(address, "hasRole(uint64,address)", tuple(args), ("bool", "uint32"))
+    elif kind == "admin":
+        return Call(address, "getRoleAdmin(uint64)", tuple(args), ("uint64",))
+    elif kind == "guardian":
+        return Call(address, "getRoleGuardian(uint64)", tuple(args), ("uint64",))
+    elif kind == "grantDelay":
+        return Call(address, "getRoleGrantDelay(uint64)", tuple(args), ("uint32",))
+    elif kind == "function":
+        target, selector = args
+        return Call(
+            address, "getTargetFunctionRole(address,bytes4)", (target, to_bytes(hexstr=selector)), ("uint64",)
+        )
+    elif kind == "closed":
+        return Call(address, "isTargetClosed(address)", tuple(args), ("bool",))
+    elif kind == "adminDelay":
+        return Call(address, "getTargetAdminDelay(address)", tuple(args), ("uint32",))
+    return None
+
+
+def access_manager_value(key, result):
+    """The value of a key read with access_manager_read. Memberships that aren't effective yet (or anymore)
+    are (False, 0), like a RoleRevoked."""
+    if key[0] == "member":
+        is_member, delay = result
+        return (True, delay) if is_member else (False, 0)
+    return result
+
+
+def _role(role_id: int, labels: Dict[int, str]) -> Role:
+    for role in (AccessManager.ADMIN_ROLE, AccessManager.PUBLIC_ROLE):
+        if role.id == role_id:
+            return role
+    return Role(role_id, labels.get(role_id))
+
+
+def access_manager_operations(changed: List[tuple]) -> List[Operation]:
+    """The operations of the changes, grouped like access_manager.compare: roles by id, then targets"""
+
+    def sort_key(change):
+        (kind, *args), _, after = change
+        if kind in ("closed", "adminDelay", "function"):
+            return 1, args[0], _ACCESS_MANAGER_ORDER[kind], args[1:]
+        return 0, args[0], _ACCESS_MANAGER_ORDER[kind], args[1:]
+
+    labels = {key[1]: after for key, _, after in changed if key[0] == "label"}
+    operations = []
+    for (kind, *args), _, after in sorted(changed, key=sort_key):
+        if kind == "function":
+            target, selector = args
+            operations.append(
+                Operation(
+                    "setTargetFunctionRole",
+                    {"target": target, "selectors": {selector}, "roleId": _role(after, labels)},
+                )
+            )
+        elif kind == "closed":
+            operations.append(Operation("setTargetClosed", {"target": Target(args[0]), "closed": after}))
+        elif kind == "adminDelay":
+            operations.append(
+                Operation(
+                    "setTargetAdminDelay", {"target": Target(args[0]), "newDelay": timedelta(seconds=after)}
+                )
+            )
+        else:
+            role = _role(args[0], labels)
+            if kind == "label":
+                operations.append(Operation("labelRole", {"roleId": role, "label": after}))
+            elif kind == "admin":
+                operations.append(Operation("setRoleAdmin", {"roleId": role, "admin": _role(after, labels)}))
+            elif kind == "guardian":
+                operations.append(
+                    Operation("setRoleGuardian", {"roleId": role, "guardian": _role(after, labels)})
+                )
+            elif kind == "grantDelay":
+                operations.append(
+                    Operation("setGrantDelay", {"roleId": role, "newDelay": timedelta(seconds=after)})
+                )
+            elif after[0]:
+                operations.append(
+                    Operation(
+                        "grantRole",
+                        {"roleId": role, "account": args[1], "executionDelay": timedelta(seconds=after[1])},
+                    )
+                )
+            else:
+                operations.append(Operation("revokeRole", {"roleId": role, "account": args[1]}))
+    return operations
+
+
+def access_manager_pending_operations(pending: dict) -> List[Operation]:
+    """The operations of the changes still pending (key -> (since, value)), in activation order, each with
+    its `since` arg"""
+    operations = []
+    for key, (since, value) in sorted(pending.items(), key=lambda item: item[1][0]):
+        (operation,) = access_manager_operations([(key, None, value)])
+        operations.append(Operation(operation.op, {**operation.args, "since": since}))
+    return operations
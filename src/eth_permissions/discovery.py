@@ -0,0 +1,129 @@
+"""Discovery of the contracts managed by an AccessManager.
+
+An AccessManaged contract emits `AuthorityUpdated(address authority)` when its authority is set (also in the
+constructor), but nothing is emitted by the manager itself until a target is configured. Scanning the chain
+for that event gives the current authority of every AccessManaged contract, so the targets of any manager
+are known even if they were never configured.
+
+The scan covers the whole chain once and is cached per chain, later updates only scan the new blocks:
+
+    index = AuthorityIndex(w3, cache_path="authorities-1.json")
+    index.update()
+    index.managed_by("0x...")
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set, Tuple
+
+from eth_utils import keccak, to_checksum_address
+
+from .profiling import get_profiler
+
+AUTHORITY_UPDATED_TOPIC = "0x" + keccak(text="AuthorityUpdated(address)").hex()
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+# eth_getLogs errors of nodes that limit the block range or the number of results of a query
+RANGE_ERROR_CODES = {-32005}
+RANGE_ERROR_MESSAGES = ("query returned more than", "block range", "response size exceeded")
+
+
+def is_range_error(error: Exception) -> bool:
+    """True if the node rejected an eth_getLogs query for its block range or result size"""
+    details = getattr(error, "rpc_response", None) or {}
+    details = details.get("error", details) if isinstance(details, dict) else {}
+    if not details and error.args and isinstance(error.args[0], dict):
+        details = error.args[0]  # ValueError({"code": ..., "message": ...}) of older web3 versions
+    if isinstance(details, dict) and details.get("code") in RANGE_ERROR_CODES:
+        return True
+    message = str(error).lower()
+    return any(text in message for text in RANGE_ERROR_MESSAGES)
+
+
+class AuthorityIndex:
+    """Current authority of every AccessManaged contract of a chain"""
+
+    def __init__(self, w3, cache_path=None, chunk_size=DEFAULT_CHUNK_SIZE, start_block=0, workers=8):
+        self.w3 = w3
+        self.cache_path = cache_path
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.last_block = start_block - 1
+        # target -> (authority, (block, log index) of the last AuthorityUpdated)
+        self.authorities: Dict[str, Tuple[str, Tuple[int, int]]] = {}
+        if cache_path and os.path.exists(cache_path):
+            self._load()
+
+    def _load(self):
+        with open(self.cache_path, "r") as f:
+            cache = json.load(f)
+        if cache["chain_id"] != self.w3.eth.chain_id:
+            raise ValueError(f"{self.cache_path} is the cache of chain {cache['chain_id']}")
+        self.last_block = cache["last_block"]
+        self.authorities = {
+            target: (authority, tuple(order)) for target, (authority, order) in cache["authorities"].items()
+        }
+
+    def save(self):
+        with open(self.cache_path, "w") as f:
+            json.dump(
+                {
+                    "chain_id": self.w3.eth.chain_id,
+                    "last_block": self.last_block,
+                    "authorities": self.authorities,
+                },
+                f,
+            )
+
+    def _get_logs(self, from_block: int, to_block: int) -> List[dict]:
+        """AuthorityUpdated logs of all contracts. Ranges rejected by the node for their size are split in
+        halves, any other error is raised."""
+        try:
+            with get_profiler().span("fetch_authority_logs"):
+                return self.w3.eth.get_logs(
+                    {"fromBlock": from_block, "toBlock": to_block, "topics": [AUTHORITY_UPDATED_TOPIC]}
+                )
+        except Exception as error:
+            if from_block == to_block or not is_range_error(error):
+                raise
+            middle = (from_block + to_block) // 2
+            return self._get_logs(from_block, middle) + self._get_logs(middle + 1, to_block)
+
+    def _apply(self, logs):
+        for log in logs:
+            if log.get("removed"):
+                continue
+            data = bytes(log["data"])
+            if len(data) != 32:
+                continue  # Same signature, different (non AccessManaged) event
+            target = to_checksum_address(log["address"])
+            order = (log["blockNumber"], log["logIndex"])
+            if target not in self.authorities or self.authorities[target][1] < order:
+                self.authorities[target] = (to_checksum_address(data[-20:]), order)
+
+    def update(self, to_block: int = None) -> int:
+        """Scans the blocks after the last scanned one, in concurrent chunks. Returns the last block scanned.
+
+        The progress is saved to the cache after the scan, even if it fails midway.
+        """
+        to_block = self.w3.eth.block_number if to_block is None else to_block
+        chunks = [
+            (start, min(start + self.chunk_size - 1, to_block))
+            for start in range(self.last_block + 1, to_block + 1, self.chunk_size)
+        ]
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for (_, end), logs in zip(chunks, pool.map(lambda chunk: self._get_logs(*chunk), chunks)):
+                    self._apply(logs)
+                    self.last_block = end
+        finally:
+            if self.cache_path:
+                self.save()
+        return self.last_block
+
+    def managed_by(self, manager: str) -> Set[str]:
+        """The contracts whose current authority is the manager"""
+        manager = to_checksum_address(manager)
+        return {target for target, (authority, _) in self.authorities.items() if authority == manager}
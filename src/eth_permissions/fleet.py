@@ -0,0 +1,103 @@
+"""Drift detection for a fleet of AccessManager deployments.
+
+The desired state is described by a manifest, a json file mapping each AccessManager address to the file
+with its reference snapshot (as printed by the command line tool). Relative paths are resolved from the
+manifest's directory:
+
+    {
+        "0x1234...": "snapshots/mainnet-ensuro.json",
+        "0x5678...": "snapshots/polygon-ensuro.json"
+    }
+
+The event streams are fetched concurrently on a thread pool (it's all waiting on RPC) and each comparison
+runs on a process pool (of spawned workers, see `pipeline.process_pool`) as soon as its stream is ready, so
+the wall time is bounded by the slowest contract.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from ethproto.wrappers import get_provider
+
+from . import access_manager as am
+from . import pipeline
+from .chaindata import AccessManagerEventStream
+from .profiling import get_profiler
+
+EXIT_OK = pipeline.EXIT_OK
+EXIT_DRIFT = pipeline.EXIT_FOUND
+EXIT_ERROR = pipeline.EXIT_ERROR
+
+
+@dataclass
+class FleetResult:
+    address: str
+    snapshot_path: str
+    differences: Optional[List[am.Operation]] = None
+    error: Optional[str] = None
+
+    @property
+    def drift(self) -> bool:
+        return bool(self.differences)
+
+    def as_dict(self):
+        return {
+            "address": self.address,
+            "snapshot": self.snapshot_path,
+            "in_sync": self.error is None and not self.drift,
+            "differences": self.differences,
+            "error": self.error,
+        }
+
+
+def load_manifest(path) -> Dict[str, str]:
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return {address: os.path.join(base_dir, snapshot_path) for address, snapshot_path in manifest.items()}
+
+
+def _fetch(address, snapshot_path, provider):
+    with open(snapshot_path, "r") as f:
+        reference = json.load(f)
+    with get_profiler().span("fleet.fetch"):
+        events = AccessManagerEventStream(address, provider=provider).stream
+    return events, reference
+
+
+def _compare(events, reference) -> List[am.Operation]:
+    return am.compare(am.AccessManager.from_events(events), am.AccessManager.from_dict(reference))
+
+
+def check_fleet(
+    manifest: Dict[str, str], provider=None, fetch_workers=16, compare_workers=None
+) -> Iterator[FleetResult]:
+    """Compares every contract in the manifest with its reference snapshot.
+
+    Yields a FleetResult for each contract as soon as it's done, in completion order.
+    """
+    if provider is None:
+        provider = get_provider("w3")
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, pipeline.process_pool(
+        compare_workers
+    ) as compare_pool:
+        stages = [
+            lambda item, _: fetch_pool.submit(_fetch, *item, provider),
+            lambda item, fetched: compare_pool.submit(_compare, *fetched),
+        ]
+        for done in pipeline.run_pipeline(manifest.items(), stages):
+            address, snapshot_path = done.item
+            if done.error is not None:
+                yield FleetResult(address, snapshot_path, error=pipeline.describe(done.error))
+            else:
+                yield FleetResult(address, snapshot_path, differences=done.result)
+
+
+def exit_code(results: List[FleetResult]) -> int:
+    """Exit code for CI gating: errors take precedence over drift."""
+    return pipeline.exit_code(
+        any(result.error is not None for result in results), any(result.drift for result in results)
+    )
@@ -1,42 +1,188 @@
+"""Permissions graph of an AccessControl contract.
+
+The graph is modeled as a list of Cytoscape elements, independent of any layout:
+
+    {"group": "nodes", "data": {"id": "0x...", "label": "Role:GUARDIAN_ROLE", "kind": "role", ...}}
+    {"group": "edges", "data": {"id": "0x...->0x...", "source": "0x...", "target": "0x...", "kind": "member"}}
+
+The `data` of each element has the id/source/target keys D3's force layout expects too. Two groupings are
+precomputed so large graphs can be collapsed on the client:
+- roles of the same component have it as `parent` (a compound node of kind "component")
+- accounts have a `group`, shared by the accounts that hold exactly the same roles
+
+`build_graph` renders the same elements as a graphviz DOT graph.
+"""
+
+import hashlib
+import json
+from typing import Iterable, Iterator
+
 import graphviz
+from eth_utils import add_0x_prefix
 
 from .chaindata import AccessControlEventStream
+from .profiling import profiled
 from .utils import ExplorerAddress, ellipsize
 
+CONTRACT_NODE = "CONTRACT"
 
-def build_graph(contract_address):
-    stream = AccessControlEventStream(contract_address)
 
-    dot = graphviz.Digraph("Permissions")
-    dot.attr(rankdir="RL", splines="ortho")
-    dot.attr("node", style="rounded", shape="box")
+def _node(kind, id, **data):
+    return {"group": "nodes", "data": {"id": id, "kind": kind, **data}, "classes": kind}
+
+
+def _edge(kind, source, target):
+    return {
+        "group": "edges",
+        "data": {"id": f"{source}->{target}", "source": source, "target": target, "kind": kind},
+        "classes": kind,
+    }
 
-    dot.node(
-        "CONTRACT",
-        URL=ExplorerAddress.get(contract_address),
-        target="_blank",
-        style="filled",
-        fillcolor="green",
-        shape="hexagon",
-        fontcolor="blue",
+
+def _role_id(role) -> str:
+    return add_0x_prefix(role.hash.hex())
+
+
+def _contract_node(contract_address, chain=None) -> dict:
+    return _node(
+        "contract",
+        CONTRACT_NODE,
+        label=contract_address,
+        address=contract_address,
+        url=ExplorerAddress.get(contract_address, chain),
     )
 
-    for item in stream.snapshot:
-        graphviz.quoting.quote(str(item["role"]))
-        dot.node(item["role"].hash.hex(), str(item["role"]), tooltip=item["role"].hash.hex())
-        # dot.edge(item["role"].hash.hex(), "CONTRACT")
+
+def graph_elements(contract_address, snapshot, chain=None) -> Iterator[dict]:
+    """The elements of the graph of an AccessControl snapshot (see AccessControlEventStream.snapshot).
+
+    Yielded so they can be streamed: the contract and the component nodes first, then each role followed by
+    its members not seen yet and the member edges. Every edge comes after both of its nodes.
+    """
+    yield _contract_node(contract_address, chain)
+    yield from _snapshot_elements(snapshot, chain)
+
+
+def _snapshot_elements(snapshot, chain=None) -> Iterator[dict]:
+    roles_by_account = {}
+    for item in snapshot:
+        for member in item["members"]:
+            roles_by_account.setdefault(member, []).append(_role_id(item["role"]))
+    groups = {
+        account: "group:" + hashlib.sha1(" ".join(sorted(roles)).encode()).hexdigest()[:12]
+        for account, roles in roles_by_account.items()
+    }
+
+    components = {}
+    for item in snapshot:
+        component = item["role"].component
+        if component is not None:
+            component_id = "component:" + add_0x_prefix(component.address.hex())
+            if component_id not in components:
+                components[component_id] = component
+                yield _node("component", component_id, label=str(component))
+
+    seen = set()
+    for item in snapshot:
+        role = item["role"]
+        role_id = _role_id(role)
+        role_data = {
+            "label": str(role),
+            "tooltip": role_id,
+            "hash": role.hash.hex(),
+            "name": role.name,
+            "members": len(item["members"]),
+        }
+        if role.component is not None:
+            role_data["parent"] = "component:" + add_0x_prefix(role.component.address.hex())
+        yield _node("role", role_id, **role_data)
 
         for member in item["members"]:
+            if member not in seen:
+                seen.add(member)
+                yield _node(
+                    "account",
+                    member,
+                    label=ellipsize(member),
+                    tooltip=member,
+                    url=ExplorerAddress.get(member, chain),
+                    group=groups[member],
+                    roles=len(roles_by_account[member]),
+                )
+            yield _edge("member", member, role_id)
+
+
+def graph_model(elements: Iterable[dict]) -> dict:
+    """The elements split in nodes and edges, as Cytoscape's `elements` option accepts them"""
+    model = {"nodes": [], "edges": []}
+    for element in elements:
+        model[element["group"]].append(element)
+    return model
+
+
+def elements_jsonl(elements: Iterable[dict]) -> Iterator[str]:
+    """One JSON line per element, to stream the graph and let the client render it progressively"""
+    for element in elements:
+        yield json.dumps(element) + "\n"
+
+
+def to_dot(elements: Iterable[dict]) -> graphviz.Digraph:
+    dot = graphviz.Digraph("Permissions")
+    dot.attr(rankdir="RL", splines="ortho")
+    dot.attr("node", style="rounded", shape="box")
+
+    role_ids = {}  # The DOT ids of the roles are their bare hashes
+    for element in elements:
+        data = element["data"]
+        kind = data["kind"]
+        if kind == "contract":
             dot.node(
-                member,
-                ellipsize(member),
-                tooltip=member,
-                URL=ExplorerAddress.get(member),
+                data["id"],
+                URL=data["url"],
                 target="_blank",
                 style="filled",
+                fillcolor="green",
                 shape="hexagon",
                 fontcolor="blue",
             )
-            dot.edge(member, item["role"].hash.hex())
+        elif kind == "role":
+            role_ids[data["id"]] = data["hash"]
+            dot.node(data["hash"], data["label"], tooltip=data["hash"])
+        elif kind == "account":
+            dot.node(
+                data["id"],
+                data["label"],
+                tooltip=data["tooltip"],
+                URL=data["url"],
+                target="_blank",
+                style="filled",
+                shape="hexagon",
+                fontcolor="blue",
+            )
+        elif kind == "member":
+            dot.edge(data["source"], role_ids[data["target"]])
+        # Component groupings are only for client side rendering
 
     return dot
+
+
+def build_elements(
+    contract_address, chain=None, component_names=None, configure_stream=None
+) -> Iterator[dict]:
+    """The graph elements of the contract. With a component_names.ComponentNames, the unknown components are
+    named from the chain. configure_stream is called with the event stream before it's loaded, to set its
+    options (header_cache, archive, replay_workers).
+
+    The contract node is yielded before the events are fetched, so a streamed response starts right away;
+    the rest follow once the snapshot is built."""
+    yield _contract_node(contract_address, chain)
+    stream = AccessControlEventStream(contract_address, chain=chain)
+    stream.component_names = component_names
+    if configure_stream is not None:
+        configure_stream(stream)
+    yield from _snapshot_elements(stream.snapshot, chain)
+
+
+@profiled("build_graph")
+def build_graph(contract_address, chain=None, component_names=None, configure_stream=None):
+    return to_dot(build_elements(contract_address, chain, component_names, configure_stream))
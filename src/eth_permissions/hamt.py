@@ -0,0 +1,207 @@
+"""Persistent hash map (hash array mapped trie).
+
+Updates return a new map and leave the original untouched. Both share every node the update didn't touch, so
+an update costs O(log32 n) time and memory and many versions of a big map fit in memory at once.
+"""
+
+from typing import Hashable, Iterator, Tuple
+
+BITS = 5
+MASK = (1 << BITS) - 1
+HASH_MASK = (1 << 64) - 1
+
+_MISSING = object()
+
+
+class _Leaf:
+    __slots__ = ("hash", "key", "value")
+
+    def __init__(self, hash, key, value):
+        self.hash = hash
+        self.key = key
+        self.value = value
+
+
+class _Collision:
+    """Entries whose keys have the same hash"""
+
+    __slots__ = ("hash", "items")
+
+    def __init__(self, hash, items: Tuple[Tuple[Hashable, object], ...]):
+        self.hash = hash
+        self.items = items
+
+
+class _Node:
+    """Up to 32 children, stored compactly: bit i of the bitmap tells if there's a child for the index i"""
+
+    __slots__ = ("bitmap", "children")
+
+    def __init__(self, bitmap, children):
+        self.bitmap = bitmap
+        self.children = children
+
+
+_EMPTY = _Node(0, ())
+
+
+def _position(bitmap, bit):
+    return bin(bitmap & (bit - 1)).count("1")
+
+
+def _merge(a, b, shift):
+    """A node holding two leaves (or collisions) with different hashes"""
+    index_a, index_b = (a.hash >> shift) & MASK, (b.hash >> shift) & MASK
+    if index_a == index_b:
+        return _Node(1 << index_a, (_merge(a, b, shift + BITS),))
+    children = (a, b) if index_a < index_b else (b, a)
+    return _Node((1 << index_a) | (1 << index_b), children)
+
+
+def _get(node, hash, key):
+    shift = 0
+    while True:
+        bit = 1 << ((hash >> shift) & MASK)
+        if not node.bitmap & bit:
+            return _MISSING
+        child = node.children[_position(node.bitmap, bit)]
+        if isinstance(child, _Node):
+            node, shift = child, shift + BITS
+        elif isinstance(child, _Leaf):
+            return child.value if child.hash == hash and child.key == key else _MISSING
+        else:
+            if child.hash == hash:
+                for item_key, value in child.items:
+                    if item_key == key:
+                        return value
+            return _MISSING
+
+
+def _set(node, hash, key, value, shift):
+    """Returns (new node, whether the key was added)"""
+    bit = 1 << ((hash >> shift) & MASK)
+    position = _position(node.bitmap, bit)
+    if not node.bitmap & bit:
+        children = node.children[:position] + (_Leaf(hash, key, value),) + node.children[position:]
+        return _Node(node.bitmap | bit, children), True
+
+    child = node.children[position]
+    added = False
+    if isinstance(child, _Node):
+        new_child, added = _set(child, hash, key, value, shift + BITS)
+    elif isinstance(child, _Leaf):
+        if child.hash == hash and child.key == key:
+            if child.value is value:
+                return node, False
+            new_child = _Leaf(hash, key, value)
+        elif child.hash == hash:
+            new_child, added = _Collision(hash, ((child.key, child.value), (key, value))), True
+        else:
+            new_child, added = _merge(child, _Leaf(hash, key, value), shift + BITS), True
+    elif child.hash == hash:
+        items = tuple(item for item in child.items if item[0] != key)
+        added = len(items) == len(child.items)
+        new_child = _Collision(hash, items + ((key, value),))
+    else:
+        new_child, added = _merge(child, _Leaf(hash, key, value), shift + BITS), True
+
+    return _Node(node.bitmap, node.children[:position] + (new_child,) + node.children[position + 1 :]), added
+
+
+def _delete(node, hash, key, shift):
+    """Returns the new node (None if it's empty) or the same node if the key isn't there"""
+    bit = 1 << ((hash >> shift) & MASK)
+    if not node.bitmap & bit:
+        return node
+    position = _position(node.bitmap, bit)
+    child = node.children[position]
+
+    if isinstance(child, _Node):
+        new_child = _delete(child, hash, key, shift + BITS)
+        if new_child is child:
+            return node
+        if (
+            new_child is not None
+            and len(new_child.children) == 1
+            and not isinstance(new_child.children[0], _Node)
+        ):
+            new_child = new_child.children[0]  # Lift a single leaf back up
+    elif isinstance(child, _Leaf):
+        if child.hash != hash or child.key != key:
+            return node
+        new_child = None
+    else:
+        items = tuple(item for item in child.items if item[0] != key)
+        if child.hash != hash or len(items) == len(child.items):
+            return node
+        new_child = _Leaf(hash, *items[0]) if len(items) == 1 else _Collision(hash, items)
+
+    if new_child is None:
+        if node.bitmap == bit:
+            return None
+        return _Node(node.bitmap ^ bit, node.children[:position] + node.children[position + 1 :])
+    return _Node(node.bitmap, node.children[:position] + (new_child,) + node.children[position + 1 :])
+
+
+def _items(node):
+    for child in node.children:
+        if isinstance(child, _Node):
+            yield from _items(child)
+        elif isinstance(child, _Leaf):
+            yield child.key, child.value
+        else:
+            yield from child.items
+
+
+class PersistentMap:
+    """Immutable mapping. `set` and `delete` return a new map."""
+
+    __slots__ = ("_root", "_size")
+
+    def __init__(self, items=()):
+        self._root, self._size = _EMPTY, 0
+        for key, value in dict(items).items():
+            self._root, added = _set(self._root, hash(key) & HASH_MASK, key, value, 0)
+            self._size += added
+
+    @classmethod
+    def _from_root(cls, root, size) -> "PersistentMap":
+        new = cls.__new__(cls)
+        new._root, new._size = root or _EMPTY, size
+        return new
+
+    def set(self, key, value) -> "PersistentMap":
+        root, added = _set(self._root, hash(key) & HASH_MASK, key, value, 0)
+        return self if root is self._root else self._from_root(root, self._size + added)
+
+    def delete(self, key) -> "PersistentMap":
+        root = _delete(self._root, hash(key) & HASH_MASK, key, 0)
+        return self if root is self._root else self._from_root(root, self._size - 1)
+
+    def get(self, key, default=None):
+        value = _get(self._root, hash(key) & HASH_MASK, key)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, key):
+        value = _get(self._root, hash(key) & HASH_MASK, key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return _get(self._root, hash(key) & HASH_MASK, key) is not _MISSING
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self) -> Iterator:
+        return (key for key, _ in _items(self._root))
+
+    def items(self):
+        return _items(self._root)
+
+    def values(self):
+        return (value for _, value in _items(self._root))
+
+    def __repr__(self):
+        return f"PersistentMap({dict(self.items())!r})"
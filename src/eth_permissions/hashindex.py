@@ -0,0 +1,140 @@
+"""Compact on-disk index from fixed size hashes (selectors, role hashes) to names.
+
+The file is made to be mmap'ed and searched in place, so opening it is instant and lookups don't need to
+parse or hash anything:
+
+    header:  magic (4 bytes) | key size (u32) | record count (u32)
+    records: record count x (key | offset of the value in the strings area (u32)), sorted by key
+    strings: utf-8 values, each terminated by a newline
+
+Hash collisions are just several records with the same key, so a lookup returns all the matching values.
+
+The index is written with an external merge sort: the pairs are sorted in bounded runs, spilled to temporary
+files and merged, so building it from millions of candidates doesn't need them all in memory.
+"""
+
+import heapq
+import itertools
+import mmap
+import shutil
+import struct
+import tempfile
+from typing import Iterable, Iterator, List, Tuple
+
+MAGIC = b"EPHI"
+HEADER = struct.Struct("<4sII")
+OFFSET = struct.Struct("<I")
+LENGTH = struct.Struct("<I")
+
+DEFAULT_RUN_SIZE = 100_000
+
+
+def chunks(iterable, size) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _spill(run: List[Tuple[bytes, str]]):
+    """Writes a sorted run to a temporary file, as key | value length (u32) | utf-8 value records"""
+    f = tempfile.TemporaryFile()
+    for key, value in run:
+        encoded = value.encode("utf-8")
+        f.write(key + LENGTH.pack(len(encoded)) + encoded)
+    f.seek(0)
+    return f
+
+
+def _read_run(f, key_size) -> Iterator[Tuple[bytes, str]]:
+    while True:
+        key = f.read(key_size)
+        if not key:
+            return
+        (length,) = LENGTH.unpack(f.read(LENGTH.size))
+        yield key, f.read(length).decode("utf-8")
+
+
+def write_index_runs(path, runs: Iterable[List[Tuple[bytes, str]]], key_size: int) -> int:
+    """Writes the (key, value) pairs of the sorted runs to path, merging them. Each run is spilled to disk as
+    soon as it's received. Duplicated pairs are stored once. Returns the number of records."""
+    spilled = []
+    try:
+        for run in runs:
+            spilled.append(_spill(run))
+        with open(path, "wb") as f, tempfile.TemporaryFile() as strings:
+            f.write(HEADER.pack(MAGIC, key_size, 0))
+            count = strings_size = 0
+            previous = None
+            for key, value in heapq.merge(*(_read_run(run, key_size) for run in spilled)):
+                if (key, value) == previous:
+                    continue
+                previous = (key, value)
+                if len(key) != key_size:
+                    raise ValueError(f"Expected a {key_size} bytes key, got {key!r}")
+                encoded = value.encode("utf-8") + b"\n"
+                f.write(key + OFFSET.pack(strings_size))
+                strings.write(encoded)
+                strings_size += len(encoded)
+                count += 1
+            strings.seek(0)
+            shutil.copyfileobj(strings, f)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, key_size, count))
+    finally:
+        for run in spilled:
+            run.close()
+    return count
+
+
+def write_index(path, items: Iterable[Tuple[bytes, str]], key_size: int, run_size=DEFAULT_RUN_SIZE) -> int:
+    """Writes the (key, value) pairs to path, sorting at most run_size pairs at a time. Duplicated pairs are
+    stored once. Returns the number of records."""
+    return write_index_runs(path, (sorted(chunk) for chunk in chunks(items, run_size)), key_size)
+
+
+class HashIndex:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.key_size, self._count = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a hash index file")
+        self._record_size = self.key_size + OFFSET.size
+        self._strings_start = HEADER.size + self._count * self._record_size
+
+    def __len__(self):
+        return self._count
+
+    def _key_at(self, position):
+        start = HEADER.size + position * self._record_size
+        return self._data[start : start + self.key_size]
+
+    def _value_at(self, position):
+        start = HEADER.size + position * self._record_size + self.key_size
+        (offset,) = OFFSET.unpack_from(self._data, start)
+        offset += self._strings_start
+        return self._data[offset : self._data.find(b"\n", offset)].decode("utf-8")
+
+    def lookup(self, key: bytes) -> List[str]:
+        """Returns all the values stored for key, empty if it's not in the index."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        values = []
+        while low < self._count and self._key_at(low) == key:
+            values.append(self._value_at(low))
+            low += 1
+        return values
+
+    def __contains__(self, key: bytes):
+        return bool(self.lookup(key))
+
+    def close(self):
+        self._data.close()
@@ -1,23 +1,13 @@
 import argparse
 import json
-from itertools import zip_longest
+import os
+import sys
 
-from environs import Env
-from hexbytes import HexBytes
-
-from eth_permissions import access_manager as am
-from eth_permissions.access_control import Component, Role, get_registry
-from eth_permissions.chaindata import AccessManagerEventStream
-from eth_permissions.graph import build_graph
+from eth_permissions.profiling import get_profiler
 from eth_permissions.utils import safe_serializer
 
-env = Env()
-env.read_env()
-
-KNOWN_ROLES = env.list("KNOWN_ROLES", ["GUARDIAN_ROLE", "LEVEL1_ROLE", "LEVEL2_ROLE", "LEVEL3_ROLE"])
-KNOWN_COMPONENTS = env.list("KNOWN_COMPONENTS", [])
-KNOWN_COMPONENT_NAMES = env.list("KNOWN_COMPONENT_NAMES", [])
-
+# The heavier dependencies (web3, graphviz, environs) are imported in the code path that needs them, to keep
+# the startup time of the command line tool low.
 
 parser = argparse.ArgumentParser(
     prog="eth-permissions", description="Command line tool for auditing smart contract permissions"
@@ -35,9 +25,83 @@ parser.add_argument(
     "--compare-snapshot",
     help=(
         "Compare the current snapshot with the one in the given file. "
-        "Prints out the differences in json format."
+        "Prints out the differences in json format. For AccessControl, the file is a list of "
+        '{"role": name or hash, "members": [...], "admin": name or hash (optional)} items.'
+    ),
+)
+parser.add_argument(
+    "--plan",
+    action="store_true",
+    required=False,
+    help=(
+        "With --compare-snapshot, optimize the differences into an execution plan and print it together "
+        "with the AccessManager multicall calldata of each transaction"
+    ),
+)
+parser.add_argument(
+    "--gas-limit",
+    type=int,
+    default=None,
+    help="Maximum estimated gas per multicall transaction for --plan",
+)
+parser.add_argument(
+    "--selector-index",
+    help=(
+        "Selector index file (built with python -m eth_permissions.selector_index) used to add the function "
+        "signatures of the selectors to the AccessManager output"
     ),
 )
+parser.add_argument(
+    "--authority-cache",
+    help=(
+        "Discover the contracts managed by the AccessManager from the chain-wide AuthorityUpdated logs and "
+        "add them to the snapshot. The scan is cached per chain in this file and updated incrementally."
+    ),
+)
+parser.add_argument(
+    "--header-cache",
+    help=(
+        "Prefilter the event fetches with the logsBloom of the block headers, cached in this SQLite file "
+        "(one per chain). Useful on nodes with small eth_getLogs ranges."
+    ),
+)
+parser.add_argument(
+    "--archive",
+    action="append",
+    metavar="LOGS_FILE",
+    help=(
+        "Exported logs file (JSON Lines, CSV or Parquet, see eth_permissions.archive) to read the events "
+        "from before requesting the later blocks over RPC. Can be given many times."
+    ),
+)
+parser.add_argument(
+    "--archive-last-block",
+    type=int,
+    default=None,
+    help="Last block covered by the --archive files (default: the block of the last log found)",
+)
+parser.add_argument(
+    "--component-names",
+    metavar="CACHE_FILE",
+    help=(
+        "Name the unknown components of the AccessControl roles with their name() or symbol(), read in a "
+        "single Multicall3 batch and cached in this json file"
+    ),
+)
+parser.add_argument(
+    "--delta",
+    metavar="FROM_BLOCK[:TO_BLOCK]",
+    help=(
+        "Print the net changes between the two blocks (inclusive, TO_BLOCK defaults to the latest) as the "
+        "operations of --compare-snapshot, fetching only the events in that range"
+    ),
+)
+parser.add_argument(
+    "--replay-workers",
+    type=int,
+    default=1,
+    help="Replay huge histories partitioned by role (and target, for AccessManager) on this many processes",
+)
 parser.add_argument("-o", "--output", help="Output file. Only valid for graph output")
 parser.add_argument(
     "-f",
@@ -59,24 +123,154 @@ parser.add_argument(
         "Only valid for graph output."
     ),
 )
-parser.add_argument("address", help="The contract's address")
+parser.add_argument(
+    "-p",
+    "--profile",
+    action="store_true",
+    required=False,
+    help="Print a breakdown of the time spent in each phase (RPC, decoding, replay, rendering) to stderr",
+)
+parser.add_argument(
+    "--profile-trace",
+    required=False,
+    metavar="TRACE_FILE",
+    help="Write a Chrome trace (json) of the run to the given file. Open it with chrome://tracing",
+)
+parser.add_argument(
+    "--fleet",
+    metavar="MANIFEST",
+    help=(
+        "Compare every AccessManager in the manifest (json mapping addresses to reference snapshot files) "
+        "with its reference snapshot. Prints a json line per contract as they finish and exits with 1 if "
+        "any contract drifted, 2 if any failed."
+    ),
+)
+parser.add_argument(
+    "--chains",
+    metavar="CHAINS",
+    help=(
+        "Chains configuration file (json keyed by chain id, see eth_permissions.chains). Snapshots all the "
+        "given <chain id>:<address> contracts, all chains at once, as json lines tagged with the chain. "
+        "Exits with 2 if any failed."
+    ),
+)
+parser.add_argument(
+    "--rules",
+    metavar="RULES",
+    help=(
+        "Check the rules in the given json file (or 'default') on all the given AccessManagers. Prints a "
+        "json line per contract with its findings. Exits with 1 if there are findings, 2 if any failed."
+    ),
+)
+parser.add_argument(
+    "--output-dir",
+    help=(
+        "Render the graphs of all the given AccessControl contracts (requires --type AccessControl) into "
+        "this directory, several at a time. Prints a json line per contract as they finish and exits with 2 "
+        "if any failed."
+    ),
+)
+parser.add_argument(
+    "--render-timeout",
+    type=int,
+    default=300,
+    help="Maximum seconds for each graph render with --output-dir",
+)
+parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=None,
+    help=(
+        "Number of parallel comparisons (--fleet), rule evaluations (--rules) or renders (--output-dir). "
+        "Defaults to the core count"
+    ),
+)
+parser.add_argument(
+    "address",
+    nargs="*",
+    help=(
+        "The contract's address. Several with --output-dir or --rules, as <chain id>:<address> with --chains"
+    ),
+)
 
 
 def load_registry():
-    get_registry().add_roles([Role(name) for name in KNOWN_ROLES])
-    get_registry().add_components(
-        [
-            Component(HexBytes(address), name)
-            for address, name in zip_longest(KNOWN_COMPONENTS, KNOWN_COMPONENT_NAMES)
-        ]
+    from eth_permissions.registry_artifact import (
+        load_registry as load_registry_artifact,
     )
 
+    load_registry_artifact(os.environ.get("REGISTRY_ARTIFACT"), os.environ.get("ROLE_NAMES_INDEX"))
+
 
 def main():
     args = parser.parse_args()
 
+    profiler = get_profiler()
+    profiler.trace = bool(args.profile_trace)
+    profiler.count_bytes = args.profile or profiler.trace
+    try:
+        with profiler.span("main"):
+            exit_code = run(args)
+    finally:
+        if args.profile:
+            print(profiler.table(), file=sys.stderr)
+        if args.profile_trace:
+            with open(args.profile_trace, "w") as f:
+                json.dump(profiler.chrome_trace(), f)
+    if exit_code:
+        sys.exit(exit_code)
+
+
+def dump_json(obj):
+    with get_profiler().span("json.dumps"):
+        return json.dumps(obj, indent=2, default=safe_serializer)
+
+
+def configure_stream(args, event_stream):
+    """Applies the event stream options (--header-cache, --archive, --replay-workers) to the stream"""
+    if args.header_cache:
+        from eth_permissions.bloom import get_header_cache
+
+        event_stream.header_cache = get_header_cache(event_stream.provider.w3, args.header_cache)
+    if args.archive:
+        from eth_permissions.archive import ArchiveSource
+
+        event_stream.archive = ArchiveSource(args.archive, last_block=args.archive_last_block)
+    event_stream.replay_workers = args.replay_workers
+    return event_stream
+
+
+def run(args):
+    from environs import Env
+
+    Env().read_env()  # The provider settings may come from a .env file
+
+    if args.fleet or args.output_dir or args.rules or args.chains:
+        if args.header_cache or args.archive or args.replay_workers != 1:
+            parser.error(
+                "--header-cache, --archive and --replay-workers apply to a single contract, not to "
+                "--fleet, --output-dir, --rules or --chains"
+            )
+    if args.fleet:
+        return run_fleet(args)
+    if args.output_dir:
+        return run_render(args)
+    if args.rules:
+        return run_rules(args)
+    if args.chains:
+        return run_chains(args)
+    if len(args.address) != 1:
+        parser.error("a single contract address is required")
+    address = args.address[0]
+    if args.delta:
+        return run_delta(args, address)
+
     if args.type == "AccessManager":
-        event_stream = AccessManagerEventStream(args.address)
+        from eth_permissions import access_manager as am
+        from eth_permissions.chaindata import AccessManagerEventStream
+
+        event_stream = configure_stream(args, AccessManagerEventStream(address))
         # print(
         #     "\n".join(
         #         f"{e['event']} | " + " ".join(f"{k}={v}" for k, v in e["args"].items())
@@ -89,21 +283,169 @@ def main():
                 reference_snapshot = json.load(f)
             snapshot = am.AccessManager.from_dict(reference_snapshot)
             comparison = event_stream.compare(snapshot)
-            print(json.dumps(comparison, indent=2, default=safe_serializer))
+            if args.plan:
+                comparison = plan_transactions(comparison, args.gas_limit)
+            if args.selector_index:
+                annotate_operations(
+                    comparison["operations"] if args.plan else comparison, args.selector_index
+                )
+            print(dump_json(comparison))
         else:
-            snapshot = event_stream.snapshot_dict
-            print(json.dumps(snapshot, indent=2, default=safe_serializer))
+            manager = event_stream.snapshot
+            if args.authority_cache:
+                from eth_permissions.discovery import AuthorityIndex
+
+                authority_index = AuthorityIndex(event_stream.provider.w3, cache_path=args.authority_cache)
+                manager.add_targets(event_stream.discover_targets(authority_index))
+            snapshot = manager.as_dict()
+            snapshot["content_hash"] = "0x" + manager.content_hash.hex()
+            snapshot["pending_changes"] = manager.pending_changes()
+            if args.selector_index:
+                from eth_permissions.selector_index import (
+                    SelectorIndex,
+                    snapshot_selectors,
+                )
+
+                index = SelectorIndex(args.selector_index)
+                snapshot["selector_names"] = index.resolve_all(snapshot_selectors(snapshot))
+            print(dump_json(snapshot))
         return
 
+    if args.compare_snapshot:
+        return run_compare_access_control(args, address)
+
     if not args.output:
         raise ValueError("Output file must be specified")
 
+    from eth_permissions.graph import build_graph
+
     load_registry()
 
-    graph = build_graph(args.address)
+    component_names = None
+    if args.component_names:
+        from eth_permissions.component_names import ComponentNames
+
+        component_names = ComponentNames(args.component_names)
+    graph = build_graph(
+        address,
+        component_names=component_names,
+        configure_stream=lambda event_stream: configure_stream(args, event_stream),
+    )
 
     kwargs = {}
     if args.format:
         kwargs["format"] = args.format
 
-    graph.render(outfile=args.output, cleanup=True, view=args.view, **kwargs)
+    with get_profiler().span("graphviz.render"):
+        graph.render(outfile=args.output, cleanup=True, view=args.view, **kwargs)
+
+
+def run_compare_access_control(args, address):
+    from eth_permissions.access_control import snapshot_from_dict
+    from eth_permissions.chaindata import AccessControlEventStream
+
+    if args.plan:
+        parser.error("--plan is only supported for AccessManager contracts")
+    load_registry()
+    with open(args.compare_snapshot, "r") as f:
+        reference_snapshot = snapshot_from_dict(json.load(f))
+    event_stream = configure_stream(args, AccessControlEventStream(address))
+    print(dump_json(event_stream.compare(reference_snapshot)))
+
+
+def run_delta(args, address):
+    from eth_permissions.chaindata import (
+        AccessControlEventStream,
+        AccessManagerEventStream,
+    )
+
+    from_block, _, to_block = args.delta.partition(":")
+    if args.type == "AccessControl":
+        load_registry()
+        event_stream = AccessControlEventStream(address)
+    else:
+        event_stream = AccessManagerEventStream(address)
+    configure_stream(args, event_stream)
+    operations = event_stream.delta(int(from_block), int(to_block) if to_block else None)
+    if args.selector_index:
+        annotate_operations(operations, args.selector_index)
+    print(dump_json(operations))
+
+
+def annotate_operations(operations, selector_index_path):
+    from eth_permissions.selector_index import SelectorIndex
+
+    index = SelectorIndex(selector_index_path)
+    for operation in operations:
+        if operation.op == "setTargetFunctionRole":
+            operation.args["signatures"] = index.resolve_all(operation.args["selectors"])
+
+
+def plan_transactions(operations, gas_limit=None):
+    from eth_permissions import planner
+
+    operations = planner.plan(operations)
+    transactions = planner.encode_multicall(operations, gas_limit or planner.DEFAULT_GAS_LIMIT)
+    return {"operations": operations, "multicall": ["0x" + calldata.hex() for calldata in transactions]}
+
+
+def run_render(args):
+    from eth_permissions import pipeline
+    from eth_permissions.render import render_graphs
+
+    if args.type != "AccessControl":
+        parser.error("--output-dir renders AccessControl graphs, it requires --type AccessControl")
+    load_registry()
+
+    failed = False
+    for result in render_graphs(
+        args.address,
+        args.output_dir,
+        format=args.format or "svg",
+        render_workers=args.jobs,
+        timeout=args.render_timeout,
+    ):
+        failed = failed or result.error is not None
+        print(json.dumps(result.as_dict()), flush=True)
+    return pipeline.exit_code(failed)
+
+
+def run_fleet(args):
+    from eth_permissions.fleet import check_fleet, exit_code, load_manifest
+
+    results = []
+    for result in check_fleet(load_manifest(args.fleet), compare_workers=args.jobs):
+        results.append(result)
+        print(json.dumps(result.as_dict(), default=safe_serializer), flush=True)
+    return exit_code(results)
+
+
+def run_rules(args):
+    from eth_permissions import pipeline, rules
+
+    rule_specs = rules.DEFAULT_RULES if args.rules == "default" else rules.load_rules(args.rules)
+    failed = found = False
+    for result in rules.lint_contracts(args.address, rule_specs, evaluate_workers=args.jobs):
+        failed = failed or result.error is not None
+        found = found or bool(result.findings)
+        output = {
+            "address": result.address,
+            "findings": [finding.as_dict() for finding in result.findings or []],
+            "error": result.error,
+        }
+        print(json.dumps(output, default=safe_serializer), flush=True)
+    return pipeline.exit_code(failed, found)
+
+
+def run_chains(args):
+    from eth_permissions import pipeline
+    from eth_permissions.chains import audit, load_chains, parse_target
+
+    if args.type == "AccessControl":
+        load_registry()
+    failed = False
+    targets = [parse_target(target) for target in args.address]
+    for result in audit(targets, load_chains(args.chains), contract_type=args.type):
+        failed = failed or "error" in result
+        print(json.dumps(result, default=safe_serializer), flush=True)
+    return pipeline.exit_code(failed)
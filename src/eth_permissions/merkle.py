@@ -0,0 +1,105 @@
+import json
+from functools import lru_cache
+from typing import Dict, Hashable, Set
+
+from eth_utils import keccak
+
+
+def hash_leaf(value) -> bytes:
+    """Deterministic hash of a json-like value (lists, dicts, strings, numbers)"""
+    return keccak(text=json.dumps(value, separators=(",", ":"), sort_keys=True, default=str))
+
+
+EMPTY_NODE = keccak(b"")
+
+
+BUCKETS = 256
+
+
+@lru_cache(maxsize=65536)
+def _bucket(key: str) -> int:
+    return keccak(text=key)[0] % BUCKETS
+
+
+class MerkleMap:
+    """A map of key -> leaf hash with a two level Merkle tree over the leaves.
+
+    The keys are spread in BUCKETS buckets by the hash of the key. Each bucket's node is the hash of its
+    (sorted) leaves and the root is the hash of the bucket nodes. The nodes are cached: setting a leaf only
+    invalidates its bucket, and the next `root` rehashes the invalidated buckets and the BUCKETS node hashes,
+    not every leaf. Two maps with the same root have the same leaves, and `diff` only looks at the keys of the
+    buckets whose nodes differ.
+    """
+
+    def __init__(self):
+        self._leaves = {}
+        self._bucket_keys: Dict[int, Set[Hashable]] = {}
+        self._nodes = [EMPTY_NODE] * BUCKETS
+        self._dirty: Set[int] = set()
+        self._root = None
+
+    def __setitem__(self, key: Hashable, leaf: bytes):
+        if self._leaves.get(key) != leaf:
+            self._leaves[key] = leaf
+            bucket = _bucket(str(key))
+            self._bucket_keys.setdefault(bucket, set()).add(key)
+            self._dirty.add(bucket)
+            self._root = None
+
+    def __getitem__(self, key: Hashable) -> bytes:
+        return self._leaves[key]
+
+    def __contains__(self, key: Hashable):
+        return key in self._leaves
+
+    def __len__(self):
+        return len(self._leaves)
+
+    def discard(self, key: Hashable):
+        if key in self._leaves:
+            del self._leaves[key]
+            bucket = _bucket(str(key))
+            self._bucket_keys[bucket].discard(key)
+            self._dirty.add(bucket)
+            self._root = None
+
+    def items(self):
+        return self._leaves.items()
+
+    def copy(self) -> "MerkleMap":
+        other = MerkleMap()
+        other._leaves = dict(self._leaves)
+        other._bucket_keys = {bucket: set(keys) for bucket, keys in self._bucket_keys.items()}
+        other._nodes = list(self._nodes)
+        other._dirty = set(self._dirty)
+        other._root = self._root
+        return other
+
+    def _refresh_nodes(self):
+        for bucket in self._dirty:
+            leaves = sorted((str(key), self._leaves[key]) for key in self._bucket_keys.get(bucket, ()))
+            self._nodes[bucket] = (
+                keccak(b"".join(key.encode() + b"\0" + leaf for key, leaf in leaves))
+                if leaves
+                else EMPTY_NODE
+            )
+        self._dirty.clear()
+
+    @property
+    def root(self) -> bytes:
+        if self._root is None:
+            self._refresh_nodes()
+            self._root = keccak(b"".join(self._nodes))
+        return self._root
+
+    def diff(self, other: "MerkleMap") -> Set[Hashable]:
+        """Keys whose leaves differ between both maps, including the keys missing on either side."""
+        if self.root == other.root:
+            return set()
+        return {
+            key
+            for bucket in range(BUCKETS)
+            if self._nodes[bucket] != other._nodes[bucket]
+            for key in self._bucket_keys.get(bucket, set()) | other._bucket_keys.get(bucket, set())
+            if self._leaves.get(key) != other._leaves.get(key)
+        }
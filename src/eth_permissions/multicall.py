@@ -0,0 +1,69 @@
+"""Batched contract reads through Multicall3 (https://www.multicall3.com/), deployed at the same address on
+every chain we care about.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from eth_abi import decode, encode
+from eth_abi.exceptions import DecodingError
+from eth_utils import function_signature_to_4byte_selector
+
+from .profiling import get_profiler
+
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+AGGREGATE3 = "aggregate3((address,bool,bytes)[])"
+DEFAULT_BATCH_SIZE = 500
+
+
+def _input_types(signature: str) -> List[str]:
+    args = signature[signature.index("(") + 1 : -1]
+    return args.split(",") if args else []
+
+
+@dataclass(frozen=True)
+class Call:
+    """A read-only call, e.g. Call(address, "hasRole(bytes32,address)", (role, account), ("bool",))"""
+
+    target: str
+    signature: str
+    args: tuple = ()
+    output_types: tuple = ()
+
+    @property
+    def calldata(self) -> bytes:
+        return function_signature_to_4byte_selector(self.signature) + encode(
+            _input_types(self.signature), list(self.args)
+        )
+
+    def decode(self, data: bytes):
+        """Decodes the return data. Single return values are unwrapped."""
+        values = decode(list(self.output_types), data)
+        return values[0] if len(values) == 1 else values
+
+
+def aggregate(
+    w3, calls: List[Call], batch_size=DEFAULT_BATCH_SIZE, block_identifier="latest"
+) -> List[Optional[object]]:
+    """Runs the calls with Multicall3's aggregate3, batch_size calls per eth_call.
+
+    Returns the decoded result of each call, in the same order, or None for the calls that reverted or whose
+    return data can't be decoded with the output types (e.g. a bytes32 `name()`).
+    """
+    results = []
+    profiler = get_profiler()
+    for start in range(0, len(calls), batch_size):
+        batch = calls[start : start + batch_size]
+        calldata = function_signature_to_4byte_selector(AGGREGATE3) + encode(
+            ["(address,bool,bytes)[]"], [[(call.target, True, call.calldata) for call in batch]]
+        )
+        with profiler.span("multicall.aggregate3"):
+            response = w3.eth.call({"to": MULTICALL3_ADDRESS, "data": calldata}, block_identifier)
+        profiler.incr("multicall.calls", len(batch))
+        (returned,) = decode(["(bool,bytes)[]"], response)
+        for call, (success, data) in zip(batch, returned):
+            try:
+                results.append(call.decode(data) if success and data else None)
+            except DecodingError:
+                results.append(None)
+    return results
@@ -0,0 +1,67 @@
+"""Concurrent per-contract pipelines, shared by the fleet, rules, chains and rendering commands.
+
+Each item goes through a sequence of stages, each one submitted to its own executor (e.g. fetching on a
+thread pool, then comparing on a process pool). An item moves to the next stage as soon as it's out of the
+previous one and is reported as soon as it's done or failed, so the wall time is bounded by the slowest item
+rather than the slowest stage of every item.
+
+The process pools of the pipelines spawn their workers (see `process_pool`): they're started while the thread
+pools of the earlier stages are making requests, and forking a multi-threaded process can deadlock on the
+locks held by those threads (urllib3's, logging's, the profiler's).
+
+The commands share the exit code convention: errors take precedence over findings (drift, rule findings).
+"""
+
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+EXIT_OK = 0
+EXIT_FOUND = 1
+EXIT_ERROR = 2
+
+# Submits the stage of an item, given the result of the previous stage (None for the first one)
+Stage = Callable[[object, object], Future]
+
+
+@dataclass
+class Done:
+    """An item out of the pipeline: the result of its last stage, or the error of the stage it failed on"""
+
+    item: object
+    stage: int
+    result: object = None
+    error: Optional[BaseException] = None
+
+
+def describe(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+def process_pool(max_workers=None) -> ProcessPoolExecutor:
+    """A process pool for a pipeline stage, with spawned (not forked) workers"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def run_pipeline(items: Iterable, stages: Sequence[Stage]) -> Iterator[Done]:
+    """Runs every item through the stages. Yields each item as soon as it's done, in completion order."""
+    jobs = {stages[0](item, None): (item, 0) for item in items}
+    pending = set(jobs)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            item, stage = jobs.pop(future)
+            error = future.exception()
+            if error is None and stage + 1 < len(stages):
+                next_future = stages[stage + 1](item, future.result())
+                jobs[next_future] = (item, stage + 1)
+                pending.add(next_future)
+            else:
+                yield Done(item, stage, None if error is not None else future.result(), error)
+
+
+def exit_code(failed: bool, found: bool = False) -> int:
+    if failed:
+        return EXIT_ERROR
+    return EXIT_FOUND if found else EXIT_OK
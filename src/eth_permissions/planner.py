@@ -0,0 +1,176 @@
+"""Turns the operations returned by `compare()` into a compact, correctly ordered execution plan, encoded as
+AccessManager `multicall` transactions.
+"""
+
+from datetime import timedelta
+from typing import Dict, List
+
+from eth_abi import encode
+from eth_utils import (
+    collapse_if_tuple,
+    function_abi_to_4byte_selector,
+    to_bytes,
+    to_checksum_address,
+)
+
+from . import abis
+from . import access_manager as am
+
+# Execution order: roles are labeled and wired (admins, guardians, delays) before targets are configured and
+# members granted. Revocations go last so the executor doesn't lose a role it still needs mid-migration.
+PHASES = [
+    "labelRole",
+    "setRoleAdmin",
+    "setRoleGuardian",
+    "setGrantDelay",
+    "setTargetAdminDelay",
+    "setTargetFunctionRole",
+    "setTargetClosed",
+    "grantRole",
+    "revokeRole",
+]
+
+# Rough gas cost of each call inside a multicall (cold storage writes + event), used to chunk transactions
+GAS_PER_OPERATION = {
+    "labelRole": 30_000,
+    "setRoleAdmin": 35_000,
+    "setRoleGuardian": 35_000,
+    "setGrantDelay": 40_000,
+    "setTargetAdminDelay": 40_000,
+    "setTargetFunctionRole": 15_000,
+    "setTargetClosed": 30_000,
+    "grantRole": 60_000,
+    "revokeRole": 30_000,
+}
+GAS_PER_SELECTOR = 25_000
+GAS_MULTICALL_BASE = 50_000
+DEFAULT_GAS_LIMIT = 10_000_000
+
+FUNCTIONS = {function["name"]: function for function in abis.OZ_ACCESS_MANAGER_ADMIN}
+
+
+def _role_id(role):
+    return role.id if isinstance(role, am.Role) else int(role)
+
+
+def _address(target):
+    return to_checksum_address(target.address if isinstance(target, am.Target) else target)
+
+
+def _seconds(delay):
+    return int(delay.total_seconds()) if isinstance(delay, timedelta) else int(delay)
+
+
+def _keys(operation: am.Operation):
+    """Keys of the state the operation sets. A later operation on the same key makes the earlier redundant."""
+    args = operation.args
+    if operation.op in ("grantRole", "revokeRole"):
+        return [("membership", _role_id(args["roleId"]), to_checksum_address(args["account"]))]
+    if operation.op == "setTargetFunctionRole":
+        return [("selector", _address(args["target"]), selector) for selector in args["selectors"]]
+    if operation.op in ("setTargetClosed", "setTargetAdminDelay"):
+        return [(operation.op, _address(args["target"]))]
+    return [(operation.op, _role_id(args["roleId"]))]
+
+
+def plan(operations: List[am.Operation]) -> List[am.Operation]:
+    """Optimizes a list of operations, keeping the same end state.
+
+    - Drops the operations overridden by a later one on the same role, member, target or selector.
+    - Merges the setTargetFunctionRole operations that share target and role into a single call.
+    - Sorts the operations so labels, admins and guardians are set before targets and grants.
+    """
+    last = {}
+    for index, operation in enumerate(operations):
+        for key in _keys(operation):
+            last[key] = index
+
+    planned = []
+    selector_groups: Dict[tuple, am.Operation] = {}
+    for index, operation in enumerate(operations):
+        if operation.op == "setTargetFunctionRole":
+            selectors = {
+                selector
+                for selector in operation.args["selectors"]
+                if last[("selector", _address(operation.args["target"]), selector)] == index
+            }
+            if not selectors:
+                continue
+            group_key = (_address(operation.args["target"]), _role_id(operation.args["roleId"]))
+            if group_key in selector_groups:
+                selector_groups[group_key].args["selectors"] |= selectors
+            else:
+                merged = am.Operation(operation.op, {**operation.args, "selectors": set(selectors)})
+                selector_groups[group_key] = merged
+                planned.append(merged)
+        elif last[_keys(operation)[0]] == index:
+            planned.append(operation)
+
+    return sorted(planned, key=lambda operation: PHASES.index(operation.op))
+
+
+def _call_args(operation: am.Operation) -> list:
+    args = operation.args
+    if operation.op == "labelRole":
+        return [_role_id(args["roleId"]), args["label"] or ""]
+    if operation.op == "grantRole":
+        return [
+            _role_id(args["roleId"]),
+            to_checksum_address(args["account"]),
+            _seconds(args.get("executionDelay", 0)),
+        ]
+    if operation.op == "revokeRole":
+        return [_role_id(args["roleId"]), to_checksum_address(args["account"])]
+    if operation.op == "setRoleAdmin":
+        return [_role_id(args["roleId"]), _role_id(args["admin"])]
+    if operation.op == "setRoleGuardian":
+        return [_role_id(args["roleId"]), _role_id(args["guardian"])]
+    if operation.op == "setGrantDelay":
+        return [_role_id(args["roleId"]), _seconds(args["newDelay"])]
+    if operation.op == "setTargetFunctionRole":
+        return [
+            _address(args["target"]),
+            [to_bytes(hexstr=selector) for selector in sorted(args["selectors"])],
+            _role_id(args["roleId"]),
+        ]
+    if operation.op == "setTargetAdminDelay":
+        return [_address(args["target"]), _seconds(args["newDelay"])]
+    if operation.op == "setTargetClosed":
+        return [_address(args["target"]), bool(args["closed"])]
+    raise ValueError(f"Unsupported operation {operation.op}")
+
+
+def encode_call(function_name: str, args: list) -> bytes:
+    function = FUNCTIONS[function_name]
+    types = [collapse_if_tuple(arg) for arg in function["inputs"]]
+    return function_abi_to_4byte_selector(function) + encode(types, args)
+
+
+def encode_operation(operation: am.Operation) -> bytes:
+    return encode_call(operation.op, _call_args(operation))
+
+
+def estimate_gas(operation: am.Operation) -> int:
+    gas = GAS_PER_OPERATION[operation.op]
+    if operation.op == "setTargetFunctionRole":
+        gas += GAS_PER_SELECTOR * len(operation.args["selectors"])
+    return gas
+
+
+def encode_multicall(operations: List[am.Operation], gas_limit: int = DEFAULT_GAS_LIMIT) -> List[bytes]:
+    """Encodes the operations, in order, as AccessManager multicall calldata.
+
+    The calls are split in several transactions so the estimated gas of each stays under gas_limit.
+    """
+    transactions = []
+    batch, batch_gas = [], GAS_MULTICALL_BASE
+    for operation in operations:
+        gas = estimate_gas(operation)
+        if batch and batch_gas + gas > gas_limit:
+            transactions.append(encode_call("multicall", [batch]))
+            batch, batch_gas = [], GAS_MULTICALL_BASE
+        batch.append(encode_operation(operation))
+        batch_gas += gas
+    if batch:
+        transactions.append(encode_call("multicall", [batch]))
+    return transactions
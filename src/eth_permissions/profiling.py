@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+
+class Profiler:
+    """Collects timing spans and counters for the different phases of an audit.
+
+    Aggregates (count, total and max duration per span name) are always kept, as they're cheap and feed the
+    metrics endpoint. The individual spans, needed for a Chrome trace, are only recorded when `trace` is on,
+    and the RPC response sizes (a second serialization of every response) only when `count_bytes` is on.
+    """
+
+    def __init__(self, trace=False, count_bytes=False):
+        self.trace = trace
+        self.count_bytes = count_bytes
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._origin = time.perf_counter()
+        self._spans = []
+        self.span_stats = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                stats = self.span_stats[name]
+                stats["count"] += 1
+                stats["total"] += duration
+                stats["max"] = max(stats["max"], duration)
+                if self.trace:
+                    self._spans.append((name, start - self._origin, duration, threading.get_ident()))
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def instrument_web3(self, w3):
+        """Wraps the web3 provider to count RPC calls (and response bytes, with count_bytes), timing each call
+        as a span."""
+        provider = w3.provider
+        if getattr(provider, "_eth_permissions_profiled", False):
+            return
+        make_request = provider.make_request
+
+        @wraps(make_request)
+        def profiled_make_request(method, params):
+            with self.span(f"rpc.{method}"):
+                response = make_request(method, params)
+            self.incr("rpc_calls")
+            self.incr(f"rpc_calls.{method}")
+            if self.count_bytes:
+                self.incr("rpc_bytes", len(json.dumps(response, default=str)))
+            return response
+
+        provider.make_request = profiled_make_request
+        provider._eth_permissions_profiled = True
+
+    def table(self) -> str:
+        """Returns a human readable breakdown of the time spent in each span and the counters."""
+        rows = sorted(self.span_stats.items(), key=lambda item: item[1]["total"], reverse=True)
+        width = max([len(name) for name, _ in rows] + [len(name) for name in self.counters] + [4])
+        lines = [f"{'span':<{width}}  {'count':>7}  {'total (s)':>10}  {'max (s)':>10}"]
+        for name, stats in rows:
+            lines.append(
+                f"{name:<{width}}  {stats['count']:>7}  {stats['total']:>10.4f}  {stats['max']:>10.4f}"
+            )
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'counter':<{width}}  {'value':>7}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<{width}}  {value:>7}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict:
+        """Returns the recorded spans in Chrome's trace event format (load it in chrome://tracing)."""
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": duration * 1e6,
+                "pid": 0,
+                "tid": tid,
+            }
+            for name, start, duration, tid in self._spans
+        ]
+        events.extend(
+            {"name": name, "ph": "C", "ts": 0, "pid": 0, "args": {name: value}}
+            for name, value in self.counters.items()
+        )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def prometheus(self, prefix="eth_permissions") -> str:
+        """Returns the aggregated metrics in Prometheus' text exposition format."""
+        lines = [
+            f"# TYPE {prefix}_span_seconds summary",
+        ]
+        for name, stats in sorted(self.span_stats.items()):
+            lines.append(f'{prefix}_span_seconds_count{{span="{name}"}} {stats["count"]}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{name}"}} {stats["total"]}')
+        lines.append(f"# TYPE {prefix}_span_max_seconds gauge")
+        for name, stats in sorted(self.span_stats.items()):
+            lines.append(f'{prefix}_span_max_seconds{{span="{name}"}} {stats["max"]}')
+        lines.append(f"# TYPE {prefix}_counter_total counter")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{prefix}_counter_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def profiled(name):
+    """Decorator that records each call to the decorated function as a span of the global profiler."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_profiler().span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+_profiler = None
+
+
+def get_profiler():
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
@@ -0,0 +1,79 @@
+"""Prebuilt roles registry.
+
+Building the registry hashes every known role for every known component. Instead of doing that on every cold
+start, run this module at deploy time to store the registry in a file that's loaded with a single unpickle:
+
+    python -m eth_permissions.registry_artifact app/registry.pickle
+
+It uses the same KNOWN_ROLES, KNOWN_COMPONENTS and KNOWN_COMPONENT_NAMES env vars as the command line tool.
+"""
+
+import argparse
+import os
+from itertools import zip_longest
+
+from hexbytes import HexBytes
+
+from .access_control import Component, Registry, Role, get_registry, set_registry
+
+DEFAULT_KNOWN_ROLES = ["GUARDIAN_ROLE", "LEVEL1_ROLE", "LEVEL2_ROLE", "LEVEL3_ROLE"]
+
+
+def known_registry_settings():
+    """Reads the known roles and components from the environment (and .env file)."""
+    from environs import Env
+
+    env = Env()
+    env.read_env()
+    return (
+        env.list("KNOWN_ROLES", DEFAULT_KNOWN_ROLES),
+        env.list("KNOWN_COMPONENTS", []),
+        env.list("KNOWN_COMPONENT_NAMES", []),
+    )
+
+
+def build_registry(known_roles, known_components, known_component_names, registry=None) -> Registry:
+    if len(known_components) < len(known_component_names):
+        raise RuntimeError("Can't have a component name without address")
+
+    if registry is None:
+        registry = Registry()
+    registry.add_roles([Role(name) for name in known_roles])
+    registry.add_components(
+        [
+            Component(HexBytes(address), name)
+            for address, name in zip_longest(known_components, known_component_names)
+        ]
+    )
+    return registry
+
+
+def load_registry(artifact_path=None, role_names_path=None) -> Registry:
+    """Sets up the global registry, from the prebuilt artifact if there's one or from the environment.
+
+    role_names_path is an optional role names dictionary (see role_names) used for the unregistered hashes.
+    """
+    if artifact_path and os.path.exists(artifact_path):
+        set_registry(Registry.load(artifact_path))
+    else:
+        build_registry(*known_registry_settings(), registry=get_registry())
+    if role_names_path:
+        from .role_names import RoleNameIndex
+
+        get_registry().name_index = RoleNameIndex(role_names_path)
+    return get_registry()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="eth-permissions-registry",
+        description="Builds the roles registry from the environment and writes it to a file",
+    )
+    parser.add_argument("output", help="Output file")
+    args = parser.parse_args()
+
+    build_registry(*known_registry_settings()).save(args.output)
+
+
+if __name__ == "__main__":
+    main()
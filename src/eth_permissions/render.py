@@ -0,0 +1,94 @@
+"""Rendering of the permission graphs of many contracts at once.
+
+The DOT sources are built concurrently (it's mostly waiting on RPC) and each one is written as soon as it's
+ready. The `dot` layouts, single threaded and CPU bound, run as a bounded number of concurrent processes, each
+one killed if it exceeds the timeout.
+"""
+
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+from . import pipeline
+from .graph import build_graph
+from .profiling import get_profiler
+
+DEFAULT_RENDER_TIMEOUT = 300
+
+
+@dataclass
+class RenderResult:
+    address: str
+    source_path: Optional[str] = None
+    output_path: Optional[str] = None
+    error: Optional[str] = None
+
+    def as_dict(self):
+        return {
+            "address": self.address,
+            "source": self.source_path,
+            "output": self.output_path,
+            "error": self.error,
+        }
+
+
+def _build_source(address, output_dir):
+    source = build_graph(address).source
+    source_path = os.path.join(output_dir, f"{address}.gv")
+    with open(source_path, "w") as f:
+        f.write(source)
+    return source_path
+
+
+def _render(source_path, output_path, format, engine, timeout):
+    with get_profiler().span("graphviz.render"):
+        subprocess.run(
+            [engine, f"-T{format}", "-o", output_path, source_path],
+            check=True,
+            capture_output=True,
+            timeout=timeout,
+        )
+    return output_path
+
+
+def render_graphs(
+    addresses: Iterable[str],
+    output_dir,
+    format="svg",
+    engine="dot",
+    render_workers=None,
+    fetch_workers=16,
+    timeout=DEFAULT_RENDER_TIMEOUT,
+) -> Iterator[RenderResult]:
+    """Builds and renders the permissions graph of each contract into output_dir.
+
+    For each address it writes `<address>.gv` (the DOT source) as soon as it's built and `<address>.<format>`
+    once rendered. At most render_workers (default: the number of cores) renders run at the same time.
+    Yields a RenderResult for each contract as soon as it's finished, in completion order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    render_workers = render_workers or os.cpu_count()
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as build_pool, ThreadPoolExecutor(
+        max_workers=render_workers
+    ) as render_pool:
+        stages = [
+            lambda address, _: build_pool.submit(_build_source, address, output_dir),
+            lambda address, source_path: render_pool.submit(
+                _render, source_path, os.path.join(output_dir, f"{address}.{format}"), format, engine, timeout
+            ),
+        ]
+        for done in pipeline.run_pipeline(addresses, stages):
+            # The source is written by the first stage, it's there if the render failed
+            source_path = os.path.join(output_dir, f"{done.item}.gv") if done.stage > 0 else None
+            if isinstance(done.error, subprocess.TimeoutExpired):
+                yield RenderResult(done.item, source_path, error=f"Render timed out after {timeout}s")
+            elif isinstance(done.error, subprocess.CalledProcessError):
+                stderr = done.error.stderr.decode(errors="replace").strip()
+                yield RenderResult(done.item, source_path, error=f"{engine} failed: {stderr}")
+            elif done.error is not None:
+                yield RenderResult(done.item, source_path, error=pipeline.describe(done.error))
+            else:
+                yield RenderResult(done.item, source_path, done.result)
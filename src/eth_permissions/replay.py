@@ -0,0 +1,166 @@
+"""Partitioned replay of huge event histories on a process pool.
+
+The state built from the events is naturally partitioned: the AccessControl snapshot by role hash and the
+AccessManager state by role id (membership, admin, guardian, label and grant delay events) and by target
+(function roles, closed and admin delay events). Each partition only depends on its own events, in order.
+
+The stream is sharded by that key, balancing the number of events per shard, each shard is folded on a
+process pool (the events are sent as compact tuples of base types) and the partial states are merged.
+Streams shorter than `min_events` are replayed in the current process, where the pool isn't worth its cost.
+"""
+
+import heapq
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Hashable, List, Sequence
+from warnings import warn
+
+from . import access_manager as am
+from .profiling import get_profiler
+
+MIN_PARALLEL_EVENTS = 10000
+
+
+def partition(items: Sequence, key: Callable[[object], Hashable], shards: int) -> List[list]:
+    """Splits the items in at most `shards` lists, keeping the items of a key together and in order.
+
+    The keys are assigned largest first to the shard with fewer items, so a few big roles don't end up in
+    the same shard.
+    """
+    counts: Dict[Hashable, int] = {}
+    for item in items:
+        item_key = key(item)
+        counts[item_key] = counts.get(item_key, 0) + 1
+
+    loads = [(0, shard) for shard in range(min(shards, len(counts)))]
+    owners = {}
+    for item_key, count in sorted(counts.items(), key=lambda item: item[1], reverse=True):
+        load, shard = heapq.heappop(loads)
+        owners[item_key] = shard
+        heapq.heappush(loads, (load + count, shard))
+
+    result = [[] for _ in loads]
+    for item in items:
+        result[owners[key(item)]].append(item)
+    return result
+
+
+def _run(fold, shards, workers):
+    with get_profiler().span("replay.fold"), ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fold, *zip(*shards)))
+
+
+def fold_access_control(events) -> Dict[bytes, set]:
+    """Members of each role after the (role hash, granted, account) events, sorted by role and order"""
+    snapshot = {}
+    for role_hash, granted, account in events:
+        if granted:
+            snapshot.setdefault(role_hash, set()).add(account)
+        else:
+            try:
+                snapshot[role_hash].remove(account)
+                if not snapshot[role_hash]:
+                    snapshot.pop(role_hash)
+            except KeyError:
+                warn(f"WARNING: can't remove ungranted role 0x{role_hash.hex()} from {account}")
+    return snapshot
+
+
+def replay_access_control(stream, workers=1, min_events=MIN_PARALLEL_EVENTS) -> Dict[bytes, set]:
+    """The members of each role hash, from an AccessControlEventStream.stream"""
+    for event in stream:
+        if event["event"] not in ("RoleGranted", "RoleRevoked"):
+            raise RuntimeError(f"Unexpected event {event['event']} for role {event['role']}")
+    events = [(bytes(e["role"].hash), e["event"] == "RoleGranted", e["subject"]) for e in stream]
+    if workers <= 1 or len(events) < min_events:
+        return fold_access_control(events)
+
+    with get_profiler().span("replay.partition"):
+        shards = partition(events, key=lambda event: event[0], shards=workers)
+    partials = _run(fold_access_control, [(shard,) for shard in shards], workers)
+    with get_profiler().span("replay.merge"):
+        # The shards have disjoint roles. Sorted by role hash, like the sequential replay of the stream.
+        merged = {role_hash: members for partial in partials for role_hash, members in partial.items()}
+        return dict(sorted(merged.items()))
+
+
+def _access_manager_key(event):
+    name, args = event
+    if "target" in args:
+        return ("target", args["target"])
+    return ("role", args["roleId"])
+
+
+def fold_access_manager(events, timestamp: int) -> tuple:
+    """The partial state of the (event name, args) events of a shard, as plain dicts"""
+    manager = am.AccessManager.from_events(
+        [{"event": name, "args": args} for name, args in events], timestamp
+    )
+    return (
+        manager.roles,
+        manager.targets,
+        {role_id: members for role_id, members in manager.role_members.items() if members},
+        {role_id: admin.id for role_id, admin in manager.role_admins.items()},
+        {role_id: guardian.id for role_id, guardian in manager.role_guardians.items()},
+        {
+            address: [(selector_role.selector, selector_role.role.id) for selector_role in selector_roles]
+            for address, selector_roles in manager.target_allowed_roles.items()
+            if selector_roles
+        },
+        manager._pending,
+    )
+
+
+def merge_access_manager(partials, owners: Dict[int, int], timestamp: int) -> am.AccessManager:
+    """Merges the partial states of the shards. `owners` maps each role id with events to its shard, which
+    has the authoritative label and grant delay; elsewhere the role only shows up as a default Role."""
+    manager = am.AccessManager()
+    manager.timestamp = timestamp
+    for shard, (roles, targets, members, admins, guardians, functions, pending) in enumerate(partials):
+        for role_id, role in roles.items():
+            if owners.get(role_id) == shard or role_id not in manager.roles:
+                manager.roles[role_id] = role
+        manager.targets.update(targets)
+        manager.role_members.update(members)
+        manager._pending.update(pending)
+
+    for _, _, _, admins, guardians, functions, _ in partials:
+        manager.role_admins.update({role_id: manager.roles[admin] for role_id, admin in admins.items()})
+        manager.role_guardians.update(
+            {role_id: manager.roles[guardian] for role_id, guardian in guardians.items()}
+        )
+        for address, selector_roles in functions.items():
+            manager.target_allowed_roles[address] = {
+                am.SelectorRole(manager.roles[role_id], selector) for selector, role_id in selector_roles
+            }
+
+    manager._activations = [(since, key) for key, (since, _) in manager._pending.items()]
+    heapq.heapify(manager._activations)
+    manager._dirty_roles = set(manager.roles)
+    manager._dirty_targets = set(manager.targets) | set(manager.target_allowed_roles)
+    return manager
+
+
+def replay_access_manager(
+    stream, timestamp: int = None, workers=1, min_events=MIN_PARALLEL_EVENTS
+) -> am.AccessManager:
+    """The AccessManager state from an AccessManagerEventStream.stream, like `AccessManager.from_events`"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    if workers <= 1 or len(stream) < min_events:
+        return am.AccessManager.from_events(stream, timestamp)
+
+    with get_profiler().span("replay.partition"):
+        shards = partition(
+            [(event["event"], dict(event["args"])) for event in stream],
+            key=_access_manager_key,
+            shards=workers,
+        )
+        owners = {
+            key[1]: index
+            for index, shard in enumerate(shards)
+            for key in map(_access_manager_key, shard)
+            if key[0] == "role"
+        }
+    partials = _run(fold_access_manager, [(shard, timestamp) for shard in shards], workers)
+    with get_profiler().span("replay.merge"):
+        return merge_access_manager(partials, owners, timestamp)
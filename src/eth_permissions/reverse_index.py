@@ -0,0 +1,232 @@
+"""Cross-contract reverse index: every permission an account holds.
+
+The memberships of many AccessControl and AccessManager contracts are stored in a SQLite database, indexed by
+account. Each contract keeps the last indexed block, so updating the index only fetches the new events:
+
+    index = ReverseIndex("permissions.db")
+    index.update_many([AccessManagerEventStream(address) for address in managers])
+    index.permissions_of("0x...")
+
+AccessManager grants are stored with the timestamp they take effect at (`since`), and the queries only return
+the memberships in effect at the given time. The functions of the PUBLIC_ROLE are returned for every account.
+"""
+
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
+
+from eth_utils import add_0x_prefix, to_checksum_address
+
+from . import access_manager as am
+from .chaindata import (
+    AccessControlEventStream,
+    AccessManagerEventStream,
+    BaseEventStream,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contracts (
+    contract TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    last_block INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS roles (
+    contract TEXT NOT NULL,
+    role TEXT NOT NULL,
+    name TEXT,
+    PRIMARY KEY (contract, role)
+);
+CREATE TABLE IF NOT EXISTS members (
+    contract TEXT NOT NULL,
+    role TEXT NOT NULL,
+    account TEXT NOT NULL,
+    execution_delay INTEGER NOT NULL DEFAULT 0,
+    since INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (contract, role, account)
+);
+CREATE INDEX IF NOT EXISTS members_by_account ON members (account);
+CREATE TABLE IF NOT EXISTS target_functions (
+    contract TEXT NOT NULL,
+    target TEXT NOT NULL,
+    selector TEXT NOT NULL,
+    role TEXT NOT NULL,
+    PRIMARY KEY (contract, target, selector)
+);
+CREATE INDEX IF NOT EXISTS target_functions_by_role ON target_functions (contract, role);
+"""
+
+PUBLIC_ROLE = str(am.AccessManager.PUBLIC_ROLE.id)
+
+
+class ReverseIndex:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(members)")}
+        if "since" not in columns:  # Index created before the since column was added
+            self.db.execute("ALTER TABLE members ADD COLUMN since INTEGER NOT NULL DEFAULT 0")
+
+    def last_block(self, contract) -> int:
+        row = self.db.execute("SELECT last_block FROM contracts WHERE contract = ?", (contract,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _fetch(stream: BaseEventStream, last_block):
+        """Fetches the events of the stream since last_block. Returns (events, up to block).
+
+        Runs on the worker threads, so it only does RPC: the database is only used from the caller's thread.
+        """
+        to_block = stream.provider.w3.eth.block_number
+        events = stream._get_events(
+            stream.EVENTS, from_block=None if last_block is None else last_block + 1, to_block=to_block
+        )
+        return stream._parse_events(events), to_block
+
+    def _apply(self, stream: BaseEventStream, events, to_block):
+        contract = stream.contract_address
+        if isinstance(stream, AccessControlEventStream):
+            kind = "AccessControl"
+            self._apply_access_control(contract, events)
+        elif isinstance(stream, AccessManagerEventStream):
+            kind = "AccessManager"
+            self._apply_access_manager(contract, events)
+        else:
+            raise ValueError(f"Unsupported stream {stream}")
+        self.db.execute(
+            "INSERT OR REPLACE INTO contracts (contract, kind, last_block) VALUES (?, ?, ?)",
+            (contract, kind, to_block),
+        )
+
+    def _apply_access_control(self, contract, events):
+        for event in events:
+            role = add_0x_prefix(event["role"].hash.hex())
+            self.db.execute(
+                "INSERT OR REPLACE INTO roles (contract, role, name) VALUES (?, ?, ?)",
+                (contract, role, str(event["role"])),
+            )
+            if event["event"] == "RoleGranted":
+                self.db.execute(
+                    "INSERT OR REPLACE INTO members (contract, role, account) VALUES (?, ?, ?)",
+                    (contract, role, event["subject"]),
+                )
+            elif event["event"] == "RoleRevoked":
+                self.db.execute(
+                    "DELETE FROM members WHERE contract = ? AND role = ? AND account = ?",
+                    (contract, role, event["subject"]),
+                )
+
+    def _apply_access_manager(self, contract, events):
+        for event in events:
+            args = event["args"]
+            if event["event"] == "RoleGranted":
+                # A new member holds the role from `since`. Regranting a member only changes its delay, the
+                # since of the event is then when the new delay applies, the membership's is kept.
+                self.db.execute(
+                    "INSERT INTO members (contract, role, account, execution_delay, since)"
+                    " VALUES (?, ?, ?, ?, ?) ON CONFLICT (contract, role, account)"
+                    " DO UPDATE SET execution_delay = excluded.execution_delay",
+                    (
+                        contract,
+                        str(args["roleId"]),
+                        to_checksum_address(args["account"]),
+                        args["delay"],
+                        args.get("since", 0),
+                    ),
+                )
+            elif event["event"] == "RoleRevoked":
+                self.db.execute(
+                    "DELETE FROM members WHERE contract = ? AND role = ? AND account = ?",
+                    (contract, str(args["roleId"]), to_checksum_address(args["account"])),
+                )
+            elif event["event"] == "RoleLabel":
+                self.db.execute(
+                    "INSERT OR REPLACE INTO roles (contract, role, name) VALUES (?, ?, ?)",
+                    (contract, str(args["roleId"]), args["label"]),
+                )
+            elif event["event"] == "TargetFunctionRoleUpdated":
+                self.db.execute(
+                    "INSERT OR REPLACE INTO target_functions (contract, target, selector, role)"
+                    " VALUES (?, ?, ?, ?)",
+                    (
+                        contract,
+                        to_checksum_address(args["target"]),
+                        add_0x_prefix(bytes(args["selector"]).hex()),
+                        str(args["roleId"]),
+                    ),
+                )
+
+    def update(self, stream: BaseEventStream):
+        """Indexes the new events of the contract since its last update"""
+        self.update_many([stream], workers=1)
+
+    def update_many(self, streams: Iterable[BaseEventStream], workers=16):
+        """Fetches the new events of all the contracts concurrently and indexes them.
+
+        Each contract is committed as soon as its events are indexed, so an interrupted update resumes from
+        where it was left.
+        """
+        streams = list(streams)
+        last_blocks = [self.last_block(stream.contract_address) for stream in streams]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for stream, (events, to_block) in zip(streams, pool.map(self._fetch, streams, last_blocks)):
+                with self.db:
+                    self._apply(stream, events, to_block)
+
+    def permissions_of(self, account, timestamp: int = None) -> List[dict]:
+        """Every role the account holds across the indexed contracts at the timestamp (by default, now), with
+        the functions it can call for AccessManager roles. The PUBLIC_ROLE of each AccessManager, which
+        everyone holds, is listed last with its functions."""
+        account = to_checksum_address(account)
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        rows = self.db.execute(
+            """
+            SELECT members.contract, contracts.kind, members.role, roles.name, members.execution_delay,
+                members.since,
+                json_group_array(json_array(target_functions.target, target_functions.selector))
+                    FILTER (WHERE target_functions.target IS NOT NULL)
+            FROM members
+            JOIN contracts ON contracts.contract = members.contract
+            LEFT JOIN roles ON roles.contract = members.contract AND roles.role = members.role
+            LEFT JOIN target_functions
+                ON target_functions.contract = members.contract AND target_functions.role = members.role
+            WHERE members.account = ? AND members.since <= ?
+            GROUP BY members.contract, members.role
+            ORDER BY members.contract, members.role
+            """,
+            (account, timestamp),
+        ).fetchall()
+        rows += self.db.execute(
+            """
+            SELECT target_functions.contract, 'AccessManager', target_functions.role, 'PUBLIC_ROLE', 0, 0,
+                json_group_array(json_array(target_functions.target, target_functions.selector))
+            FROM target_functions
+            WHERE target_functions.role = ?
+            GROUP BY target_functions.contract
+            ORDER BY target_functions.contract
+            """,
+            (PUBLIC_ROLE,),
+        ).fetchall()
+
+        permissions = []
+        for contract, kind, role, name, execution_delay, since, functions in rows:
+            targets = {}
+            for target, selector in json.loads(functions):
+                targets.setdefault(target, []).append(selector)
+            permissions.append(
+                {
+                    "contract": contract,
+                    "kind": kind,
+                    "role": int(role) if kind == "AccessManager" else role,
+                    "role_name": name,
+                    "execution_delay": execution_delay,
+                    "since": since,
+                    "targets": targets,
+                }
+            )
+        permissions.sort(key=lambda permission: permission["contract"])  # Stable, the PUBLIC_ROLE stays last
+        return permissions
+
+    def close(self):
+        self.db.close()
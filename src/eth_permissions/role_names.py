@@ -0,0 +1,147 @@
+"""Dictionary of role names to resolve the role hashes that aren't in the registry.
+
+Candidate names come from OpenZeppelin's conventions, from `*_ROLE` permutations of a word list and from the
+role constants found in Solidity sources. They're hashed and sorted in chunks on a process pool, with a
+bounded number of chunks in flight, and merged into a hash index that the Registry consults before giving up
+with an "UNKNOWN ROLE":
+
+    python -m eth_permissions.role_names role_names.idx --words words.txt --solidity contracts/
+"""
+
+import argparse
+import itertools
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from eth_utils import keccak
+
+from .hashindex import HashIndex, chunks, write_index_runs
+
+OZ_ROLE_NAMES = [
+    "ADMIN_ROLE",
+    "MINTER_ROLE",
+    "BURNER_ROLE",
+    "PAUSER_ROLE",
+    "UPGRADER_ROLE",
+    "OPERATOR_ROLE",
+    "GUARDIAN_ROLE",
+    "GOVERNANCE_ROLE",
+    "MANAGER_ROLE",
+    "TIMELOCK_ADMIN_ROLE",
+    "PROPOSER_ROLE",
+    "EXECUTOR_ROLE",
+    "CANCELLER_ROLE",
+    "SNAPSHOT_ROLE",
+    "URI_SETTER_ROLE",
+    "KEEPER_ROLE",
+    "ORACLE_ROLE",
+    "RELAYER_ROLE",
+    "WITHDRAWER_ROLE",
+    "WHITELIST_ROLE",
+    "BLACKLIST_ROLE",
+]
+
+ROLE_SUFFIXES = ["_ROLE", "_ROLE_ADMIN", "_ADMIN_ROLE", "_ADMIN"]
+
+SOLIDITY_ROLE_PATTERNS = [
+    # bytes32 public constant PRICER_ROLE = keccak256("PRICER_ROLE");
+    re.compile(r"keccak256\(\s*(?:abi\.encodePacked\(\s*)?\"([A-Za-z0-9_]+)\"\s*\)"),
+    re.compile(r"bytes32\s+(?:public\s+|internal\s+|private\s+)*constant\s+([A-Z0-9_]+)\s*="),
+]
+
+
+def role_permutations(words: Iterable[str], max_words=2, suffixes=ROLE_SUFFIXES) -> Iterator[str]:
+    """Yields WORD1_WORD2..._SUFFIX names for every combination of up to max_words words"""
+    words = sorted({word.strip().upper() for word in words if word.strip()})
+    for count in range(1, max_words + 1):
+        for combination in itertools.permutations(words, count):
+            base = "_".join(combination)
+            for suffix in suffixes:
+                yield base + suffix
+
+
+def names_from_solidity(paths: Iterable[str]) -> Iterator[str]:
+    """Yields the role-looking constants and keccak256 string literals found in .sol files"""
+    for path in paths:
+        if os.path.isdir(path):
+            files = (
+                os.path.join(root, name)
+                for root, _, names in os.walk(path)
+                for name in names
+                if name.endswith(".sol")
+            )
+        else:
+            files = [path]
+        for file_name in files:
+            with open(file_name, "r", errors="ignore") as f:
+                source = f.read()
+            for pattern in SOLIDITY_ROLE_PATTERNS:
+                yield from pattern.findall(source)
+
+
+def _hash_names(names: List[str]) -> List[Tuple[bytes, str]]:
+    """A sorted run of (hash, name) pairs"""
+    return sorted({(keccak(text=name), name) for name in names})
+
+
+def _bounded_map(pool, function, items, in_flight) -> Iterator:
+    """Like pool.map, but only consumes the items as the results are taken, with at most in_flight pending"""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(function, item))
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def build_role_dictionary(output, candidates: Iterable[str], processes=None, chunk_size=50_000) -> int:
+    """Hashes the candidate names on a process pool and writes the index. Returns the number of names.
+
+    At most two chunks per process are in memory at a time; the hashed chunks are spilled to disk as sorted
+    runs and merged into the index.
+    """
+    processes = processes or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        runs = _bounded_map(pool, _hash_names, chunks(candidates, chunk_size), in_flight=2 * processes)
+        return write_index_runs(output, runs, key_size=32)
+
+
+class RoleNameIndex(HashIndex):
+    def name(self, role_hash: bytes) -> Optional[str]:
+        names = self.lookup(bytes(role_hash))
+        return names[0] if names else None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="eth-permissions-role-names", description="Builds a dictionary of role names by their hash"
+    )
+    parser.add_argument("output", help="Output index file")
+    parser.add_argument("--names", action="append", default=[], help="File with a role name per line")
+    parser.add_argument("--words", action="append", default=[], help="File with words to build *_ROLE names")
+    parser.add_argument("--max-words", type=int, default=2, help="Maximum words in each permutation")
+    parser.add_argument("--solidity", action="append", default=[], help="Solidity file or directory")
+    parser.add_argument("--processes", type=int, default=None, help="Hashing processes (default: all cores)")
+    args = parser.parse_args()
+
+    def read_lines(file_names):
+        for file_name in file_names:
+            with open(file_name, "r") as f:
+                yield from (line.strip() for line in f if line.strip())
+
+    candidates = itertools.chain(
+        OZ_ROLE_NAMES,
+        read_lines(args.names),
+        role_permutations(read_lines(args.words), max_words=args.max_words),
+        names_from_solidity(args.solidity),
+    )
+    count = build_role_dictionary(args.output, candidates, processes=args.processes)
+    print(f"Indexed {count} role names in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
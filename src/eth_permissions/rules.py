@@ -0,0 +1,304 @@
+"""Declarative permission rules for AccessManager snapshots.
+
+A rule selects the entities of a kind (member, role, function or target) that match its `where` conditions.
+Without `require`, every selected entity is a finding; with it, the selected entities that don't meet the
+`require` conditions are. Conditions map a field to a value (equality) or to {operator: value}, with the
+operators eq, ne, in, not_in, gt, gte, lt, lte and contains:
+
+    [
+        {"id": "no-eoa-admin", "kind": "member", "where": {"role": 0, "account_type": "eoa"}},
+        {
+            "id": "guarded-grant-delay",
+            "kind": "role",
+            "where": {"guardian_label": "GUARDIAN"},
+            "require": {"grant_delay": {"gte": 86400}}
+        },
+        {"id": "no-public-functions", "kind": "function", "where": {"role": 18446744073709551615}}
+    ]
+
+The rules are compiled once into predicates over the fields of each kind. The entities (and the indexes they
+come from: members by role, selectors by role, admin chains) are computed once per snapshot and every rule
+is evaluated in the same pass over them.
+
+Fields of each kind:
+- member: role, role_label, account, execution_delay, account_type ("eoa", "contract" or None if unknown)
+- role: role, label, grant_delay, admin, admin_label, admin_chain, guardian, guardian_label, members,
+  functions
+- function: target, selector, role, role_label, target_closed
+- target: target, closed, admin_delay, functions
+Delays are in seconds.
+"""
+
+import json
+import operator
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from eth_utils import to_checksum_address
+from ethproto.wrappers import get_provider
+
+from . import access_manager as am
+from . import pipeline
+from .chaindata import AccessManagerEventStream
+from .profiling import get_profiler
+
+KINDS = ("member", "role", "function", "target")
+
+OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "in": lambda value, expected: value in expected,
+    "not_in": lambda value, expected: value not in expected,
+    "gt": lambda value, expected: value is not None and value > expected,
+    "gte": lambda value, expected: value is not None and value >= expected,
+    "lt": lambda value, expected: value is not None and value < expected,
+    "lte": lambda value, expected: value is not None and value <= expected,
+    "contains": lambda value, expected: value is not None and expected in value,
+}
+
+DEFAULT_RULES = [
+    {
+        "id": "no-eoa-admin",
+        "kind": "member",
+        "where": {"role": am.AccessManager.ADMIN_ROLE.id, "account_type": "eoa"},
+        "message": "An EOA holds the ADMIN_ROLE",
+    },
+    {
+        "id": "no-public-functions",
+        "kind": "function",
+        "where": {"role": am.AccessManager.PUBLIC_ROLE.id},
+        "message": "Restricted function open to everyone",
+    },
+]
+
+
+@dataclass
+class Finding:
+    contract: str
+    rule: str
+    severity: str
+    message: str
+    entity: dict
+
+    def as_dict(self):
+        return {
+            "contract": self.contract,
+            "rule": self.rule,
+            "severity": self.severity,
+            "message": self.message,
+            "entity": self.entity,
+        }
+
+
+@dataclass
+class CompiledRule:
+    id: str
+    kind: str
+    severity: str
+    message: str
+    matches: Callable[[dict], bool]  # True if the entity violates the rule
+
+
+def _compile_conditions(conditions: dict) -> List[Callable[[dict], bool]]:
+    predicates = []
+    for field, condition in conditions.items():
+        if not isinstance(condition, dict):
+            condition = {"eq": condition}
+        for name, expected in condition.items():
+            if name not in OPERATORS:
+                raise ValueError(f"Unknown operator {name} for {field}")
+            if isinstance(expected, list):
+                expected = set(expected) if name in ("in", "not_in") else expected
+            predicates.append(
+                lambda entity, field=field, test=OPERATORS[name], expected=expected: test(
+                    entity.get(field), expected
+                )
+            )
+    return predicates
+
+
+def compile_rule(rule: dict) -> CompiledRule:
+    if rule.get("kind") not in KINDS:
+        raise ValueError(f"Rule {rule.get('id')}: kind must be one of {', '.join(KINDS)}")
+    where = _compile_conditions(rule.get("where", {}))
+    require = _compile_conditions(rule.get("require", {}))
+
+    if require:
+
+        def matches(entity):
+            return all(test(entity) for test in where) and not all(test(entity) for test in require)
+
+    else:
+
+        def matches(entity):
+            return all(test(entity) for test in where)
+
+    return CompiledRule(
+        id=rule["id"],
+        kind=rule["kind"],
+        severity=rule.get("severity", "error"),
+        message=rule.get("message", rule["id"]),
+        matches=matches,
+    )
+
+
+def load_rules(path) -> List[dict]:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def uses_account_type(rules: Iterable[dict]) -> bool:
+    return any(
+        "account_type" in rule.get("where", {}) or "account_type" in rule.get("require", {}) for rule in rules
+    )
+
+
+class SnapshotIndexes:
+    """Indexes of an AccessManager snapshot, computed once and shared by all the rules"""
+
+    def __init__(self, manager: am.AccessManager, account_types: Dict[str, str] = None):
+        self.manager = manager
+        self.account_types = account_types or {}
+        self.members_by_role = {
+            role_id: members for role_id, members in manager.role_members.items() if members
+        }
+        self.selectors_by_role = defaultdict(list)
+        for target, selector_roles in manager.target_allowed_roles.items():
+            for selector_role in selector_roles:
+                self.selectors_by_role[selector_role.role.id].append((target, selector_role.selector))
+        self._admin_chains = {}
+
+    def admin_chain(self, role_id: int) -> List[int]:
+        """The admin of the role, its admin and so on, until a role repeats (ADMIN_ROLE is its own admin)"""
+        if role_id not in self._admin_chains:
+            chain, current = [], role_id
+            while True:
+                admin = self.manager.role_admins.get(current, self.manager.ADMIN_ROLE).id
+                if admin in chain or admin == current:
+                    break
+                chain.append(admin)
+                current = admin
+            self._admin_chains[role_id] = chain
+        return self._admin_chains[role_id]
+
+    def _label(self, role_id: int) -> Optional[str]:
+        role = self.manager.roles.get(role_id)
+        return role.label if role else None
+
+    def entities(self) -> Iterator[tuple]:
+        """(kind, fields) of every member, role, function and target of the snapshot"""
+        manager = self.manager
+        for role_id, members in self.members_by_role.items():
+            for member in members:
+                yield "member", {
+                    "role": role_id,
+                    "role_label": self._label(role_id),
+                    "account": member.address,
+                    "execution_delay": int(member.execution_delay.total_seconds()),
+                    "account_type": self.account_types.get(member.address),
+                }
+        for role in manager.roles.values():
+            admin = manager.get_role_admin(role)
+            guardian = manager.get_role_guardian(role)
+            yield "role", {
+                "role": role.id,
+                "label": role.label,
+                "grant_delay": int(role.grant_delay.total_seconds()),
+                "admin": admin.id,
+                "admin_label": self._label(admin.id),
+                "admin_chain": self.admin_chain(role.id),
+                "guardian": guardian.id,
+                "guardian_label": self._label(guardian.id),
+                "members": len(self.members_by_role.get(role.id, ())),
+                "functions": len(self.selectors_by_role.get(role.id, ())),
+            }
+        for role_id, functions in self.selectors_by_role.items():
+            for target, selector in functions:
+                yield "function", {
+                    "target": target,
+                    "selector": selector,
+                    "role": role_id,
+                    "role_label": self._label(role_id),
+                    "target_closed": manager.get_target(target).closed,
+                }
+        for address in manager.targets.keys() | manager.target_allowed_roles.keys():
+            target = manager.get_target(address)
+            yield "target", {
+                "target": address,
+                "closed": target.closed,
+                "admin_delay": int(target.admin_delay.total_seconds()),
+                "functions": len(manager.target_allowed_roles.get(address, ())),
+            }
+
+
+def evaluate(
+    contract: str, manager: am.AccessManager, rules: List[CompiledRule], account_types: Dict[str, str] = None
+) -> List[Finding]:
+    """Evaluates all the rules in a single pass over the entities of the snapshot"""
+    by_kind = defaultdict(list)
+    for rule in rules:
+        by_kind[rule.kind].append(rule)
+
+    findings = []
+    for kind, entity in SnapshotIndexes(manager, account_types).entities():
+        for rule in by_kind.get(kind, ()):
+            if rule.matches(entity):
+                findings.append(Finding(contract, rule.id, rule.severity, rule.message, entity))
+    return findings
+
+
+def _account_types(provider, events) -> Dict[str, str]:
+    accounts = {
+        to_checksum_address(event["args"]["account"]) for event in events if event["event"] == "RoleGranted"
+    }
+    w3 = provider.w3
+    return {account: "contract" if w3.eth.get_code(account) else "eoa" for account in accounts}
+
+
+def _fetch(address, provider, with_account_types):
+    with get_profiler().span("rules.fetch"):
+        events = AccessManagerEventStream(address, provider=provider).stream
+        account_types = _account_types(provider, events) if with_account_types else {}
+    return events, account_types
+
+
+def _evaluate(address, events, account_types, rules) -> List[Finding]:
+    compiled = [compile_rule(rule) for rule in rules]
+    return evaluate(address, am.AccessManager.from_events(events), compiled, account_types)
+
+
+@dataclass
+class LintResult:
+    address: str
+    findings: Optional[List[Finding]] = None
+    error: Optional[str] = None
+
+
+def lint_contracts(
+    addresses: Iterable[str], rules: List[dict], provider=None, fetch_workers=16, evaluate_workers=None
+) -> Iterator[LintResult]:
+    """Checks the rules on every AccessManager. The events (and the code of the members, when a rule needs
+    the account type) are fetched on a thread pool and the rules evaluated on a process pool of spawned
+    workers (see `pipeline.process_pool`).
+
+    Yields a LintResult for each contract as soon as it's done, in completion order.
+    """
+    for rule in rules:
+        compile_rule(rule)  # Fail early on invalid rules
+    with_account_types = uses_account_type(rules)
+    if provider is None:
+        provider = get_provider("w3")
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, pipeline.process_pool(
+        evaluate_workers
+    ) as evaluate_pool:
+        stages = [
+            lambda address, _: fetch_pool.submit(_fetch, address, provider, with_account_types),
+            lambda address, fetched: evaluate_pool.submit(_evaluate, address, *fetched, rules),
+        ]
+        for done in pipeline.run_pipeline(addresses, stages):
+            if done.error is not None:
+                yield LintResult(done.item, error=pipeline.describe(done.error))
+            else:
+                yield LintResult(done.item, findings=done.result)
@@ -0,0 +1,213 @@
+"""Operations scheduled on AccessManager contracts and still pending.
+
+Calls restricted to roles with an execution delay are scheduled (OperationScheduled) and can be executed once
+their schedule time is reached, until they expire. The pending operations of any number of managers are kept
+in a heap ordered by ready time, so "what becomes executable in the next N hours" doesn't scan the operations
+scheduled later.
+"""
+
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from eth_abi import decode
+from eth_abi.exceptions import DecodingError, ParseError
+from eth_typing import HexStr
+from eth_utils import (
+    add_0x_prefix,
+    function_signature_to_4byte_selector,
+    to_checksum_address,
+)
+
+from . import abis
+from .selector_index import function_signature
+
+# AccessManager.expiration(): scheduled operations can't be executed after this time past their schedule
+EXPIRATION = timedelta(weeks=1)
+
+SCHEDULE_EVENTS = ["OperationScheduled", "OperationExecuted", "OperationCanceled"]
+
+# The AccessManager admin functions are resolved even without a selector index, since most scheduled
+# operations are delayed calls to the manager itself
+KNOWN_SIGNATURES = {
+    function_signature_to_4byte_selector(function_signature(function)): function_signature(function)
+    for function in abis.OZ_ACCESS_MANAGER_ADMIN
+}
+
+
+def _signature_types(signature: str) -> List[str]:
+    """Argument types of a function signature: f(uint256,(address,bytes)) -> [uint256, (address,bytes)]"""
+    args = signature[signature.index("(") + 1 : -1]
+    types, depth, start = [], 0, 0
+    for position, char in enumerate(args):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            types.append(args[start:position])
+            start = position + 1
+    if args:
+        types.append(args[start:])
+    return types
+
+
+@dataclass(frozen=True)
+class ScheduledOperation:
+    manager: str
+    operation_id: HexStr
+    nonce: int
+    schedule: int  # Timestamp when the operation becomes executable
+    caller: str
+    target: str
+    data: bytes
+
+    @property
+    def selector(self) -> HexStr:
+        return add_0x_prefix(HexStr(self.data[:4].hex()))
+
+    def decode(self, selector_index=None) -> dict:
+        """Decodes the calldata against the known signatures and the selector index, if given.
+
+        Returns the selector, the matching signatures and the decoded args (None if the signature is unknown,
+        ambiguous or the calldata doesn't match it).
+        """
+        selector = bytes(self.data[:4])
+        if selector in KNOWN_SIGNATURES:
+            signatures = [KNOWN_SIGNATURES[selector]]
+        elif selector_index is not None:
+            signatures = selector_index.resolve(selector)
+        else:
+            signatures = []
+
+        args = None
+        if len(signatures) == 1:
+            try:
+                args = list(decode(_signature_types(signatures[0]), bytes(self.data[4:])))
+            except (DecodingError, ParseError, ValueError):
+                args = None  # Calldata that doesn't match the signature, or a malformed signature
+        return {"selector": self.selector, "signatures": signatures, "args": args}
+
+    def as_dict(self, selector_index=None):
+        return {
+            "manager": self.manager,
+            "operation_id": self.operation_id,
+            "nonce": self.nonce,
+            "schedule": self.schedule,
+            "caller": self.caller,
+            "target": self.target,
+            "data": add_0x_prefix(HexStr(bytes(self.data).hex())),
+            "call": self.decode(selector_index),
+        }
+
+
+class PendingOperations:
+    """Index of the pending operations of one or many managers, ordered by ready time.
+
+    Executed and canceled operations are dropped from the index right away, but their heap entries are only
+    discarded lazily, when they reach the top of the heap in `prune` or are skipped by the queries.
+    """
+
+    def __init__(self, expiration: timedelta = EXPIRATION):
+        self.expiration = int(expiration.total_seconds())
+        self._heap: List[Tuple[int, str, HexStr, int]] = []  # (schedule, manager, operation_id, nonce)
+        self._operations: Dict[Tuple[str, HexStr], ScheduledOperation] = {}  # (manager, id) -> current op
+
+    def __len__(self):
+        return len(self._operations)
+
+    def __iter__(self):
+        return iter(sorted(self._operations.values(), key=lambda operation: operation.schedule))
+
+    def add(self, operation: ScheduledOperation):
+        self._operations[(operation.manager, operation.operation_id)] = operation
+        heapq.heappush(
+            self._heap, (operation.schedule, operation.manager, operation.operation_id, operation.nonce)
+        )
+
+    def remove(self, manager: str, operation_id: HexStr, nonce: int):
+        current = self._operations.get((manager, operation_id))
+        if current is not None and current.nonce == nonce:
+            del self._operations[(manager, operation_id)]
+
+    def apply_events(self, manager: str, events: Iterable[dict]):
+        """Applies the OperationScheduled/Executed/Canceled events of a manager, in chronological order"""
+        manager = to_checksum_address(manager)
+        for event in events:
+            args = event["args"]
+            operation_id = add_0x_prefix(HexStr(bytes(args["operationId"]).hex()))
+            if event["event"] == "OperationScheduled":
+                self.add(
+                    ScheduledOperation(
+                        manager=manager,
+                        operation_id=operation_id,
+                        nonce=args["nonce"],
+                        schedule=args["schedule"],
+                        caller=to_checksum_address(args["caller"]),
+                        target=to_checksum_address(args["target"]),
+                        data=bytes(args["data"]),
+                    )
+                )
+            elif event["event"] in ("OperationExecuted", "OperationCanceled"):
+                self.remove(manager, operation_id, args["nonce"])
+
+    def _current(self, entry) -> Optional[ScheduledOperation]:
+        _, manager, operation_id, nonce = entry
+        operation = self._operations.get((manager, operation_id))
+        return operation if operation is not None and operation.nonce == nonce else None
+
+    def prune(self, now: int = None):
+        """Drops the expired operations and the stale heap entries of executed or canceled ones"""
+        now = int(time.time()) if now is None else now
+        while self._heap:
+            operation = self._current(self._heap[0])
+            if operation is not None and operation.schedule + self.expiration >= now:
+                break
+            heapq.heappop(self._heap)
+            if operation is not None:
+                del self._operations[(operation.manager, operation.operation_id)]
+
+    def ready_between(self, start: int, end: int) -> List[ScheduledOperation]:
+        """The pending operations whose schedule is in [start, end], in schedule order.
+
+        Walks the heap from the root and skips every subtree whose root is already past `end`, so the
+        operations scheduled later are never visited (call `prune` first to drop the expired ones).
+        """
+        found = []
+        positions = [0] if self._heap else []
+        while positions:
+            position = positions.pop()
+            entry = self._heap[position]
+            if entry[0] > end:
+                continue
+            if entry[0] >= start:
+                operation = self._current(entry)
+                if operation is not None:
+                    found.append(operation)
+            positions.extend(
+                child for child in (2 * position + 1, 2 * position + 2) if child < len(self._heap)
+            )
+        return sorted(found, key=lambda operation: (operation.schedule, operation.manager))
+
+    def executable(self, now: int = None) -> List[ScheduledOperation]:
+        """The operations that can be executed right now"""
+        now = int(time.time()) if now is None else now
+        return self.ready_between(now - self.expiration, now)
+
+    def upcoming(self, within: timedelta, now: int = None) -> List[ScheduledOperation]:
+        """The operations that become executable in the given time from now"""
+        now = int(time.time()) if now is None else now
+        return self.ready_between(now + 1, now + int(within.total_seconds()))
+
+    @classmethod
+    def from_streams(cls, streams, workers=16, expiration: timedelta = EXPIRATION) -> "PendingOperations":
+        """Fetches the scheduling events of many AccessManagerEventStreams concurrently and indexes them"""
+        pending = cls(expiration)
+        streams = list(streams)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for stream, events in zip(streams, pool.map(lambda stream: stream.schedule_stream, streams)):
+                pending.apply_events(stream.contract_address, events)
+        return pending
@@ -0,0 +1,102 @@
+"""4-byte function selector resolution.
+
+The index is built once from local ABI files or compilation artifacts (hardhat, foundry and plain ABI json
+files are supported) and stored in a compact file:
+
+    python -m eth_permissions.selector_index selectors.idx node_modules/@openzeppelin artifacts/
+
+Then it can be used to resolve the selectors found in the AccessManager snapshots and diffs.
+"""
+
+import argparse
+import json
+import os
+from typing import Dict, Iterable, Iterator, List
+
+from eth_utils import collapse_if_tuple, function_signature_to_4byte_selector, to_bytes
+
+from .hashindex import HashIndex, write_index
+
+
+def function_signature(abi_entry: dict) -> str:
+    return f"{abi_entry['name']}({','.join(collapse_if_tuple(arg) for arg in abi_entry.get('inputs', []))})"
+
+
+def _abi_from_json(data):
+    if isinstance(data, dict):
+        data = data.get("abi")
+    if isinstance(data, list) and all(isinstance(entry, dict) for entry in data):
+        return data
+    return None
+
+
+def iter_signatures(paths: Iterable[str]) -> Iterator[str]:
+    """Yields the function signatures found in the json ABIs or artifacts under the given paths."""
+    for path in paths:
+        if os.path.isdir(path):
+            files = (
+                os.path.join(root, name)
+                for root, _, names in os.walk(path)
+                for name in names
+                if name.endswith(".json")
+            )
+        else:
+            files = [path]
+        for file_name in files:
+            try:
+                with open(file_name, "r") as f:
+                    abi = _abi_from_json(json.load(f))
+            except (ValueError, UnicodeDecodeError):
+                continue
+            for entry in abi or []:
+                if entry.get("type") == "function" and "name" in entry:
+                    yield function_signature(entry)
+
+
+def build_selector_index(output, paths: Iterable[str]) -> int:
+    """Hashes each distinct signature once and writes the selector index. Returns the number of signatures."""
+    signatures = set(iter_signatures(paths))
+    write_index(
+        output,
+        ((function_signature_to_4byte_selector(signature), signature) for signature in signatures),
+        key_size=4,
+    )
+    return len(signatures)
+
+
+class SelectorIndex(HashIndex):
+    def resolve(self, selector) -> List[str]:
+        """Returns the signatures matching the selector (more than one on collisions)"""
+        if isinstance(selector, str):
+            selector = to_bytes(hexstr=selector)
+        return self.lookup(bytes(selector))
+
+    def resolve_all(self, selectors: Iterable) -> Dict[str, List[str]]:
+        return {selector: self.resolve(selector) for selector in selectors}
+
+
+def snapshot_selectors(snapshot_dict: dict) -> set:
+    """All the selectors referenced in an AccessManager snapshot dict."""
+    return {
+        selector
+        for role in snapshot_dict.get("roles", {}).values()
+        for selectors in role.get("targets", {}).values()
+        for selector in selectors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="eth-permissions-selectors",
+        description="Builds a 4-byte selector index from ABI json files or artifacts",
+    )
+    parser.add_argument("output", help="Output index file")
+    parser.add_argument("paths", nargs="+", help="ABI / artifact files or directories")
+    args = parser.parse_args()
+
+    count = build_selector_index(args.output, args.paths)
+    print(f"Indexed {count} function signatures in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
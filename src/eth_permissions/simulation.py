@@ -0,0 +1,217 @@
+"""What-if simulation of AccessManager changes.
+
+PersistentAccessManager is an immutable version of the AccessManager model built on persistent maps: applying
+an operation returns a new version in O(log n) that shares everything else with the original. Many candidate
+migrations can be applied to the same snapshot and checked side by side:
+
+    base = PersistentAccessManager.from_access_manager(stream.snapshot)
+    variants = {name: base.apply(operations) for name, operations in candidates.items()}
+    am.compare(variants["a"].to_access_manager(), reference)
+"""
+
+from datetime import timedelta
+from typing import Dict, Iterable, Set
+
+from eth_utils import to_checksum_address
+
+from . import access_manager as am
+from .hamt import PersistentMap
+
+
+def _role_id(role) -> int:
+    return role.id if isinstance(role, am.Role) else int(role)
+
+
+def _address(target) -> str:
+    return to_checksum_address(target.address if isinstance(target, am.Target) else target)
+
+
+def _delay(delay) -> timedelta:
+    return delay if isinstance(delay, timedelta) else timedelta(seconds=int(delay))
+
+
+class PersistentAccessManager:
+    ADMIN_ROLE = am.AccessManager.ADMIN_ROLE
+    PUBLIC_ROLE = am.AccessManager.PUBLIC_ROLE
+
+    __slots__ = ("roles", "targets", "role_members", "role_admins", "role_guardians", "target_functions")
+
+    def __init__(
+        self,
+        roles: PersistentMap = None,  # role id -> Role
+        targets: PersistentMap = None,  # address -> Target
+        role_members: PersistentMap = None,  # role id -> PersistentMap(address -> RoleMember)
+        role_admins: PersistentMap = None,  # role id -> admin role id
+        role_guardians: PersistentMap = None,  # role id -> guardian role id
+        target_functions: PersistentMap = None,  # address -> PersistentMap(selector -> role id)
+    ):
+        if roles is None:
+            roles = PersistentMap(
+                {self.ADMIN_ROLE.id: self.ADMIN_ROLE, self.PUBLIC_ROLE.id: self.PUBLIC_ROLE}
+            )
+        self.roles = roles
+        self.targets = targets if targets is not None else PersistentMap()
+        self.role_members = role_members if role_members is not None else PersistentMap()
+        self.role_admins = role_admins if role_admins is not None else PersistentMap()
+        self.role_guardians = role_guardians if role_guardians is not None else PersistentMap()
+        self.target_functions = target_functions if target_functions is not None else PersistentMap()
+
+    def _replace(self, **changes) -> "PersistentAccessManager":
+        fields = {field: getattr(self, field) for field in self.__slots__}
+        return PersistentAccessManager(**{**fields, **changes})
+
+    def _with_role(self, role_id: int) -> PersistentMap:
+        return self.roles if role_id in self.roles else self.roles.set(role_id, am.Role(role_id))
+
+    @classmethod
+    def from_access_manager(cls, manager: am.AccessManager) -> "PersistentAccessManager":
+        return cls(
+            roles=PersistentMap(manager.roles),
+            targets=PersistentMap(manager.targets),
+            role_members=PersistentMap(
+                {
+                    role_id: PersistentMap({member.address: member for member in members})
+                    for role_id, members in manager.role_members.items()
+                    if members
+                }
+            ),
+            role_admins=PersistentMap({role_id: admin.id for role_id, admin in manager.role_admins.items()}),
+            role_guardians=PersistentMap(
+                {role_id: guardian.id for role_id, guardian in manager.role_guardians.items()}
+            ),
+            target_functions=PersistentMap(
+                {
+                    address: PersistentMap(
+                        {selector_role.selector: selector_role.role.id for selector_role in selector_roles}
+                    )
+                    for address, selector_roles in manager.target_allowed_roles.items()
+                    if selector_roles
+                }
+            ),
+        )
+
+    def to_access_manager(self) -> am.AccessManager:
+        manager = am.AccessManager()
+        manager.roles = dict(self.roles.items())
+        manager._dirty_roles = set(manager.roles)
+        manager.targets = dict(self.targets.items())
+        for role_id, members in self.role_members.items():
+            manager.role_members[role_id] = set(members.values())
+        manager.role_admins = {role_id: self.roles[admin] for role_id, admin in self.role_admins.items()}
+        manager.role_guardians = {
+            role_id: self.roles[guardian] for role_id, guardian in self.role_guardians.items()
+        }
+        for address, selectors in self.target_functions.items():
+            manager.target_allowed_roles[address] = {
+                am.SelectorRole(self.roles[role_id], selector) for selector, role_id in selectors.items()
+            }
+        manager._dirty_targets = set(manager.targets) | set(manager.target_allowed_roles)
+        return manager
+
+    def get_role_members(self, role_id: int) -> Set[am.RoleMember]:
+        return set(self.role_members.get(role_id, PersistentMap()).values())
+
+    def get_target_function_role(self, target: str, selector: str) -> int:
+        return self.target_functions.get(target, PersistentMap()).get(selector, self.ADMIN_ROLE.id)
+
+    def label_role(self, role_id: int, label: str) -> "PersistentAccessManager":
+        role = self.roles.get(role_id, am.Role(role_id))
+        return self._replace(roles=self.roles.set(role_id, am.Role(role_id, label, role.grant_delay)))
+
+    def set_grant_delay(self, role_id: int, delay: timedelta) -> "PersistentAccessManager":
+        role = self.roles.get(role_id, am.Role(role_id))
+        return self._replace(roles=self.roles.set(role_id, am.Role(role_id, role.label, delay)))
+
+    def grant_role(self, role_id: int, account: str, execution_delay: timedelta) -> "PersistentAccessManager":
+        members = self.role_members.get(role_id, PersistentMap())
+        return self._replace(
+            roles=self._with_role(role_id),
+            role_members=self.role_members.set(
+                role_id, members.set(account, am.RoleMember(account, execution_delay))
+            ),
+        )
+
+    def revoke_role(self, role_id: int, account: str) -> "PersistentAccessManager":
+        members = self.role_members.get(role_id, PersistentMap()).delete(account)
+        role_members = (
+            self.role_members.set(role_id, members) if members else self.role_members.delete(role_id)
+        )
+        return self._replace(role_members=role_members)
+
+    def set_role_admin(self, role_id: int, admin_id: int) -> "PersistentAccessManager":
+        roles = self._with_role(role_id)
+        roles = roles if admin_id in roles else roles.set(admin_id, am.Role(admin_id))
+        return self._replace(roles=roles, role_admins=self.role_admins.set(role_id, admin_id))
+
+    def set_role_guardian(self, role_id: int, guardian_id: int) -> "PersistentAccessManager":
+        roles = self._with_role(role_id)
+        roles = roles if guardian_id in roles else roles.set(guardian_id, am.Role(guardian_id))
+        return self._replace(roles=roles, role_guardians=self.role_guardians.set(role_id, guardian_id))
+
+    def set_target_function_role(
+        self, target: str, selectors: Iterable[str], role_id: int
+    ) -> "PersistentAccessManager":
+        functions = self.target_functions.get(target, PersistentMap())
+        for selector in selectors:
+            # ADMIN_ROLE is the default role of every function, there's no need to keep it
+            if role_id == self.ADMIN_ROLE.id:
+                functions = functions.delete(selector)
+            else:
+                functions = functions.set(selector, role_id)
+        target_functions = (
+            self.target_functions.set(target, functions)
+            if functions
+            else self.target_functions.delete(target)
+        )
+        return self._replace(roles=self._with_role(role_id), target_functions=target_functions)
+
+    def set_target_closed(self, target: str, closed: bool) -> "PersistentAccessManager":
+        current = self.targets.get(target, am.Target(target))
+        return self._replace(targets=self.targets.set(target, am.Target(target, closed, current.admin_delay)))
+
+    def set_target_admin_delay(self, target: str, delay: timedelta) -> "PersistentAccessManager":
+        current = self.targets.get(target, am.Target(target))
+        return self._replace(targets=self.targets.set(target, am.Target(target, current.closed, delay)))
+
+    def apply_operation(self, operation: am.Operation) -> "PersistentAccessManager":
+        args = operation.args
+        if operation.op == "labelRole":
+            return self.label_role(_role_id(args["roleId"]), args["label"])
+        if operation.op == "grantRole":
+            return self.grant_role(
+                _role_id(args["roleId"]),
+                to_checksum_address(args["account"]),
+                _delay(args.get("executionDelay", 0)),
+            )
+        if operation.op == "revokeRole":
+            return self.revoke_role(_role_id(args["roleId"]), to_checksum_address(args["account"]))
+        if operation.op == "setRoleAdmin":
+            return self.set_role_admin(_role_id(args["roleId"]), _role_id(args["admin"]))
+        if operation.op == "setRoleGuardian":
+            return self.set_role_guardian(_role_id(args["roleId"]), _role_id(args["guardian"]))
+        if operation.op == "setGrantDelay":
+            return self.set_grant_delay(_role_id(args["roleId"]), _delay(args["newDelay"]))
+        if operation.op == "setTargetFunctionRole":
+            return self.set_target_function_role(
+                _address(args["target"]), args["selectors"], _role_id(args["roleId"])
+            )
+        if operation.op == "setTargetClosed":
+            return self.set_target_closed(_address(args["target"]), bool(args["closed"]))
+        if operation.op == "setTargetAdminDelay":
+            return self.set_target_admin_delay(_address(args["target"]), _delay(args["newDelay"]))
+        raise ValueError(f"Unsupported operation {operation.op}")
+
+    def apply(self, operations: Iterable[am.Operation]) -> "PersistentAccessManager":
+        """The state after applying the operations (e.g. the output of `compare()`), in order"""
+        state = self
+        for operation in operations:
+            state = state.apply_operation(operation)
+        return state
+
+
+def simulate(
+    manager: am.AccessManager, variants: Dict[str, Iterable[am.Operation]]
+) -> Dict[str, PersistentAccessManager]:
+    """Applies each list of operations to the same base state. Returns the resulting state of each variant."""
+    base = PersistentAccessManager.from_access_manager(manager)
+    return {name: base.apply(operations) for name, operations in variants.items()}
@@ -0,0 +1,217 @@
+"""Membership history: the intervals (in blocks) during which each account held each role.
+
+Each grant opens an interval and the matching revoke closes it. The intervals are half-open, [grant, revoke):
+the account no longer holds the role in the block of the revoke. The intervals of each role are kept in an
+interval tree, so questions like "who held the role at block N" or "who held it at any time between blocks A
+and B" run in O(log n + k).
+"""
+
+import csv
+import math
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Callable, Hashable, List, Optional
+
+from eth_utils import to_checksum_address
+
+
+@dataclass(frozen=True)
+class Interval:
+    role: Hashable
+    account: str
+    start: int  # Block of the grant, the first one the role is held
+    end: Optional[int] = None  # Block of the revoke (not held anymore), None if the account still holds it
+
+    @property
+    def last_block(self):
+        """The last block the role is held"""
+        return math.inf if self.end is None else self.end - 1
+
+    @property
+    def blocks(self):
+        """Number of blocks the role is held, infinite if it still is"""
+        return math.inf if self.end is None else self.end - self.start
+
+    def as_dict(self):
+        return {**asdict(self), "role": str(self.role)}
+
+
+class _Node:
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+
+
+def _build(intervals: List[Interval]) -> Optional[_Node]:
+    if not intervals:
+        return None
+    starts = sorted(interval.start for interval in intervals)
+    node = _Node()
+    node.center = starts[len(starts) // 2]
+    here, left, right = [], [], []
+    for interval in intervals:
+        if interval.last_block < node.center:
+            left.append(interval)
+        elif interval.start > node.center:
+            right.append(interval)
+        else:
+            here.append(interval)
+    node.by_start = sorted(here, key=lambda interval: interval.start)
+    node.by_end = sorted(here, key=lambda interval: interval.last_block, reverse=True)
+    node.left = _build(left)
+    node.right = _build(right)
+    return node
+
+
+class IntervalTree:
+    """Static centered interval tree of half-open intervals [start, end)"""
+
+    def __init__(self, intervals: List[Interval]):
+        intervals = [interval for interval in intervals if interval.blocks > 0]  # Empty ones hold no block
+        self._root = _build(intervals)
+        self._by_start = sorted(intervals, key=lambda interval: interval.start)
+        self._starts = [interval.start for interval in self._by_start]
+
+    def stab(self, block: int) -> List[Interval]:
+        """The intervals that contain the block: start <= block < end"""
+        result = []
+        node = self._root
+        while node is not None:
+            if block < node.center:
+                for interval in node.by_start:
+                    if interval.start > block:
+                        break
+                    result.append(interval)
+                node = node.left
+            elif block > node.center:
+                for interval in node.by_end:
+                    if interval.last_block < block:
+                        break
+                    result.append(interval)
+                node = node.right
+            else:
+                result.extend(node.by_start)
+                break
+        return result
+
+    def overlap(self, start: int, end: int) -> List[Interval]:
+        """The intervals that share at least one block with the blocks [start, end] (both included)"""
+        starting_inside = self._by_start[bisect_left(self._starts, start) : bisect_right(self._starts, end)]
+        return [interval for interval in self.stab(start) if interval.start < start] + starting_inside
+
+
+class MembershipTimeline:
+    def __init__(self, intervals: List[Interval]):
+        self.intervals = intervals
+        by_role = defaultdict(list)
+        self._by_member = defaultdict(list)
+        for interval in intervals:
+            by_role[interval.role].append(interval)
+            self._by_member[(interval.role, interval.account)].append(interval)
+        self._trees = {role: IntervalTree(role_intervals) for role, role_intervals in by_role.items()}
+
+    @classmethod
+    def from_events(cls, events) -> "MembershipTimeline":
+        """Builds the timeline from (role, account, block, granted) tuples, in chronological order. A grant's
+        block is the first one the role is held, it may be later than the block of the event (see
+        from_access_manager_stream). Grants revoked before they took effect leave no interval."""
+        open_intervals = {}
+        intervals = []
+        for role, account, block, granted in events:
+            key = (role, account)
+            if granted:
+                # Granting to a current member (e.g. to change its delay) doesn't start a new interval
+                open_intervals.setdefault(key, block)
+            elif key in open_intervals:
+                start = open_intervals.pop(key)
+                if start < block:
+                    intervals.append(Interval(role, account, start, block))
+        intervals.extend(Interval(role, account, start) for (role, account), start in open_intervals.items())
+        return cls(intervals)
+
+    @classmethod
+    def from_access_control_stream(cls, stream) -> "MembershipTimeline":
+        """Timeline of an AccessControlEventStream.stream, keyed by Role"""
+        events = sorted(stream, key=lambda event: event["order"])
+        return cls.from_events(
+            (event["role"], event["subject"], event["order"][0], event["event"] == "RoleGranted")
+            for event in events
+            if event["event"] in ("RoleGranted", "RoleRevoked")
+        )
+
+    @classmethod
+    def from_access_manager_stream(
+        cls, stream, block_at: Callable[[int], int] = None
+    ) -> "MembershipTimeline":
+        """Timeline of an AccessManagerEventStream.stream, keyed by role id.
+
+        Grants take effect at their `since` timestamp. With block_at (timestamp -> first block at or after
+        it), the intervals start at that block. Without it, they start at the block of the grant, so a grant
+        that takes effect later counts as held from the block it was made.
+        """
+        events = sorted(
+            (event for event in stream if event["event"] in ("RoleGranted", "RoleRevoked")),
+            key=lambda event: event["order"],
+        )
+
+        def start_block(event):
+            block = event["order"][0]
+            if block_at is None or event["event"] != "RoleGranted" or not event["args"].get("since"):
+                return block
+            return max(block, block_at(event["args"]["since"]))
+
+        return cls.from_events(
+            (
+                event["args"]["roleId"],
+                to_checksum_address(event["args"]["account"]),
+                start_block(event),
+                event["event"] == "RoleGranted",
+            )
+            for event in events
+        )
+
+    def held_at(self, role, block: int) -> List[Interval]:
+        tree = self._trees.get(role)
+        return tree.stab(block) if tree else []
+
+    def held_between(self, role, start: int, end: int) -> List[Interval]:
+        """Membership intervals of the role that overlap the blocks [start, end]"""
+        tree = self._trees.get(role)
+        return tree.overlap(start, end) if tree else []
+
+    def accounts_between(self, role, start: int, end: int) -> set:
+        return {interval.account for interval in self.held_between(role, start, end)}
+
+    def total_blocks(self, role, account, until: int) -> int:
+        """Number of blocks before `until` in which the account held the role"""
+        return sum(
+            min(interval.last_block + 1, until) - interval.start
+            for interval in self._by_member.get((role, account), ())
+            if interval.start < until
+        )
+
+    def to_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["role", "account", "start", "end"])
+            writer.writeheader()
+            writer.writerows(interval.as_dict() for interval in self.intervals)
+
+    def to_parquet(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+
+        rows = [interval.as_dict() for interval in self.intervals]
+        table = pyarrow.Table.from_pylist(
+            rows,
+            schema=pyarrow.schema(
+                [
+                    ("role", pyarrow.string()),
+                    ("account", pyarrow.string()),
+                    ("start", pyarrow.int64()),
+                    ("end", pyarrow.int64()),
+                ]
+            ),
+        )
+        pyarrow.parquet.write_table(table, path)
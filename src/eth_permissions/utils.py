@@ -18,13 +18,18 @@ class ExplorerAddress:
     EXPLORER_URL_TEMPLATE = "https://polygonscan.com/address/{address}"
 
     @classmethod
-    def get(cls, address):
+    def get(cls, address, chain=None):
+        """Explorer url of the address on the chain (a chains.ChainConfig), or on the default explorer"""
+        if chain is not None:
+            return chain.explorer_url(address)
         return cls.EXPLORER_URL_TEMPLATE.format(address=address)
 
 
 def safe_serializer(obj):
     if hasattr(obj, "as_dict"):
         return obj.as_dict()
+    if hasattr(obj, "to_json"):
+        return obj.to_json()
     if isinstance(obj, set):
         return list(obj)
     if isinstance(obj, defaultdict):
@@ -0,0 +1,42 @@
+import pytest
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector
+
+from eth_permissions.multicall import MULTICALL3_ADDRESS
+
+
+class FakeMulticall3:
+    """An `eth` that answers the aggregate3 calls of the multicall module.
+
+    Each call is answered by the first handler registered for its function (and target, if given) with
+    `encode(output_types, answer(*args))`. The calls without a handler revert.
+    """
+
+    chain_id = 1
+
+    def __init__(self):
+        self.handlers = []
+        self.requests = []  # block_identifier of each aggregate3 call
+
+    def on(self, signature, input_types, output_types, answer, target=None):
+        selector = function_signature_to_4byte_selector(signature)
+        self.handlers.append((selector, target, input_types, output_types, answer))
+
+    def _answer(self, target, calldata):
+        for selector, handler_target, input_types, output_types, answer in self.handlers:
+            if calldata[:4] != selector:
+                continue
+            if handler_target is None or handler_target.lower() == target.lower():
+                return True, encode(output_types, answer(*decode(input_types, calldata[4:])))
+        return False, b""
+
+    def call(self, transaction, block_identifier="latest"):
+        assert transaction["to"] == MULTICALL3_ADDRESS
+        self.requests.append(block_identifier)
+        (calls,) = decode(["(address,bool,bytes)[]"], transaction["data"][4:])
+        return encode(["(bool,bytes)[]"], [[self._answer(target, calldata) for target, _, calldata in calls]])
+
+
+@pytest.fixture
+def multicall3():
+    return FakeMulticall3()
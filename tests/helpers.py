@@ -0,0 +1,62 @@
+"""Addresses, events and logs shared by the tests"""
+
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic, to_checksum_address
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+
+ALICE = "0x8c5f6aEB655D687929a82c5d430Ec56abaDdc0c8"
+BOB = "0x47E2aFB074487682Db5Db6c7e41B43f913026544"
+TARGET = "0xa65c9dE776d1f30c095EFF9C775E001a1d366df8"
+MANAGER = to_checksum_address("0xabcdef0123456789abcdef0123456789abcdef01")
+
+# A value of each ABI type, for the args without an explicit value
+VALUES = {
+    "address": ALICE,
+    "bool": True,
+    "bytes4": bytes.fromhex("a9059cbb"),
+    "bytes32": bytes(range(32)),
+    "uint32": 86400,
+    "uint48": 1_700_000_000,
+    "uint64": 2**64 - 1,
+    "string": "MINTER ✓",
+    "bytes": bytes.fromhex("a9059cbb") + bytes(64) + b"\x01",
+}
+
+
+def event(name, order, **args):
+    """An event as in the parsed AccessManagerEventStream.stream"""
+    return {"event": name, "args": AttributeDict(args), "order": order}
+
+
+def event_entries(abi):
+    return [entry for entry in abi if entry["type"] == "event"]
+
+
+def event_entry(abi, name):
+    return next(entry for entry in event_entries(abi) if entry["name"] == name)
+
+
+def make_log(entry, values, block=10, log_index=3):
+    """A log as formatted by web3's get_logs. Each arg takes its value by name from values, or by type if it
+    isn't there."""
+    topics = [HexBytes(event_abi_to_log_topic(entry))]
+    data_types, data_values = [], []
+    for arg in entry["inputs"]:
+        value = values[arg["name"]] if arg["name"] in values else values[arg["type"]]
+        if arg["indexed"]:
+            topics.append(HexBytes(encode([arg["type"]], [value])))
+        else:
+            data_types.append(arg["type"])
+            data_values.append(value)
+    return {
+        "address": MANAGER,
+        "topics": topics,
+        "data": HexBytes(encode(data_types, data_values)),
+        "blockNumber": block,
+        "logIndex": log_index,
+        "transactionHash": HexBytes(bytes(32)),
+        "transactionIndex": 0,
+        "blockHash": HexBytes(bytes(32)),
+        "removed": False,
+    }
@@ -0,0 +1,125 @@
+from datetime import timedelta
+
+from eth_permissions import access_manager as am
+
+from .helpers import ALICE, BOB, TARGET, event
+
+
+def test_compare_detects_member_and_label_changes():
+    current = am.AccessManager.from_events(
+        [
+            event("RoleLabel", (1, 0), roleId=1, label="PRICER"),
+            event("RoleGranted", (1, 1), roleId=1, account=ALICE, delay=0, since=0, newMember=True),
+        ]
+    )
+    reference = am.AccessManager.from_events(
+        [
+            event("RoleLabel", (1, 0), roleId=1, label="PRICER_ROLE"),
+            event("RoleGranted", (1, 1), roleId=1, account=BOB, delay=0, since=0, newMember=True),
+        ]
+    )
+
+    operations = {(op.op, op.args.get("account")) for op in am.compare(current, reference)}
+
+    assert operations == {("labelRole", None), ("revokeRole", ALICE), ("grantRole", BOB)}
+
+
+def test_compare_same_state_has_no_differences():
+    events = [
+        event("RoleGranted", (1, 1), roleId=1, account=ALICE, delay=0, since=0, newMember=True),
+        event(
+            "TargetFunctionRoleUpdated", (2, 0), roleId=1, target=TARGET, selector=bytes.fromhex("12345678")
+        ),
+    ]
+    assert am.compare(am.AccessManager.from_events(events), am.AccessManager.from_events(events)) == []
+
+
+def test_compare_grants_roles_missing_from_current():
+    reference = am.AccessManager.from_events(
+        [event("RoleGranted", (1, 1), roleId=5, account=ALICE, delay=0, since=0, newMember=True)]
+    )
+
+    (operation,) = am.compare(am.AccessManager(), reference)
+
+    assert operation.op == "grantRole"
+    assert operation.args["roleId"].id == 5 and operation.args["account"] == ALICE
+
+
+def test_target_function_role_is_reassigned():
+    selector = bytes.fromhex("12345678")
+    manager = am.AccessManager.from_events(
+        [
+            event("TargetFunctionRoleUpdated", (1, 0), roleId=1, target=TARGET, selector=selector),
+            event("TargetFunctionRoleUpdated", (2, 0), roleId=2, target=TARGET, selector=selector),
+        ]
+    )
+
+    assert manager.get_target_allowed_role(TARGET, "0x12345678").id == 2
+    assert len(manager.target_allowed_roles[TARGET]) == 1
+
+
+def test_content_hash():
+    events = [
+        event("RoleLabel", (1, 0), roleId=1, label="PRICER"),
+        event("RoleGranted", (1, 1), roleId=1, account=ALICE, delay=0, since=0, newMember=True),
+        event(
+            "TargetFunctionRoleUpdated", (2, 0), roleId=1, target=TARGET, selector=bytes.fromhex("12345678")
+        ),
+    ]
+    manager = am.AccessManager.from_events(events)
+    same = am.AccessManager.from_events(events)
+    assert manager.content_hash == same.content_hash
+
+    same.grant_role(am.Role(1), BOB)
+    assert manager.content_hash != same.content_hash
+    assert manager.changed_subtrees(same) == {"roles": [1], "targets": []}
+
+    same.revoke_role(am.Role(1), BOB)
+    assert manager.content_hash == same.content_hash
+
+    same.set_target_function_role(same.get_target(TARGET), {"0x12345678"}, am.AccessManager.ADMIN_ROLE)
+    assert manager.changed_subtrees(same)["targets"] == [TARGET]
+
+
+def test_from_events_with_target_events():
+    manager = am.AccessManager.from_events(
+        [
+            event("RoleGranted", (1, 1), roleId=1, account=ALICE, delay=0, since=0, newMember=True),
+            event("TargetClosed", (2, 0), target=TARGET, closed=True),
+            event("TargetAdminDelayUpdated", (2, 1), target=TARGET, delay=60, since=0),
+        ]
+    )
+
+    assert manager.targets[TARGET].closed
+    assert manager.targets[TARGET].admin_delay == timedelta(seconds=60)
+
+
+def test_changes_take_effect_at_since():
+    events = [
+        event("RoleGranted", (1, 0), roleId=1, account=ALICE, delay=0, since=100, newMember=True),
+        event("RoleGrantDelayChanged", (1, 1), roleId=1, delay=60, since=200),
+        # Existing member: the new execution delay applies from 300
+        event("RoleGranted", (2, 0), roleId=1, account=ALICE, delay=30, since=300, newMember=False),
+        event("TargetAdminDelayUpdated", (2, 1), target=TARGET, delay=90, since=400),
+    ]
+    manager = am.AccessManager.from_events(events, timestamp=50)
+    role = am.Role(1)
+
+    assert manager.get_role_members(role) == set()
+    assert [change["since"] for change in manager.pending_changes()] == [100, 200, 300, 400]
+
+    at_250 = manager.at_time(250)
+    (member,) = at_250.get_role_members(role)
+    assert member.execution_delay == timedelta(0)
+    assert at_250.roles[1].grant_delay == timedelta(seconds=60)
+    assert at_250.get_target(TARGET).admin_delay == timedelta(0)
+
+    at_500 = at_250.at_time(500)
+    (member,) = at_500.get_role_members(role)
+    assert member.execution_delay == timedelta(seconds=30)
+    assert at_500.get_target(TARGET).admin_delay == timedelta(seconds=90)
+    assert at_500.pending_changes() == []
+    assert at_500.content_hash == am.AccessManager.from_events(events, timestamp=500).content_hash
+
+    # The copies don't change the original state
+    assert manager.get_role_members(role) == set()
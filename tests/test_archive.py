@@ -0,0 +1,87 @@
+import csv
+import gzip
+import json
+from types import SimpleNamespace
+
+from eth_permissions import abis
+from eth_permissions.archive import ArchiveSource
+from eth_permissions.chaindata import AccessManagerEventStream
+
+from .helpers import ALICE, BOB, MANAGER, TARGET, VALUES, event_entry, make_log
+
+ROLE_GRANTED = event_entry(abis.OZ_ACCESS_MANAGER, "RoleGranted")
+ROLE_REVOKED = event_entry(abis.OZ_ACCESS_MANAGER, "RoleRevoked")
+
+
+def raw(log, address=MANAGER):
+    """Log as exported by an indexer: lowercase hex strings and snake_case columns"""
+    return {
+        "address": address.lower(),
+        "topics": ["0x" + topic.hex() for topic in log["topics"]],
+        "data": "0x" + log["data"].hex(),
+        "block_number": log["blockNumber"],
+        "log_index": log["logIndex"],
+        "transaction_hash": "0x" + log["transactionHash"].hex(),
+    }
+
+
+def archive_logs():
+    return [
+        raw(make_log(ROLE_GRANTED, {**VALUES, "address": ALICE}, block=10, log_index=0)),
+        raw(make_log(ROLE_GRANTED, {**VALUES, "address": BOB}, block=10, log_index=1), address=TARGET),
+        raw(make_log(ROLE_GRANTED, {**VALUES, "address": BOB}, block=12, log_index=0)),
+        raw(make_log(ROLE_REVOKED, {**VALUES, "address": ALICE}, block=15, log_index=2)),
+    ]
+
+
+def test_archive_formats(tmp_path):
+    logs = archive_logs()
+    with gzip.open(tmp_path / "logs.jsonl.gz", "wt") as f:
+        f.writelines(json.dumps(log) + "\n" for log in logs[:2])
+    with open(tmp_path / "logs.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["block_number", "log_index", "transaction_hash", "address", "data", "topics"])
+        for log in logs[2:]:
+            writer.writerow(
+                [
+                    log["block_number"],
+                    log["log_index"],
+                    log["transaction_hash"],
+                    log["address"],
+                    log["data"],
+                    ",".join(log["topics"]),
+                ]
+            )
+
+    archive = ArchiveSource([tmp_path / "logs.csv", tmp_path / "logs.jsonl.gz"], workers=1)
+    found, last_block = archive.logs(MANAGER, [logs[0]["topics"][0]])
+
+    assert [(log["blockNumber"], log["logIndex"]) for log in found] == [(10, 0), (12, 0)]
+    assert last_block == 12
+
+
+def test_stream_reads_the_archive_then_the_rpc_tail(tmp_path):
+    with open(tmp_path / "logs.jsonl", "w") as f:
+        f.writelines(json.dumps(log) + "\n" for log in archive_logs())
+    requests = []
+
+    def get_logs(filter_params):
+        requests.append((filter_params["fromBlock"], filter_params["toBlock"]))
+        return [make_log(ROLE_GRANTED, {**VALUES, "address": ALICE}, block=20, log_index=0)]
+
+    class Provider:
+        w3 = SimpleNamespace(
+            eth=SimpleNamespace(get_logs=get_logs), provider=SimpleNamespace(make_request=None)
+        )
+
+    stream = AccessManagerEventStream(MANAGER, provider=Provider())
+    stream._get_contract_wrapper = lambda: None
+    stream.archive = ArchiveSource([tmp_path / "logs.jsonl"])
+
+    assert [(e["event"], e["args"]["account"], e["order"]) for e in stream.stream] == [
+        ("RoleGranted", ALICE, (10, 0)),
+        ("RoleGranted", BOB, (12, 0)),
+        ("RoleRevoked", ALICE, (15, 2)),
+        ("RoleGranted", ALICE, (20, 0)),
+    ]
+    assert requests == [(16, "latest")]
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+from eth_utils import keccak, to_bytes
+
+from eth_permissions.bloom import HeaderCache, may_have_logs
+from eth_permissions.chaindata import AccessManagerEventStream
+
+from .helpers import ALICE, TARGET
+
+TOPIC = keccak(text="RoleGranted(uint64,address,uint32,uint48,bool)")
+
+
+def make_bloom(*values):
+    """Yellow paper M3:2048, as a big endian 2048 bits number"""
+    bloom = 0
+    for value in values:
+        digest = keccak(value)
+        for i in (0, 2, 4):
+            bloom |= 1 << (int.from_bytes(digest[i : i + 2], "big") % 2048)
+    return bloom.to_bytes(256, "big")
+
+
+def test_may_have_logs():
+    bloom = make_bloom(to_bytes(hexstr=TARGET), TOPIC)
+    assert may_have_logs(bloom, TARGET, [TOPIC])
+    assert not may_have_logs(bloom, ALICE, [TOPIC])
+    assert not may_have_logs(bloom, TARGET, [keccak(text="RoleRevoked(uint64,address)")])
+    assert not may_have_logs(bytes(256), TARGET, [TOPIC])
+
+
+def test_candidate_ranges_fetch_each_header_once():
+    blocks_with_logs = {3, 5, 40, 41}
+    fetched = []
+
+    def get_block(number):
+        fetched.append(number)
+        if number in blocks_with_logs:
+            return {"logsBloom": make_bloom(to_bytes(hexstr=TARGET), TOPIC)}
+        return {"logsBloom": make_bloom(to_bytes(hexstr=ALICE), TOPIC)}
+
+    cache = HeaderCache(SimpleNamespace(eth=SimpleNamespace(get_block=get_block)))
+
+    assert list(cache.candidate_ranges(TARGET, [TOPIC], 0, 49, max_range=10)) == [(3, 5), (40, 41)]
+    assert list(cache.candidate_ranges(TARGET, [TOPIC], 0, 59, max_range=50)) == [(3, 41)]
+    assert sorted(fetched) == list(range(60))
+
+    # The headers are fetched a window at a time, as the ranges are consumed
+    fetched.clear()
+    ranges = cache.candidate_ranges(TARGET, [TOPIC], 0, 199, max_range=20)
+    assert next(ranges) == (3, 5)
+    assert fetched == []
+    assert list(ranges) == [(40, 41)]
+    assert sorted(fetched) == list(range(60, 200))
+
+
+def test_stream_prefilter_starts_at_the_first_block():
+    requested_headers = []
+
+    def get_block(number):
+        requested_headers.append(number)
+        values = (to_bytes(hexstr=TARGET), TOPIC) if number == 40 else ()
+        return {"logsBloom": make_bloom(*values)}
+
+    requests = []
+
+    def get_logs(filter_params):
+        requests.append((filter_params["fromBlock"], filter_params["toBlock"]))
+        return []
+
+    class Provider:
+        w3 = SimpleNamespace(
+            eth=SimpleNamespace(get_logs=get_logs, block_number=59),
+            provider=SimpleNamespace(make_request=None),
+        )
+
+        def get_first_block(self, contract_wrapper):
+            return 30
+
+    stream = AccessManagerEventStream(TARGET, provider=Provider())
+    stream._get_contract_wrapper = lambda: None
+    stream.header_cache = HeaderCache(SimpleNamespace(eth=SimpleNamespace(get_block=get_block)))
+
+    assert stream.stream == []
+    assert sorted(requested_headers) == list(range(30, 60))
+    assert requests == [(40, 40)]
@@ -0,0 +1,45 @@
+import json
+from types import SimpleNamespace
+
+from eth_permissions.chaindata import AccessManagerEventStream
+from eth_permissions.chains import ChainConfig, load_chains, parse_target
+from eth_permissions.utils import ExplorerAddress
+
+from .helpers import TARGET
+
+
+def test_load_chains(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARBITRUM_RPC", "https://arb.example/rpc")
+    path = tmp_path / "chains.json"
+    path.write_text(json.dumps({"42161": {"rpc_url": "$ARBITRUM_RPC", "max_block_range": 1000}}))
+
+    chains = load_chains(str(path))
+
+    assert chains[42161].rpc_url == "https://arb.example/rpc"
+    assert ExplorerAddress.get(TARGET, chains[42161]) == f"https://arbiscan.io/address/{TARGET}"
+    assert ExplorerAddress.get(TARGET) == f"https://polygonscan.com/address/{TARGET}"
+    assert parse_target(f"42161:{TARGET}") == (42161, TARGET)
+
+
+def test_fetch_respects_block_range_and_confirmations():
+    requests = []
+
+    def get_logs(filter_params):
+        requests.append((filter_params["fromBlock"], filter_params["toBlock"]))
+        return []
+
+    class Provider:
+        w3 = SimpleNamespace(
+            eth=SimpleNamespace(block_number=2600, get_logs=get_logs),
+            provider=SimpleNamespace(make_request=None),
+        )
+
+        def get_first_block(self, wrapper):
+            return 100
+
+    chain = ChainConfig(chain_id=1, rpc_url="", max_block_range=1000, confirmations=100)
+    stream = AccessManagerEventStream(TARGET, provider=Provider(), chain=chain)
+    stream._get_contract_wrapper = lambda: None
+
+    assert stream.stream == []
+    assert requests == [(100, 1099), (1100, 2099), (2100, 2500)]
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import pytest
+from hexbytes import HexBytes
+
+from eth_permissions import access_control
+from eth_permissions.access_control import Component, Registry, Role
+from eth_permissions.component_names import ComponentNames
+
+USDC = "0x3c499c542cEF5E3811e1192ce70d8cC03d5c3359"
+OLD_TOKEN = "0x8c5f6aEB655D687929a82c5d430Ec56abaDdc0c8"  # bytes32 name(), string symbol()
+EOA = "0x47E2aFB074487682Db5Db6c7e41B43f913026544"
+
+
+@pytest.fixture
+def w3(multicall3):
+    multicall3.chain_id = 137
+    multicall3.on("name()", [], ["string"], lambda: ("USD Coin",), target=USDC)
+    multicall3.on("symbol()", [], ["string"], lambda: ("USDC",), target=USDC)
+    multicall3.on("name()", [], ["bytes32"], lambda: (b"Old Token",), target=OLD_TOKEN)
+    multicall3.on("symbol()", [], ["string"], lambda: ("OLD",), target=OLD_TOKEN)
+    return SimpleNamespace(eth=multicall3)
+
+
+def test_component_names_are_fetched_in_one_batch_and_cached(tmp_path, w3):
+    names = ComponentNames(str(tmp_path / "names.json"))
+
+    assert names.resolve(w3, [USDC, OLD_TOKEN.lower(), EOA]) == {
+        USDC: "USD Coin",
+        OLD_TOKEN: "OLD",
+        EOA: None,
+    }
+    assert len(w3.eth.requests) == 1
+
+    assert ComponentNames(str(tmp_path / "names.json")).resolve(w3, [USDC, EOA]) == {
+        USDC: "USD Coin",
+        EOA: None,
+    }
+    assert len(w3.eth.requests) == 1
+
+
+def test_name_roles(monkeypatch, w3):
+    registry = Registry()
+    monkeypatch.setattr(access_control, "_registry", registry)  # Restored after the test
+    registry.add_roles([Role("LEVEL2_ROLE")])
+    usdc_role = registry.get(Role("LEVEL2_ROLE", Component(HexBytes(USDC))).hash)
+    eoa_role = registry.get(Role("LEVEL2_ROLE", Component(HexBytes(EOA))).hash)
+    assert str(usdc_role).startswith("Role:LEVEL2_ROLE@Component<")
+
+    assert ComponentNames().name_roles(w3, [usdc_role, eoa_role, Role("LEVEL2_ROLE")]) == 1
+
+    assert str(usdc_role) == "Role:LEVEL2_ROLE@USD Coin"
+    assert eoa_role.component.name is None
+    assert str(registry.get(usdc_role.hash)) == "Role:LEVEL2_ROLE@USD Coin"
@@ -0,0 +1,56 @@
+import pytest
+from eth_utils import to_checksum_address
+from web3 import Web3
+
+from eth_permissions import abis, decoder
+
+from .helpers import ALICE, MANAGER, TARGET, VALUES, event_entries, make_log
+
+
+@pytest.mark.parametrize(
+    "abi,log_decoder",
+    [(abis.OZ_ACCESS_CONTROL, decoder.ACCESS_CONTROL), (abis.OZ_ACCESS_MANAGER, decoder.ACCESS_MANAGER)],
+)
+def test_decoder_matches_web3(abi, log_decoder):
+    contract = Web3().eth.contract(address=MANAGER, abi=abi)
+    for entry in event_entries(abi):
+        for values in (VALUES, {**VALUES, "address": TARGET, "bool": False, "string": "", "bytes": b""}):
+            log = make_log(entry, values)
+            expected = getattr(contract.events, entry["name"])().process_log(log)
+
+            decoded = log_decoder.decode(log)
+
+            assert decoded["event"] == expected["event"]
+            assert decoded["args"] == dict(expected["args"])
+            assert (decoded["blockNumber"], decoded["logIndex"]) == (10, 3)
+            assert decoded["address"] == MANAGER
+
+
+def test_decoder_raw_json_logs():
+    entry = next(e for e in event_entries(abis.OZ_ACCESS_MANAGER) if e["name"] == "RoleGranted")
+    log = make_log(entry, VALUES)
+    raw = {
+        **log,
+        "topics": ["0x" + topic.hex() for topic in log["topics"]],
+        "data": "0x" + log["data"].hex(),
+        "blockNumber": "0xa",
+        "logIndex": "0x3",
+        "transactionHash": "0x" + bytes(32).hex(),
+        "address": MANAGER.lower(),
+    }
+
+    assert decoder.ACCESS_MANAGER.decode(raw) == decoder.ACCESS_MANAGER.decode(log)
+    assert decoder.ACCESS_MANAGER.decode(raw)["args"] == {
+        "roleId": 2**64 - 1,
+        "account": to_checksum_address(ALICE),
+        "delay": 86400,
+        "since": 1_700_000_000,
+        "newMember": True,
+    }
+
+
+def test_decoder_unknown_event():
+    entry = next(e for e in event_entries(abis.OZ_ACCESS_CONTROL) if e["name"] == "RoleGranted")
+    # Same name, different signature: AccessControl's RoleGranted isn't an AccessManager event
+    with pytest.raises(decoder.UnknownEvent):
+        decoder.ACCESS_MANAGER.decode(make_log(entry, VALUES))
@@ -0,0 +1,203 @@
+from types import SimpleNamespace
+
+import pytest
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+from eth_permissions import abis
+from eth_permissions import access_manager as am
+from eth_permissions import delta
+from eth_permissions.chaindata import AccessControlEventStream, AccessManagerEventStream
+from eth_permissions.delta import KeyIndex
+
+from .helpers import ALICE, BOB, MANAGER, TARGET, event_entry, make_log
+
+SELECTOR = bytes.fromhex("a9059cbb")
+MINTER = keccak(text="MINTER_ROLE")
+GUARDIAN = keccak(text="GUARDIAN_ROLE")
+
+
+def manager_log(name, block, log_index, **args):
+    return make_log(event_entry(abis.OZ_ACCESS_MANAGER, name), args, block, log_index)
+
+
+def control_log(name, block, log_index, **args):
+    return make_log(event_entry(abis.OZ_ACCESS_CONTROL, name), args, block, log_index)
+
+
+class FakeEth:
+    """Serves the logs by block range, the reads go to the fake Multicall3"""
+
+    def __init__(self, logs, multicall3):
+        self.logs = logs
+        self.call = multicall3.call
+        self.log_requests = []
+
+    def get_logs(self, filter_params):
+        self.log_requests.append((filter_params["fromBlock"], filter_params["toBlock"]))
+        topics = {HexBytes(topic) for topic in filter_params["topics"][0]}
+        to_block = filter_params["toBlock"]
+        return [
+            log
+            for log in self.logs
+            if log["topics"][0] in topics
+            and log["blockNumber"] >= filter_params["fromBlock"]
+            and (to_block == "latest" or log["blockNumber"] <= to_block)
+        ]
+
+    def get_block(self, block_identifier):
+        return {"timestamp": 1000 + 12 * block_identifier}
+
+
+def make_stream(cls, logs, multicall3):
+    eth = FakeEth(logs, multicall3)
+
+    class Provider:
+        w3 = SimpleNamespace(eth=eth, provider=SimpleNamespace(make_request=None))
+
+        def get_first_block(self, contract_wrapper):
+            return 0
+
+    stream = cls(MANAGER, provider=Provider())
+    stream._get_contract_wrapper = lambda: None
+    return stream, eth
+
+
+def manager_logs():
+    granted = dict(delay=0, since=0, newMember=True)
+    return [
+        # Before the range
+        manager_log("RoleLabel", 1, 0, roleId=1, label="MINTER"),
+        manager_log("RoleGranted", 1, 1, roleId=1, account=ALICE, **granted),
+        manager_log("RoleGranted", 2, 0, roleId=1, account=BOB, **granted),
+        manager_log("TargetFunctionRoleUpdated", 3, 0, target=TARGET, selector=SELECTOR, roleId=1),
+        # The range: ALICE is revoked and granted back, BOB is revoked and gets role 2, the function moves
+        manager_log("RoleRevoked", 10, 0, roleId=1, account=ALICE),
+        manager_log("RoleGranted", 11, 0, roleId=1, account=ALICE, **granted),
+        manager_log("RoleRevoked", 12, 0, roleId=1, account=BOB),
+        manager_log("TargetFunctionRoleUpdated", 13, 0, target=TARGET, selector=SELECTOR, roleId=2),
+        manager_log("RoleGranted", 15, 0, roleId=2, account=BOB, **{**granted, "delay": 60}),
+        # After the range
+        manager_log("RoleRevoked", 30, 0, roleId=2, account=BOB),
+    ]
+
+
+def as_set(operations):
+    """The operations, with the roles by id (labels aside) and the targets by address"""
+
+    def plain(value):
+        return value.id if isinstance(value, am.Role) else getattr(value, "address", value)
+
+    return {
+        (operation.op, repr(sorted((key, plain(value)) for key, value in operation.args.items())))
+        for operation in operations
+    }
+
+
+def expected_manager_delta(stream, from_block, to_block):
+    """compare() of the states replayed up to each end of the range"""
+    before = [e for e in stream.stream if e["order"] < (from_block, 0)]
+    after = [e for e in stream.stream if e["order"] <= (to_block, 2**32)]
+    return am.compare(am.AccessManager.from_events(before), am.AccessManager.from_events(after))
+
+
+def test_access_manager_delta_from_the_loaded_stream(multicall3):
+    stream, eth = make_stream(AccessManagerEventStream, manager_logs(), multicall3)
+    stream.stream
+    expected = expected_manager_delta(stream, 10, 20)
+
+    operations = stream.delta(10, 20)
+
+    assert [operation.op for operation in operations] == ["revokeRole", "grantRole", "setTargetFunctionRole"]
+    assert as_set(operations) == as_set(expected)
+    assert eth.log_requests == [(0, "latest"), (10, 20)]
+    assert multicall3.requests == []
+
+
+def test_access_manager_deltas_index_the_loaded_stream_once(multicall3, monkeypatch):
+    stream, _ = make_stream(AccessManagerEventStream, manager_logs(), multicall3)
+    stream.stream
+    indexes = []
+    monkeypatch.setattr(delta, "KeyIndex", lambda *args: indexes.append(args) or KeyIndex(*args))
+
+    for from_block, to_block in [(10, 20), (2, 12), (12, 40)]:
+        expected = expected_manager_delta(stream, from_block, to_block)
+        assert as_set(stream.delta(from_block, to_block)) == as_set(expected)
+    assert len(indexes) == 1
+
+    stream._load_stream()
+    stream.delta(10, 20)
+    assert len(indexes) == 2
+
+
+def test_access_manager_delta_reads_the_prior_state(multicall3):
+    multicall3.on(
+        "hasRole(uint64,address)", ["uint64", "address"], ["bool", "uint32"], lambda role, _: (role == 1, 0)
+    )
+    multicall3.on("getTargetFunctionRole(address,bytes4)", ["address", "bytes4"], ["uint64"], lambda *_: (1,))
+    stream, eth = make_stream(AccessManagerEventStream, manager_logs(), multicall3)
+    loaded, _ = make_stream(AccessManagerEventStream, manager_logs(), multicall3)
+    expected = expected_manager_delta(loaded, 10, 20)
+
+    assert as_set(stream.delta(10, 20)) == as_set(expected)
+    assert eth.log_requests == [(10, 20)]
+    assert multicall3.requests == [9]
+
+
+def test_access_manager_delta_resolves_since_at_the_last_block(multicall3):
+    # Block 20 is at 1240
+    stream, _ = make_stream(
+        AccessManagerEventStream,
+        [
+            manager_log("RoleGranted", 10, 0, roleId=1, account=BOB, delay=0, since=1120, newMember=True),
+            manager_log("RoleGranted", 11, 0, roleId=2, account=ALICE, delay=0, since=5000, newMember=True),
+            manager_log("RoleGrantDelayChanged", 12, 0, roleId=1, delay=3600, since=1300),
+            manager_log("TargetAdminDelayUpdated", 13, 0, target=TARGET, delay=60, since=1200),
+        ],
+        multicall3,
+    )
+    stream.stream
+
+    operations = stream.delta(10, 20)
+
+    assert [(operation.op, operation.args.get("since")) for operation in operations] == [
+        ("grantRole", None),
+        ("setTargetAdminDelay", None),
+        ("setGrantDelay", 1300),
+        ("grantRole", 5000),
+    ]
+    assert operations[0].args["account"] == BOB
+    assert operations[3].args["account"] == ALICE
+    assert operations[3].args["roleId"].id == 2
+
+
+@pytest.mark.parametrize("loaded", [False, True])
+def test_access_control_delta(loaded, multicall3):
+    logs = [
+        control_log("RoleGranted", 1, 0, role=MINTER, account=ALICE, sender=BOB),
+        control_log("RoleGranted", 10, 0, role=MINTER, account=BOB, sender=BOB),
+        control_log("RoleRevoked", 11, 0, role=MINTER, account=ALICE, sender=BOB),
+        control_log("RoleGranted", 12, 0, role=MINTER, account=ALICE, sender=BOB),
+        control_log(
+            "RoleAdminChanged", 13, 0, role=MINTER, previousAdminRole=bytes(32), newAdminRole=GUARDIAN
+        ),
+    ]
+    multicall3.on(
+        "hasRole(bytes32,address)",
+        ["bytes32", "address"],
+        ["bool"],
+        lambda role, account: (account.lower() == ALICE.lower(),),
+    )
+    stream, _ = make_stream(AccessControlEventStream, logs, multicall3)
+    if loaded:
+        stream.stream
+
+    operations = stream.delta(10)
+
+    assert [(operation.op, operation.args.get("account")) for operation in operations] == [
+        ("setRoleAdmin", None),
+        ("grantRole", BOB),
+    ]
+    assert operations[1].args["role"].hash == HexBytes(MINTER)
+    assert operations[0].args["admin"].hash == HexBytes(GUARDIAN)
+    assert multicall3.requests == ([] if loaded else [9])
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+from eth_permissions.discovery import AuthorityIndex, is_range_error
+
+from .helpers import ALICE, BOB, TARGET
+
+MANAGER = "0x9F7B8a4bF9d9b4D3E6B2bD5d1C1f7E2aE6D1b5f0"
+OTHER_MANAGER = ALICE
+
+
+def authority_updated(address, authority, block):
+    return {
+        "address": address,
+        "data": bytes(12) + bytes.fromhex(authority[2:]),
+        "blockNumber": block,
+        "logIndex": 0,
+    }
+
+
+class FakeEth:
+    chain_id = 1
+
+    def __init__(self, logs, block_number, max_range):
+        self.logs = logs
+        self.block_number = block_number
+        self.max_range = max_range
+        self.requests = []
+
+    def get_logs(self, params):
+        if params["toBlock"] - params["fromBlock"] >= self.max_range:
+            raise ValueError("block range too large")
+        self.requests.append((params["fromBlock"], params["toBlock"]))
+        return [log for log in self.logs if params["fromBlock"] <= log["blockNumber"] <= params["toBlock"]]
+
+
+def test_managed_targets_incremental(tmp_path):
+    eth = FakeEth(
+        [authority_updated(TARGET, MANAGER, 10), authority_updated(BOB, MANAGER, 30)],
+        block_number=99,
+        max_range=25,
+    )
+    cache = str(tmp_path / "authorities.json")
+    index = AuthorityIndex(SimpleNamespace(eth=eth), cache_path=cache, chunk_size=50)
+
+    assert index.update() == 99
+    assert index.managed_by(MANAGER) == {TARGET, BOB}
+    # The chunks of 50 blocks exceed the node limit and are split
+    assert sorted(eth.requests) == [(0, 24), (25, 49), (50, 74), (75, 99)]
+
+    eth.logs.append(authority_updated(BOB, OTHER_MANAGER, 120))
+    eth.block_number = 130
+    eth.requests = []
+    index = AuthorityIndex(SimpleNamespace(eth=eth), cache_path=cache, chunk_size=50)
+    index.update()
+
+    assert eth.requests == [(100, 115), (116, 130)]
+    assert index.managed_by(MANAGER) == {TARGET}
+    assert index.managed_by(OTHER_MANAGER) == {BOB}
+
+
+def test_only_range_errors_are_split():
+    class FailingEth(FakeEth):
+        def get_logs(self, params):
+            self.requests.append((params["fromBlock"], params["toBlock"]))
+            raise ConnectionError("connection reset")
+
+    eth = FailingEth([], block_number=99, max_range=25)
+    index = AuthorityIndex(SimpleNamespace(eth=eth), chunk_size=100, workers=1)
+    with pytest.raises(ConnectionError):
+        index.update()
+    assert eth.requests == [(0, 99)]
+    assert index.last_block == -1
+
+    assert is_range_error(ValueError({"code": -32005, "message": "limit exceeded"}))
+    assert is_range_error(ValueError("query returned more than 10000 results"))
+    assert not is_range_error(ValueError({"code": -32000, "message": "header not found"}))
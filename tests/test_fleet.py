@@ -0,0 +1,19 @@
+from eth_permissions import access_manager as am
+from eth_permissions.fleet import (
+    EXIT_DRIFT,
+    EXIT_ERROR,
+    EXIT_OK,
+    FleetResult,
+    exit_code,
+)
+
+
+def test_exit_code():
+    in_sync = FleetResult("0x1", "a.json", differences=[])
+    drifted = FleetResult("0x2", "b.json", differences=[am.Operation("revokeRole", {"roleId": 1})])
+    failed = FleetResult("0x3", "c.json", error="ValueError: boom")
+
+    assert exit_code([in_sync]) == EXIT_OK
+    assert exit_code([in_sync, drifted]) == EXIT_DRIFT
+    assert exit_code([drifted, failed]) == EXIT_ERROR
+    assert in_sync.as_dict()["in_sync"] and not drifted.as_dict()["in_sync"]
@@ -0,0 +1,72 @@
+import json
+
+from hexbytes import HexBytes
+
+from eth_permissions import graph
+from eth_permissions.access_control import Component, Role
+
+from .helpers import ALICE, BOB, TARGET
+
+COMPONENT = Component(HexBytes(TARGET), "PolicyPool")
+
+
+def snapshot():
+    return [
+        {"role": Role.default_admin(), "members": [ALICE]},
+        {"role": Role("GUARDIAN_ROLE", COMPONENT), "members": [ALICE, BOB]},
+        {"role": Role("LEVEL1_ROLE", COMPONENT), "members": [BOB]},
+    ]
+
+
+def test_graph_elements():
+    elements = list(graph.graph_elements(TARGET, snapshot()))
+    model = graph.graph_model(elements)
+
+    nodes = {node["data"]["id"]: node["data"] for node in model["nodes"]}
+    guardian = graph._role_id(Role("GUARDIAN_ROLE", COMPONENT))
+    assert nodes[guardian]["parent"] == "component:" + TARGET.lower()
+    assert nodes[guardian]["members"] == 2
+    assert nodes[ALICE]["roles"] == 2
+    # Only the accounts with exactly the same roles share a group
+    assert nodes[ALICE]["group"] != nodes[BOB]["group"]
+    assert len(model["edges"]) == 4
+
+    # Every element comes after the nodes it references
+    seen = set()
+    for element in elements:
+        data = element["data"]
+        assert {data.get("source"), data.get("target"), data.get("parent")} - {None} <= seen
+        seen.add(data["id"])
+
+    lines = list(graph.elements_jsonl(elements))
+    assert [json.loads(line) for line in lines] == elements
+
+
+def test_dot_from_elements():
+    dot = graph.to_dot(graph.graph_elements(TARGET, snapshot()))
+
+    # The role nodes keep their bare hash as id
+    admin = Role.default_admin().hash.hex()
+    assert not admin.startswith("0x")
+    assert f'"{ALICE}" -> {admin}' in dot.source  # All digits, so graphviz doesn't quote it
+    assert "component:" not in dot.source
+
+
+def test_build_elements_yields_the_contract_before_loading(monkeypatch):
+    loaded = []
+
+    class FakeStream:
+        def __init__(self, contract_address, chain=None):
+            pass
+
+        @property
+        def snapshot(self):
+            loaded.append(True)
+            return snapshot()
+
+    monkeypatch.setattr(graph, "AccessControlEventStream", FakeStream)
+    elements = graph.build_elements(TARGET)
+    assert next(elements)["data"]["id"] == graph.CONTRACT_NODE
+    assert loaded == []
+
+    assert list(elements) == list(graph.graph_elements(TARGET, snapshot()))[1:] and loaded == [True]
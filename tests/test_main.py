@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+import pytest
+
+from eth_permissions.main import configure_stream, parser, run
+
+
+def test_configure_stream_applies_the_stream_options(tmp_path):
+    args = parser.parse_args(
+        ["--type", "AccessControl", "--archive", str(tmp_path / "logs.jsonl"), "--replay-workers", "4", "0x1"]
+    )
+    stream = SimpleNamespace(header_cache=None, archive=None, replay_workers=1)
+
+    assert configure_stream(args, stream) is stream
+    assert stream.archive is not None
+    assert stream.replay_workers == 4
+    assert stream.header_cache is None
+
+
+def test_batch_commands_reject_the_stream_options():
+    args = parser.parse_args(["--rules", "default", "--replay-workers", "4", "0x1", "0x2"])
+    with pytest.raises(SystemExit):
+        run(args)
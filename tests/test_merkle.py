@@ -0,0 +1,35 @@
+from eth_permissions.merkle import MerkleMap, hash_leaf
+
+
+def make_map(count):
+    tree = MerkleMap()
+    for index in range(count):
+        tree[index] = hash_leaf(index)
+    return tree
+
+
+def test_root_only_rehashes_the_changed_buckets():
+    tree = make_map(1000)
+    copy = tree.copy()
+    assert tree.root == copy.root
+
+    tree[7] = hash_leaf("changed")
+    assert len(tree._dirty) == 1
+    assert tree.root != copy.root
+    assert tree.diff(copy) == {7}
+
+    tree[7] = hash_leaf(7)
+    assert tree.root == copy.root
+
+
+def test_root_is_independent_of_insertion_order():
+    tree = make_map(300)
+    reversed_tree = MerkleMap()
+    for index in reversed(range(300)):
+        reversed_tree[index] = hash_leaf(index)
+    reversed_tree[1000] = hash_leaf(1000)
+    reversed_tree.discard(1000)
+
+    assert tree.root == reversed_tree.root
+    assert tree.diff(reversed_tree) == set()
+    assert make_map(299).diff(tree) == {299}
@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+from eth_permissions.multicall import Call, aggregate
+
+from .helpers import ALICE, BOB
+
+
+def test_aggregate_batches_and_decodes(multicall3):
+    # hasRole is true only for ALICE, anything else reverts
+    multicall3.on(
+        "hasRole(bytes32,address)",
+        ["bytes32", "address"],
+        ["bool"],
+        lambda role, account: (account.lower() == ALICE.lower(),),
+    )
+    w3 = SimpleNamespace(eth=multicall3)
+    role = b"\x01" * 32
+    calls = [Call(BOB, "hasRole(bytes32,address)", (role, account), ("bool",)) for account in (ALICE, BOB)]
+    calls.append(Call(BOB, "getRoleAdmin(bytes32)", (role,), ("bytes32",)))
+
+    assert aggregate(w3, calls, batch_size=2) == [True, False, None]
+    assert len(multicall3.requests) == 2
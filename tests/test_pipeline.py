@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from eth_permissions.pipeline import (
+    EXIT_ERROR,
+    EXIT_FOUND,
+    EXIT_OK,
+    exit_code,
+    process_pool,
+    run_pipeline,
+)
+
+
+def fetch(item):
+    if item == "bad-fetch":
+        raise ValueError("no logs")
+    return item.upper()
+
+
+def check(fetched):
+    if fetched == "BAD-CHECK":
+        raise ValueError("no snapshot")
+    return len(fetched)
+
+
+def test_items_go_through_every_stage_until_they_fail():
+    with ThreadPoolExecutor(2) as fetch_pool, ThreadPoolExecutor(2) as check_pool:
+        stages = [
+            lambda item, _: fetch_pool.submit(fetch, item),
+            lambda item, fetched: check_pool.submit(check, fetched),
+        ]
+        done = {d.item: d for d in run_pipeline(["ok", "bad-fetch", "bad-check"], stages)}
+
+    assert (done["ok"].stage, done["ok"].result, done["ok"].error) == (1, 2, None)
+    assert done["bad-fetch"].stage == 0
+    assert str(done["bad-fetch"].error) == "no logs"
+    assert done["bad-check"].stage == 1
+    assert str(done["bad-check"].error) == "no snapshot"
+
+
+def test_exit_code():
+    assert exit_code(False) == EXIT_OK
+    assert exit_code(False, found=True) == EXIT_FOUND
+    assert exit_code(True, found=True) == EXIT_ERROR
+
+
+def test_process_stage_workers_are_spawned():
+    with ThreadPoolExecutor(2) as fetch_pool, process_pool(1) as check_pool:
+        stages = [
+            lambda item, _: fetch_pool.submit(fetch, item),
+            lambda item, fetched: check_pool.submit(check, fetched),
+        ]
+        assert [(d.item, d.result) for d in run_pipeline(["spawned"], stages)] == [("spawned", 7)]
+        assert check_pool._mp_context.get_start_method() == "spawn"
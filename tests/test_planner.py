@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from eth_abi import decode
+from eth_utils import function_signature_to_4byte_selector
+
+from eth_permissions import access_manager as am
+from eth_permissions.planner import encode_multicall, plan
+
+ALICE = "0x8c5f6aEB655D687929a82c5d430Ec56abaDdc0c8"
+TARGET = "0xa65c9dE776d1f30c095EFF9C775E001a1d366df8"
+PRICER = am.Role(3, "PRICER")
+
+
+def test_plan_merges_selectors_and_orders_phases():
+    operations = [
+        am.Operation("grantRole", {"roleId": PRICER, "account": ALICE, "executionDelay": timedelta(0)}),
+        am.Operation(
+            "setTargetFunctionRole", {"target": TARGET, "selectors": {"0x11111111"}, "roleId": PRICER}
+        ),
+        am.Operation(
+            "setTargetFunctionRole", {"target": TARGET, "selectors": {"0x22222222"}, "roleId": PRICER}
+        ),
+        am.Operation("labelRole", {"roleId": PRICER, "label": "PRICER"}),
+    ]
+
+    planned = plan(operations)
+
+    assert [operation.op for operation in planned] == ["labelRole", "setTargetFunctionRole", "grantRole"]
+    assert planned[1].args["selectors"] == {"0x11111111", "0x22222222"}
+
+
+def test_plan_drops_overridden_operations():
+    operations = [
+        am.Operation("grantRole", {"roleId": PRICER, "account": ALICE, "executionDelay": timedelta(0)}),
+        am.Operation(
+            "setTargetFunctionRole", {"target": TARGET, "selectors": {"0x11111111"}, "roleId": PRICER}
+        ),
+        am.Operation("revokeRole", {"roleId": PRICER, "account": ALICE}),
+        am.Operation(
+            "setTargetFunctionRole",
+            {"target": TARGET, "selectors": {"0x11111111"}, "roleId": am.AccessManager.ADMIN_ROLE},
+        ),
+    ]
+
+    planned = plan(operations)
+
+    assert [operation.op for operation in planned] == ["setTargetFunctionRole", "revokeRole"]
+    assert planned[0].args["roleId"] == am.AccessManager.ADMIN_ROLE
+
+
+def test_encode_multicall_chunks_by_gas():
+    operations = [
+        am.Operation(
+            "grantRole", {"roleId": PRICER, "account": ALICE, "executionDelay": timedelta(seconds=60)}
+        )
+    ] * 5
+
+    (single,) = encode_multicall(operations)
+    chunked = encode_multicall(operations, gas_limit=200_000)
+    assert len(chunked) == 3
+
+    assert single[:4] == function_signature_to_4byte_selector("multicall(bytes[])")
+    (calls,) = decode(["bytes[]"], single[4:])
+    assert len(calls) == 5
+    assert calls[0][:4] == function_signature_to_4byte_selector("grantRole(uint64,address,uint32)")
+    assert decode(["uint64", "address", "uint32"], calls[0][4:]) == (3, ALICE.lower(), 60)
@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+from eth_permissions.profiling import Profiler
+
+
+def test_span_aggregates():
+    profiler = Profiler()
+    for _ in range(3):
+        with profiler.span("replay"):
+            pass
+    profiler.incr("events", 10)
+    profiler.incr("events", 5)
+
+    assert profiler.span_stats["replay"]["count"] == 3
+    assert profiler.span_stats["replay"]["total"] >= profiler.span_stats["replay"]["max"]
+    assert profiler.counters["events"] == 15
+    assert "replay" in profiler.table()
+
+
+def test_chrome_trace_only_when_tracing():
+    profiler = Profiler()
+    with profiler.span("fetch_events"):
+        pass
+    assert profiler.chrome_trace()["traceEvents"] == []
+
+    profiler = Profiler(trace=True)
+    with profiler.span("fetch_events"):
+        pass
+    (event,) = profiler.chrome_trace()["traceEvents"]
+    assert event["name"] == "fetch_events"
+    assert event["ph"] == "X"
+
+
+def test_prometheus_format():
+    profiler = Profiler()
+    with profiler.span("build_graph"):
+        pass
+    profiler.incr("rpc_calls", 2)
+
+    text = profiler.prometheus()
+    assert 'eth_permissions_span_seconds_count{span="build_graph"} 1' in text
+    assert 'eth_permissions_counter_total{name="rpc_calls"} 2' in text
+
+
+def test_rpc_bytes_only_when_counting_bytes():
+    for count_bytes in (False, True):
+        profiler = Profiler(count_bytes=count_bytes)
+        w3 = SimpleNamespace(provider=SimpleNamespace(make_request=lambda method, params: {"result": "0x1"}))
+        profiler.instrument_web3(w3)
+        w3.provider.make_request("eth_blockNumber", [])
+
+        assert profiler.counters["rpc_calls.eth_blockNumber"] == 1
+        assert ("rpc_bytes" in profiler.counters) == count_bytes
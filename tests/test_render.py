@@ -0,0 +1,39 @@
+import shutil
+
+import graphviz
+import pytest
+
+from eth_permissions import render
+
+
+def fake_build_graph(address):
+    if address == "0xbad":
+        raise ValueError("not a contract")
+    dot = graphviz.Digraph("Permissions")
+    dot.edge("member", "role")
+    return dot
+
+
+def test_render_graphs_reports_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(render, "build_graph", fake_build_graph)
+
+    results = {
+        result.address: result
+        for result in render.render_graphs(["0xbad", "0xgood"], tmp_path, engine="not-a-graphviz-engine")
+    }
+
+    assert results["0xbad"].error == "ValueError: not a contract"
+    assert results["0xgood"].source_path == str(tmp_path / "0xgood.gv")
+    assert "digraph Permissions" in (tmp_path / "0xgood.gv").read_text()
+    assert results["0xgood"].error.startswith("FileNotFoundError")
+
+
+@pytest.mark.skipif(shutil.which("dot") is None, reason="graphviz is not installed")
+def test_render_graphs(tmp_path, monkeypatch):
+    monkeypatch.setattr(render, "build_graph", fake_build_graph)
+
+    (result,) = render.render_graphs(["0xgood"], tmp_path, format="svg", render_workers=2)
+
+    assert result.error is None
+    assert result.output_path == str(tmp_path / "0xgood.svg")
+    assert "<svg" in (tmp_path / "0xgood.svg").read_text()
@@ -0,0 +1,88 @@
+import random
+
+from eth_utils import to_checksum_address
+
+from eth_permissions import access_manager as am
+from eth_permissions import replay
+from eth_permissions.access_control import Role
+
+from .helpers import event
+
+NOW = 1_700_000_000
+
+
+def random_manager_stream(count, seed=0):
+    rng = random.Random(seed)
+    accounts = [to_checksum_address(rng.randbytes(20)) for _ in range(10)]
+    targets = accounts[:3]
+    roles = range(1, 9)
+    stream = []
+    for order in range(count):
+        role, account, target = rng.choice(roles), rng.choice(accounts), rng.choice(targets)
+        since = NOW + rng.choice([-100, 100])
+        name, args = rng.choice(
+            [
+                ("RoleGranted", dict(roleId=role, account=account, delay=rng.randrange(3), since=since)),
+                ("RoleGranted", dict(roleId=role, account=account, delay=0, since=0)),
+                ("RoleRevoked", dict(roleId=role, account=account)),
+                ("RoleLabel", dict(roleId=role, label=f"ROLE_{order}")),
+                ("RoleAdminChanged", dict(roleId=role, admin=rng.choice(roles))),
+                ("RoleGuardianChanged", dict(roleId=role, guardian=rng.choice(roles))),
+                ("RoleGrantDelayChanged", dict(roleId=role, delay=rng.randrange(3), since=since)),
+                (
+                    "TargetFunctionRoleUpdated",
+                    dict(roleId=rng.choice([0, role]), target=target, selector=bytes([rng.randrange(4)] * 4)),
+                ),
+                ("TargetClosed", dict(target=target, closed=rng.random() < 0.5)),
+                ("TargetAdminDelayUpdated", dict(target=target, delay=rng.randrange(3), since=since)),
+            ]
+        )
+        stream.append(event(name, (order, 0), **args))
+    return stream
+
+
+def test_partition_keeps_keys_together_and_in_order():
+    items = [("a", 1), ("b", 2), ("a", 3), ("c", 4), ("a", 5)]
+
+    shards = replay.partition(items, key=lambda item: item[0], shards=2)
+
+    assert sorted(shards, key=len) == [[("b", 2), ("c", 4)], [("a", 1), ("a", 3), ("a", 5)]]
+    assert replay.partition(items, key=lambda item: item[0], shards=8)[0] == [("a", 1), ("a", 3), ("a", 5)]
+
+
+def test_partitioned_access_manager_replay_matches_sequential():
+    stream = random_manager_stream(2000)
+    sequential = am.AccessManager.from_events(stream, timestamp=NOW)
+
+    parallel = replay.replay_access_manager(stream, timestamp=NOW, workers=3, min_events=0)
+
+    assert parallel.content_hash == sequential.content_hash
+    assert sorted(map(repr, parallel.pending_changes())) == sorted(map(repr, sequential.pending_changes()))
+    assert {role.id: (role.label, role.grant_delay) for role in parallel.roles.values()} == {
+        role.id: (role.label, role.grant_delay) for role in sequential.roles.values()
+    }
+    assert parallel.at_time(NOW + 200).content_hash == sequential.at_time(NOW + 200).content_hash
+
+
+def test_partitioned_access_control_replay_matches_sequential():
+    rng = random.Random(1)
+    roles = [Role(f"ROLE_{i}") for i in range(6)]
+    accounts = [to_checksum_address(rng.randbytes(20)) for _ in range(5)]
+    stream = sorted(
+        (
+            {
+                "role": rng.choice(roles),
+                "subject": rng.choice(accounts),
+                "event": rng.choice(["RoleGranted", "RoleGranted", "RoleRevoked"]),
+                "order": (order, 0),
+            }
+            for order in range(500)
+        ),
+        key=lambda e: (e["role"].hash, e["order"]),
+    )
+
+    sequential = replay.replay_access_control(stream)
+    parallel = replay.replay_access_control(stream, workers=2, min_events=0)
+
+    assert parallel == sequential
+    assert list(parallel) == list(sequential)
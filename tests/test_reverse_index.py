@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+from web3.datastructures import AttributeDict
+
+from eth_permissions import access_manager as am
+from eth_permissions.chaindata import AccessManagerEventStream
+from eth_permissions.reverse_index import ReverseIndex
+
+from .helpers import ALICE, BOB, TARGET, event
+
+MANAGER = "0x9F7B8a4bF9d9b4D3E6B2bD5d1C1f7E2aE6D1b5f0"
+
+
+class FakeStream(AccessManagerEventStream):
+    def __init__(self, address, events, block_number):
+        super().__init__(address, provider=SimpleNamespace(w3=SimpleNamespace(eth=SimpleNamespace())))
+        self.events = events
+        self.provider.w3.eth.block_number = block_number
+        self.requested = []
+
+    def _get_events(self, event_names, from_block=None, to_block=None):
+        self.requested.append((from_block, to_block))
+        return [
+            AttributeDict(
+                dict(event=e["event"], args=e["args"], blockNumber=e["order"][0], logIndex=e["order"][1])
+            )
+            for e in self.events
+            if (from_block or 0) <= e["order"][0] <= to_block
+        ]
+
+
+def test_permissions_of_across_updates(tmp_path):
+    stream = FakeStream(
+        MANAGER,
+        [
+            event("RoleLabel", (1, 0), roleId=1, label="PRICER"),
+            event("RoleGranted", (1, 1), roleId=1, account=ALICE, delay=10, since=0, newMember=True),
+            event("RoleGranted", (1, 2), roleId=1, account=BOB, delay=0, since=0, newMember=True),
+            event("TargetFunctionRoleUpdated", (2, 0), roleId=1, target=TARGET, selector=b"\x12\x34\x56\x78"),
+        ],
+        block_number=2,
+    )
+    index = ReverseIndex(str(tmp_path / "index.db"))
+    index.update(stream)
+
+    assert index.permissions_of(ALICE.lower()) == [
+        {
+            "contract": MANAGER,
+            "kind": "AccessManager",
+            "role": 1,
+            "role_name": "PRICER",
+            "execution_delay": 10,
+            "since": 0,
+            "targets": {TARGET: ["0x12345678"]},
+        }
+    ]
+
+    stream.events.append(event("RoleRevoked", (3, 0), roleId=1, account=BOB))
+    stream.provider.w3.eth.block_number = 3
+    index.update(stream)
+
+    assert stream.requested == [(None, 2), (3, 3)]
+    assert index.permissions_of(BOB) == []
+    assert index.last_block(MANAGER) == 3
+
+
+def test_pending_grants_and_public_functions(tmp_path):
+    public = am.AccessManager.PUBLIC_ROLE.id
+    stream = FakeStream(
+        MANAGER,
+        [
+            event("RoleGranted", (1, 0), roleId=1, account=ALICE, delay=0, since=1000, newMember=True),
+            # Regranting only changes the delay, the membership still starts at 1000
+            event("RoleGranted", (2, 0), roleId=1, account=ALICE, delay=60, since=500, newMember=False),
+            event(
+                "TargetFunctionRoleUpdated",
+                (2, 1),
+                roleId=public,
+                target=TARGET,
+                selector=b"\x12\x34\x56\x78",
+            ),
+        ],
+        block_number=2,
+    )
+    index = ReverseIndex(str(tmp_path / "index.db"))
+    index.update(stream)
+
+    public_permission = {
+        "contract": MANAGER,
+        "kind": "AccessManager",
+        "role": public,
+        "role_name": "PUBLIC_ROLE",
+        "execution_delay": 0,
+        "since": 0,
+        "targets": {TARGET: ["0x12345678"]},
+    }
+    assert index.permissions_of(ALICE, timestamp=999) == [public_permission]
+    assert index.permissions_of(BOB, timestamp=999) == [public_permission]
+    assert [
+        (p["role"], p["execution_delay"], p["since"]) for p in index.permissions_of(ALICE, timestamp=1000)
+    ] == [
+        (1, 60, 1000),
+        (public, 0, 0),
+    ]
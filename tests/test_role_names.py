@@ -0,0 +1,40 @@
+from eth_permissions.access_control import Registry, Role
+from eth_permissions.role_names import (
+    RoleNameIndex,
+    build_role_dictionary,
+    names_from_solidity,
+    role_permutations,
+)
+
+
+def test_role_permutations():
+    names = set(role_permutations(["pricer", "lp"], max_words=2, suffixes=["_ROLE"]))
+    assert names == {"PRICER_ROLE", "LP_ROLE", "PRICER_LP_ROLE", "LP_PRICER_ROLE"}
+
+
+def test_names_from_solidity(tmp_path):
+    (tmp_path / "Pool.sol").write_text(
+        'bytes32 public constant PRICER_ROLE = keccak256("PRICER_ROLE");\n'
+        "bytes32 internal constant LEVEL1_ROLE = 0xbf372ca3;\n"
+    )
+    assert set(names_from_solidity([str(tmp_path)])) == {"PRICER_ROLE", "LEVEL1_ROLE"}
+
+
+def test_registry_uses_role_dictionary(tmp_path):
+    assert build_role_dictionary(tmp_path / "roles.idx", ["PRICER_ROLE", "RESOLVER_ROLE"], processes=1) == 2
+
+    registry = Registry()
+    pricer_hash = Role("PRICER_ROLE").hash
+    assert registry.get(pricer_hash).name.startswith("UNKNOWN ROLE")
+
+    registry.name_index = RoleNameIndex(tmp_path / "roles.idx")
+    assert registry.get(pricer_hash).name == "PRICER_ROLE"
+
+
+def test_role_dictionary_merges_sorted_runs(tmp_path):
+    names = [f"ROLE_{index}" for index in range(50)] + ["ROLE_7"]
+    assert build_role_dictionary(tmp_path / "roles.idx", iter(names), processes=1, chunk_size=7) == 50
+
+    index = RoleNameIndex(tmp_path / "roles.idx")
+    assert len(index) == 50
+    assert all(index.name(Role(name).hash) == name for name in names)
@@ -1,6 +1,13 @@
 from hexbytes import HexBytes
 
-from eth_permissions.access_control import Component, Role, get_registry
+from eth_permissions.access_control import (
+    Component,
+    Registry,
+    Role,
+    compare,
+    get_registry,
+    snapshot_from_dict,
+)
 
 
 def test_simple_role_hash():
@@ -77,3 +84,66 @@ def test_registry_with_components():
     assert registry.get("0x4add528a8b76da60a54e9da02ca189e5fe2a8574804aca4a762f67e0d507fd8a") == Role(
         "PRICER_ROLE", component=components[0]
     )
+
+
+def test_registry_artifact(tmp_path):
+    from eth_permissions.access_control import Registry
+    from eth_permissions.registry_artifact import build_registry
+
+    registry = build_registry(["PRICER_ROLE"], ["0x8c5f6aEB655D687929a82c5d430Ec56abaDdc0c8"], ["TestRM"])
+    registry.save(tmp_path / "registry.pickle")
+    loaded = Registry.load(tmp_path / "registry.pickle")
+
+    role = loaded.get("0x4add528a8b76da60a54e9da02ca189e5fe2a8574804aca4a762f67e0d507fd8a")
+    assert role == registry.get("0x4add528a8b76da60a54e9da02ca189e5fe2a8574804aca4a762f67e0d507fd8a")
+    assert str(role) == "Role:PRICER_ROLE@TestRM"
+
+
+def test_snapshot_tree():
+    from eth_permissions.access_control import snapshot_tree
+
+    snapshot = [
+        {"role": Role("LEVEL1_ROLE"), "members": ["0x1", "0x2"]},
+        {"role": Role("LEVEL2_ROLE"), "members": []},
+    ]
+    reordered = [{"role": Role("LEVEL1_ROLE"), "members": ["0x2", "0x1"]}]
+    changed = [{"role": Role("LEVEL1_ROLE"), "members": ["0x1"]}]
+
+    assert snapshot_tree(snapshot).root == snapshot_tree(reordered).root
+    assert snapshot_tree(snapshot).diff(snapshot_tree(changed)) == {Role("LEVEL1_ROLE").hash.hex()}
+
+
+def test_compare_access_control_snapshots():
+    component = Component(HexBytes("0x8c5f6aEB655D687929a82c5d430Ec56abaDdc0c8"), "PolicyPool")
+    registry = Registry()
+    registry.add_roles([Role("GUARDIAN_ROLE"), Role("LEVEL1_ROLE")])
+    registry.add_components([component])
+    alice, bob = "0x47E2aFB074487682Db5Db6c7e41B43f913026544", "0xa65c9dE776d1f30c095EFF9C775E001a1d366df8"
+    guardian = Role("GUARDIAN_ROLE", component)
+    level1 = Role("LEVEL1_ROLE")
+
+    current = [
+        {"role": Role.default_admin(), "members": [alice]},
+        {"role": guardian, "members": [alice, bob]},
+    ]
+    reference = snapshot_from_dict(
+        [
+            {"role": "DEFAULT_ADMIN_ROLE", "members": [alice.lower()]},
+            {"role": "Role:GUARDIAN_ROLE@PolicyPool", "members": [alice]},
+            {"role": "LEVEL1_ROLE", "members": [bob], "admin": "GUARDIAN_ROLE@PolicyPool"},
+        ],
+        registry,
+    )
+
+    operations = [(op.op, op.args["role"], op.args.get("account")) for op in compare(current, reference)]
+
+    assert sorted(operations, key=str) == sorted(
+        [("revokeRole", guardian, bob), ("setRoleAdmin", level1, None), ("grantRole", level1, bob)], key=str
+    )
+    # The admin of a role is set before its grants
+    assert operations.index(("setRoleAdmin", level1, None)) < operations.index(("grantRole", level1, bob))
+    assert [op.op for op in compare(current, reference, {level1.hash: guardian})] == [
+        op for op, _, _ in operations if op != "setRoleAdmin"
+    ]
+    assert registry.find("GUARDIAN_ROLE@0x8c5f6aeb655d687929a82c5d430ec56abaddc0c8") == guardian
+    assert registry.find("0x" + level1.hash.hex()) == level1
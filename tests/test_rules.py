@@ -0,0 +1,102 @@
+import json
+from types import SimpleNamespace
+
+from eth_permissions import abis
+from eth_permissions import access_manager as am
+from eth_permissions import rules
+from eth_permissions.chaindata import AccessManagerEventStream
+from eth_permissions.main import parser, run
+from eth_permissions.rules import DEFAULT_RULES, compile_rule, evaluate, lint_contracts
+
+from .helpers import ALICE, BOB, MANAGER, TARGET, event, event_entry, make_log
+
+PUBLIC = am.AccessManager.PUBLIC_ROLE.id
+
+
+def test_evaluate_rules():
+    manager = am.AccessManager.from_events(
+        [
+            event("RoleGranted", (1, 0), roleId=0, account=ALICE, delay=0, since=0, newMember=True),
+            event("RoleGranted", (1, 1), roleId=0, account=BOB, delay=0, since=0, newMember=True),
+            event("RoleLabel", (1, 2), roleId=5, label="GUARDIAN"),
+            event("RoleLabel", (1, 3), roleId=1, label="PRICER"),
+            event("RoleGuardianChanged", (1, 4), roleId=1, guardian=5),
+            event("RoleGrantDelayChanged", (1, 5), roleId=1, delay=3600, since=0),
+            event("RoleLabel", (1, 6), roleId=2, label="RESOLVER"),
+            event("RoleGuardianChanged", (1, 7), roleId=2, guardian=5),
+            event("RoleGrantDelayChanged", (1, 8), roleId=2, delay=86400, since=0),
+            event(
+                "TargetFunctionRoleUpdated",
+                (2, 0),
+                roleId=PUBLIC,
+                target=TARGET,
+                selector=b"\x12\x34\x56\x78",
+            ),
+        ]
+    )
+    rules = [compile_rule(rule) for rule in DEFAULT_RULES] + [
+        compile_rule(
+            {
+                "id": "guarded-grant-delay",
+                "kind": "role",
+                "where": {"guardian_label": "GUARDIAN"},
+                "require": {"grant_delay": {"gte": 86400}},
+            }
+        )
+    ]
+
+    findings = evaluate("0x1", manager, rules, account_types={ALICE: "eoa", BOB: "contract"})
+
+    assert sorted(
+        (finding.rule, finding.entity.get("account") or finding.entity.get("role")) for finding in findings
+    ) == [
+        ("guarded-grant-delay", 1),
+        ("no-eoa-admin", ALICE),
+        ("no-public-functions", PUBLIC),
+    ]
+
+
+class FakeProvider:
+    """MANAGER granted the ADMIN_ROLE to ALICE, an EOA. Fetching the logs of any other contract fails."""
+
+    def __init__(self):
+        granted = {"roleId": 0, "account": ALICE, "delay": 0, "since": 0, "newMember": True}
+        log = make_log(event_entry(abis.OZ_ACCESS_MANAGER, "RoleGranted"), granted)
+        self.w3 = SimpleNamespace(
+            eth=SimpleNamespace(get_logs=self.get_logs, get_code=lambda account: b""),
+            provider=SimpleNamespace(make_request=None),
+        )
+        self.logs = [log]
+
+    def get_logs(self, filter_params):
+        if filter_params["address"] != MANAGER:
+            raise ConnectionError("connection reset")
+        return self.logs
+
+    def get_first_block(self, contract_wrapper):
+        return 0
+
+
+def test_lint_contracts(monkeypatch):
+    monkeypatch.setattr(AccessManagerEventStream, "_get_contract_wrapper", lambda self: None)
+
+    results = {
+        result.address: result
+        for result in lint_contracts([MANAGER, BOB], DEFAULT_RULES, FakeProvider(), evaluate_workers=1)
+    }
+
+    assert [finding.rule for finding in results[MANAGER].findings] == ["no-eoa-admin"]
+    assert results[MANAGER].error is None
+    assert results[BOB].error == "ConnectionError: connection reset"
+
+
+def test_rules_command(monkeypatch, capsys):
+    monkeypatch.setattr(AccessManagerEventStream, "_get_contract_wrapper", lambda self: None)
+    monkeypatch.setattr(rules, "get_provider", lambda name: FakeProvider())
+
+    assert run(parser.parse_args(["--rules", "default", "--jobs", "1", MANAGER])) == 1
+
+    (line,) = capsys.readouterr().out.splitlines()
+    output = json.loads(line)
+    assert output["address"] == MANAGER and output["error"] is None
+    assert [finding["rule"] for finding in output["findings"]] == ["no-eoa-admin"]
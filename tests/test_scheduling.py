@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from eth_permissions.planner import encode_call
+from eth_permissions.scheduling import PendingOperations, ScheduledOperation
+
+from .helpers import ALICE, TARGET, event
+
+MANAGER = "0x9F7B8a4bF9d9b4D3E6B2bD5d1C1f7E2aE6D1b5f0"
+HOUR = 3600
+
+
+def scheduled(order, operation_id, schedule, nonce=1, data=b"\x12\x34\x56\x78"):
+    return event(
+        "OperationScheduled",
+        order,
+        operationId=bytes([operation_id]) * 32,
+        nonce=nonce,
+        schedule=schedule,
+        caller=ALICE,
+        target=TARGET,
+        data=data,
+    )
+
+
+def test_pending_operations_queries():
+    now = 1_000_000
+    pending = PendingOperations()
+    pending.apply_events(
+        MANAGER,
+        [scheduled((1, 0), i, now + i * HOUR) for i in range(1, 10)]
+        + [
+            scheduled((1, 10), 10, now - HOUR),
+            event("OperationExecuted", (2, 0), operationId=bytes([2]) * 32, nonce=1),
+            event("OperationCanceled", (2, 1), operationId=bytes([3]) * 32, nonce=1),
+            # A stale nonce doesn't cancel the current operation
+            event("OperationCanceled", (2, 2), operationId=bytes([4]) * 32, nonce=0),
+        ],
+    )
+
+    upcoming = pending.upcoming(timedelta(hours=5), now=now)
+    assert [operation.schedule - now for operation in upcoming] == [HOUR, 4 * HOUR, 5 * HOUR]
+    assert [operation.schedule - now for operation in pending.executable(now)] == [-HOUR]
+
+    pending.prune(now + 8 * 24 * HOUR)
+    assert len(pending) == 0
+
+
+def test_decode_scheduled_calldata():
+    data = encode_call("grantRole", [1, ALICE, 0])
+    pending = PendingOperations()
+    pending.apply_events(MANAGER, [scheduled((1, 0), 1, 100, data=data)])
+
+    (operation,) = pending
+    assert operation.decode() == {
+        "selector": "0x" + data[:4].hex(),
+        "signatures": ["grantRole(uint64,address,uint32)"],
+        "args": [1, ALICE.lower(), 0],
+    }
+    assert operation.as_dict()["call"]["args"] == [1, ALICE.lower(), 0]
+
+    class SelectorIndex:
+        def __init__(self, signature):
+            self.signature = signature
+
+        def resolve(self, selector):
+            return [self.signature]
+
+    truncated = ScheduledOperation(MANAGER, "0x01", 1, 100, ALICE, TARGET, data[:4] + bytes(8))
+    assert truncated.decode()["args"] is None
+    unknown = ScheduledOperation(MANAGER, "0x01", 1, 100, ALICE, TARGET, bytes.fromhex("deadbeef"))
+    assert unknown.decode(SelectorIndex("f(uint2x)"))["args"] is None
+    assert unknown.decode(SelectorIndex("f(foo)"))["args"] is None
@@ -0,0 +1,54 @@
+import json
+
+from eth_permissions.hashindex import HashIndex, write_index
+from eth_permissions.selector_index import (
+    SelectorIndex,
+    build_selector_index,
+    function_signature,
+)
+
+
+def test_hash_index_collisions(tmp_path):
+    path = tmp_path / "test.idx"
+    write_index(
+        path, [(b"\x02\x02", "b"), (b"\x01\x01", "a"), (b"\x02\x02", "c"), (b"\x01\x01", "a")], key_size=2
+    )
+    index = HashIndex(path)
+
+    assert len(index) == 3
+    assert index.lookup(b"\x01\x01") == ["a"]
+    assert index.lookup(b"\x02\x02") == ["b", "c"]
+    assert index.lookup(b"\x03\x03") == []
+
+
+def test_function_signature_with_tuples():
+    entry = {
+        "type": "function",
+        "name": "newPolicy",
+        "inputs": [
+            {"type": "tuple", "components": [{"type": "uint256"}, {"type": "address"}]},
+            {"type": "bytes32[]"},
+        ],
+    }
+    assert function_signature(entry) == "newPolicy((uint256,address),bytes32[])"
+
+
+def test_build_and_resolve(tmp_path):
+    artifacts = tmp_path / "artifacts"
+    artifacts.mkdir()
+    abi = [
+        {"type": "function", "name": "grantRole", "inputs": [{"type": "bytes32"}, {"type": "address"}]},
+        {"type": "event", "name": "RoleGranted", "inputs": []},
+    ]
+    (artifacts / "AccessControl.json").write_text(json.dumps({"contractName": "AccessControl", "abi": abi}))
+    (artifacts / "IAccessControl.json").write_text(json.dumps(abi))
+    (artifacts / "broken.json").write_text("{")
+
+    assert build_selector_index(tmp_path / "selectors.idx", [str(artifacts)]) == 1
+
+    index = SelectorIndex(tmp_path / "selectors.idx")
+    assert index.resolve("0x2f2ff15d") == ["grantRole(bytes32,address)"]
+    assert index.resolve_all(["0x2f2ff15d", "0x00000000"]) == {
+        "0x2f2ff15d": ["grantRole(bytes32,address)"],
+        "0x00000000": [],
+    }
@@ -0,0 +1,83 @@
+import random
+
+from eth_permissions import access_manager as am
+from eth_permissions.hamt import PersistentMap
+from eth_permissions.simulation import PersistentAccessManager, simulate
+
+from .helpers import ALICE, BOB, TARGET, event
+
+
+class Colliding:
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return self.value % 3
+
+    def __eq__(self, other):
+        return isinstance(other, Colliding) and other.value == self.value
+
+
+def test_persistent_map_matches_dict():
+    rng = random.Random(1)
+    keys = list(range(2000)) + [Colliding(i) for i in range(20)]
+    versions = [(PersistentMap(), {})]
+    for _ in range(5000):
+        current, expected = versions[-1]
+        key = rng.choice(keys)
+        if rng.random() < 0.3:
+            current, expected = current.delete(key), {k: v for k, v in expected.items() if k != key}
+        else:
+            value = rng.random()
+            current, expected = current.set(key, value), {**expected, key: value}
+        versions.append((current, expected))
+
+    # Every version is still intact
+    for current, expected in versions[::250] + versions[-1:]:
+        assert len(current) == len(expected)
+        assert dict(current.items()) == expected
+        assert all(current[key] == value for key, value in expected.items())
+
+
+def test_apply_compare_output():
+    current = am.AccessManager.from_events(
+        [
+            event("RoleLabel", (1, 0), roleId=1, label="PRICER"),
+            event("RoleGranted", (1, 1), roleId=1, account=ALICE, delay=0, since=0, newMember=True),
+            event(
+                "TargetFunctionRoleUpdated",
+                (2, 0),
+                roleId=1,
+                target=TARGET,
+                selector=bytes.fromhex("12345678"),
+            ),
+        ]
+    )
+    reference = am.AccessManager.from_events(
+        [
+            event("RoleLabel", (1, 0), roleId=2, label="RESOLVER"),
+            event("RoleGranted", (1, 1), roleId=2, account=BOB, delay=60, since=0, newMember=True),
+            event("RoleGuardianChanged", (1, 2), roleId=2, guardian=1),
+            event(
+                "TargetFunctionRoleUpdated",
+                (2, 0),
+                roleId=2,
+                target=TARGET,
+                selector=bytes.fromhex("12345678"),
+            ),
+            event("TargetClosed", (2, 1), target=TARGET, closed=True),
+        ]
+    )
+
+    variants = simulate(current, {"migrate": am.compare(current, reference), "noop": []})
+
+    assert am.compare(variants["migrate"].to_access_manager(), reference) == []
+    assert am.compare(variants["noop"].to_access_manager(), current) == []
+    assert variants["migrate"].get_target_function_role(TARGET, "0x12345678") == 2
+    # The base state is shared, not modified
+    base = PersistentAccessManager.from_access_manager(current)
+    migrated = base.apply(am.compare(current, reference))
+    assert am.compare(migrated.to_access_manager(), reference) == []
+    assert base.get_role_members(1) == {am.RoleMember(ALICE)}
+    assert base.get_target_function_role(TARGET, "0x12345678") == 1
+    assert am.compare(base.to_access_manager(), current) == []
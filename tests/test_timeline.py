@@ -0,0 +1,94 @@
+import random
+
+from eth_permissions.timeline import Interval, IntervalTree, MembershipTimeline
+
+from .helpers import ALICE, BOB, event
+
+
+def held(interval, block):
+    return interval.start <= block and (interval.end is None or block < interval.end)
+
+
+def test_interval_tree_matches_brute_force():
+    rng = random.Random(42)
+    intervals = []
+    for index in range(300):
+        start = rng.randrange(0, 1000)
+        end = None if rng.random() < 0.1 else start + rng.randrange(0, 100)
+        intervals.append(Interval("ROLE", str(index), start, end))
+    tree = IntervalTree(intervals)
+
+    for _ in range(200):
+        start = rng.randrange(0, 1100)
+        end = start + rng.randrange(0, 50)
+        # [start, end): held from the grant block until the block before the revoke
+        assert set(tree.stab(start)) == {i for i in intervals if held(i, start)}
+        assert set(tree.overlap(start, end)) == {
+            i for i in intervals if any(held(i, block) for block in range(start, end + 1))
+        }
+
+
+def test_membership_timeline():
+    timeline = MembershipTimeline.from_events(
+        [
+            ("ADMIN", ALICE, 10, True),
+            ("ADMIN", BOB, 15, True),
+            ("ADMIN", ALICE, 18, True),  # Re-grant, keeps the interval
+            ("ADMIN", ALICE, 20, False),
+            ("ADMIN", BOB, 25, False),
+            ("ADMIN", ALICE, 40, True),
+        ]
+    )
+
+    assert {i.account for i in timeline.held_at("ADMIN", 12)} == {ALICE}
+    assert timeline.accounts_between("ADMIN", 21, 30) == {BOB}
+    assert timeline.accounts_between("ADMIN", 21, 50) == {ALICE, BOB}
+    assert timeline.total_blocks("ADMIN", ALICE, until=50) == 10 + 10
+    assert timeline.held_at("OTHER", 12) == []
+
+
+def test_revoke_block_is_not_held():
+    timeline = MembershipTimeline.from_events(
+        [
+            ("ADMIN", ALICE, 10, True),
+            ("ADMIN", ALICE, 20, False),
+            ("ADMIN", BOB, 30, True),
+            ("ADMIN", BOB, 30, False),
+        ]
+    )
+
+    assert [i.account for i in timeline.held_at("ADMIN", 19)] == [ALICE]
+    assert timeline.held_at("ADMIN", 20) == []
+    assert timeline.accounts_between("ADMIN", 20, 40) == set()
+    assert timeline.accounts_between("ADMIN", 15, 20) == {ALICE}
+    assert timeline.total_blocks("ADMIN", ALICE, until=100) == 10
+    assert timeline.total_blocks("ADMIN", BOB, until=100) == 0
+
+
+def test_access_manager_grants_start_at_since():
+    granted = dict(delay=0, newMember=True)
+    stream = [
+        event("RoleRevoked", (20, 0), roleId=1, account=ALICE.lower()),
+        event("RoleGranted", (10, 0), roleId=1, account=ALICE.lower(), since=0, **granted),
+        event("RoleGranted", (12, 0), roleId=1, account=BOB, since=1240, **granted),
+    ]
+    block_at = lambda timestamp: (timestamp - 1000) // 12  # noqa: E731
+
+    assert [
+        (i.account, i.start, i.end) for i in MembershipTimeline.from_access_manager_stream(stream).intervals
+    ] == [
+        (ALICE, 10, 20),
+        (BOB, 12, None),
+    ]
+    timeline = MembershipTimeline.from_access_manager_stream(stream, block_at=block_at)
+    assert [i.account for i in timeline.held_at(1, 15)] == [ALICE]
+    assert [i.start for i in timeline.held_at(1, 20)] == [20]
+
+
+def test_timeline_to_csv(tmp_path):
+    timeline = MembershipTimeline.from_events([("ADMIN", ALICE, 10, True), ("ADMIN", ALICE, 20, False)])
+    timeline.to_csv(tmp_path / "timeline.csv")
+    assert (tmp_path / "timeline.csv").read_text().splitlines() == [
+        "role,account,start,end",
+        f"ADMIN,{ALICE},10,20",
+    ]